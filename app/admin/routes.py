@@ -1,10 +1,15 @@
 # /library_project/app/admin/routes.py
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
-from app import db
+from app import db, deletion, fragments, profiling, sql_metrics
 from app.models import User, Book, Comment
+from app.catalog import catalog_page
+from app.inventory import copies_with_borrowers
+from app.comments import render_comments
+from app.http_cache import bump_catalog_version, conditional_on_catalog
+from datetime import datetime
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -29,9 +34,62 @@ def admin_view_users():
     return render_template('admin/admin_view_users.html', users=users, librarians=librarians)
 
 @admin_bp.route('/view_books')
+@conditional_on_catalog
 def admin_view_books():
-    books = Book.query.all()
-    return render_template('admin/admin_view_books.html', books=books)
+    page = catalog_page(request.args)
+    return render_template('admin/admin_view_books.html', page=page)
+
+@admin_bp.route('/sql_stats', methods=['GET', 'POST'])
+def sql_stats():
+    if request.method == 'POST':
+        sql_metrics.stats.reset()
+        flash('SQL statistics reset.', 'info')
+        return redirect(url_for('admin.sql_stats'))
+    return render_template('admin/sql_stats.html', rows=sql_metrics.stats.snapshot(),
+                           since=datetime.fromtimestamp(sql_metrics.stats.since),
+                           enabled=current_app.config.get('SQL_METRICS', True),
+                           threshold=current_app.config.get('N_PLUS_ONE_THRESHOLD'))
+
+@admin_bp.route('/profiles', methods=['GET', 'POST'])
+def profiles():
+    token = None
+    if request.method == 'POST':
+        action = request.form.get('action')
+        if action == 'rate':
+            try:
+                rate = float(request.form.get('sample_rate', ''))
+            except ValueError:
+                rate = -1
+            if not 0 <= rate <= 1:
+                flash('Sample rate must be between 0 and 1.', 'danger')
+            else:
+                profiling.settings.sample_rate = rate
+                flash(f'Profiling {rate:.1%} of requests in this worker.', 'info')
+        elif action == 'clear':
+            flash(f'{profiling.clear()} profiles deleted.', 'info')
+        elif action == 'token':
+            token = profiling.make_token()
+        if token is None:
+            return redirect(url_for('admin.profiles'))
+    rows = [(endpoint, count, datetime.fromtimestamp(newest)) for endpoint, count, newest in profiling.endpoints()]
+    return render_template('admin/profiles.html', rows=rows, token=token, header=profiling.HEADER,
+                           sample_rate=profiling.settings.sample_rate,
+                           enabled=current_app.config.get('PROFILING', True),
+                           token_minutes=current_app.config.get('PROFILE_TOKEN_MAX_AGE', 3600) // 60,
+                           directory=profiling.profile_dir())
+
+@admin_bp.route('/profiles/<name>')
+def profile_detail(name):
+    sort = 'cumtime' if request.args.get('sort') == 'cumtime' else 'tottime'
+    summary = profiling.summary(name, sort)
+    if summary is None:
+        flash('No profiles saved for that endpoint.', 'warning')
+        return redirect(url_for('admin.profiles'))
+    return render_template('admin/profile_detail.html', endpoint=name, summary=summary, sort=sort)
+
+@admin_bp.route('/deletions')
+def deletions():
+    return render_template('deletion_jobs.html', jobs=deletion.recent_jobs(), back=url_for('admin.admin_dashboard'))
 
 @admin_bp.route('/add_librarian', methods=['GET', 'POST'])
 def add_librarian():
@@ -56,15 +114,20 @@ def add_librarian():
     return render_template('admin/add_librarian.html')
 
 @admin_bp.route('/view_book/<int:book_id>')
+@conditional_on_catalog
 def view_book_admin(book_id):
     book = Book.query.get_or_404(book_id)
-    return render_template('admin/view_book_admin.html', book=book, copies=book.copies, comments=book.comments)
+    detail = fragments.render_cached(book.id, 'admin', lambda: render_template(
+        'admin/book_detail.html', book=book, copies=copies_with_borrowers(book.id)))
+    comments = render_comments(book, 'admin.view_book_admin', request.args, can_delete=True)
+    return render_template('admin/view_book_admin.html', book=book, detail=detail, comments=comments)
 
 @admin_bp.route('/delete_comment/<int:comment_id>', methods=['POST'])
 def delete_comment_admin(comment_id):
     comment = Comment.query.get_or_404(comment_id)
     book_id = comment.book_id
     db.session.delete(comment)
+    bump_catalog_version()
     db.session.commit()
     flash('Comment deleted successfully.', 'success')
     return redirect(url_for('admin.view_book_admin', book_id=book_id))
@@ -76,16 +139,18 @@ def delete_account(user_id):
         flash("You cannot delete an admin account.", 'danger')
         return redirect(url_for('admin.admin_view_users'))
 
-    # Set borrowed books to available
-    for copy in user_to_delete.borrowed_books:
-        copy.status = 'available'
-        copy.borrower_id = None
-        copy.borrowed_on = None
-        copy.due_date = None
-    
-    # Cascade delete will handle comments, ratings, purchases, etc.
-    db.session.delete(user_to_delete)
+    if deletion.pending_job('user', user_to_delete.id):
+        flash(f"'{user_to_delete.username}' is already being deleted.", 'info')
+        return redirect(url_for('admin.deletions'))
+    rows = deletion.user_rows(user_to_delete.id)
+    if rows > current_app.config.get('DELETE_INLINE_ROWS', 20000):
+        deletion.queue('user', user_to_delete.id, user_to_delete.username, rows, current_user.id)
+        flash(f"Deleting '{user_to_delete.username}' and {rows} related rows in the background.", 'info')
+        return redirect(url_for('admin.deletions'))
+
+    role, username = user_to_delete.role, user_to_delete.username
+    deletion.delete_user(user_to_delete.id)
     db.session.commit()
-    
-    flash(f"{user_to_delete.role.title()} '{user_to_delete.username}' deleted successfully.", 'success')
+
+    flash(f"{role.title()} '{username}' deleted successfully.", 'success')
     return redirect(url_for('admin.admin_view_users'))
\ No newline at end of file
@@ -0,0 +1,234 @@
+# /library_project/app/api/routes.py
+
+import base64
+import gzip
+import io
+import json
+from datetime import date, datetime
+from flask import Blueprint, request, current_app
+from flask_login import login_user, logout_user, current_user
+from werkzeug.datastructures import MultiDict
+from werkzeug.security import check_password_hash
+from app import credits, db, importer, loans
+from app.models import Book, User, UniqueBook
+from app.catalog import catalog_page
+from app.http_cache import conditional_on_catalog
+from app.images import image_url
+from app.loans import LoanError
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Book fields clients may ask for with ?fields=; the default keeps list responses small.
+BOOK_FIELDS = ('id', 'title', 'author', 'isbn', 'publisher', 'description', 'price', 'cost_per_day',
+               'image', 'book_type_id', 'total_copies', 'available_copies', 'rating_avg', 'rating_count')
+DEFAULT_BOOK_FIELDS = ('id', 'title', 'author', 'available_copies')
+MAX_LIMIT = 100
+
+# Responses smaller than this are not worth compressing.
+COMPRESS_MIN_BYTES = 512
+
+# Keys a cursor from _encode_cursor can hold, with the JSON types their values may have.
+CURSOR_KEYS = {'q': (str,), 'offset': (int,), 'sort': (str,), 'after_id': (int,), 'after': (str, int, float, type(None))}
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def _json(payload, status=200):
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False, default=_default)
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+def _error(message, status):
+    return _json({'error': message}, status)
+
+def _encode_cursor(cursor):
+    if cursor is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(cursor, default=_default).encode()).decode().rstrip('=')
+
+def _decode_cursor(token):
+    padded = token + '=' * (-len(token) % 4)
+    cursor = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(cursor, dict):
+        raise ValueError('cursor must be an object')
+    for key, value in cursor.items():
+        if key not in CURSOR_KEYS:
+            raise ValueError(f'unknown cursor key {key}')
+        if isinstance(value, bool) or not isinstance(value, CURSOR_KEYS[key]):
+            raise ValueError(f'bad cursor value for {key}')
+    return cursor
+
+def _book_fields():
+    requested = request.args.get('fields')
+    if not requested:
+        return DEFAULT_BOOK_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in requested.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return fields
+
+def _book_json(book, fields):
+    data = {field: getattr(book, field) for field in fields}
+    if 'image' in data:
+        data['image'] = image_url(book.image) if book.image else None
+    return data
+
+def _patron_only():
+    if current_user.role != 'user':
+        return _error('Only patrons can borrow or buy books.', 403)
+    return None
+
+@api_bp.before_request
+def require_login():
+    if request.endpoint != 'api.login' and not current_user.is_authenticated:
+        return _error('Authentication required.', 401)
+
+@api_bp.after_request
+def compress(response):
+    if (response.direct_passthrough or not 200 <= response.status_code < 300
+            or 'Content-Encoding' in response.headers or 'gzip' not in request.accept_encodings):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@api_bp.route('/session', methods=['POST'])
+def login():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not all(isinstance(data.get(key), str) for key in ('username', 'password')):
+        return _error('Send {"username": ..., "password": ...} as JSON.', 400)
+    user = User.query.filter_by(username=data['username']).first()
+    if not user or not check_password_hash(user.password, data['password']):
+        return _error('Invalid username or password.', 401)
+    login_user(user)
+    return _json({'id': user.id, 'username': user.username, 'role': user.role, 'credits': user.credits})
+
+@api_bp.route('/session', methods=['DELETE'])
+def logout():
+    logout_user()
+    return _json({'logged_out': True})
+
+@api_bp.route('/books')
+@conditional_on_catalog
+def list_books():
+    """Catalog page. Takes ``fields``, ``limit``, ``sort`` or ``q``, and the previous page's ``cursor``."""
+    try:
+        fields = _book_fields()
+        args = MultiDict(request.args)
+        if 'cursor' in args:
+            for key, value in _decode_cursor(args.pop('cursor')).items():
+                args[key] = value
+    except ValueError as e:
+        return _error(f'Bad request: {e}', 400)
+    limit = min(max(request.args.get('limit', 24, type=int), 1), MAX_LIMIT)
+    page = catalog_page(args, per_page=limit, columns=[getattr(Book, f) for f in fields])
+    return _json({
+        'books': [_book_json(book, fields) for book in page.books],
+        'sort': page.sort,
+        'next_cursor': _encode_cursor(page.next_cursor),
+    })
+
+@api_bp.route('/books/<int:book_id>/availability')
+@conditional_on_catalog
+def book_availability(book_id):
+    row = db.session.query(Book.id, Book.total_copies, Book.available_copies).filter(Book.id == book_id).first()
+    if row is None:
+        return _error('Book not found.', 404)
+    return _json({'id': row.id, 'total_copies': row.total_copies, 'available_copies': row.available_copies,
+                  'available': row.available_copies > 0})
+
+@api_bp.route('/loans')
+def list_loans():
+    now = datetime.utcnow()
+    return _json({'loans': [{
+        'copy_id': copy.id,
+        'book_id': copy.book_id,
+        'title': copy.book.title,
+        'author': copy.book.author,
+        'borrowed_on': copy.borrowed_on,
+        'due_date': copy.due_date,
+        'overdue': copy.due_date is not None and copy.due_date < now,
+    } for copy in loans.current_loans(current_user.id)]})
+
+@api_bp.route('/books/<int:book_id>/issue', methods=['POST'])
+def issue_book(book_id):
+    denied = _patron_only()
+    if denied:
+        return denied
+    book = db.session.get(Book, book_id)
+    if book is None:
+        return _error('Book not found.', 404)
+    try:
+        copy_id, due_date = loans.issue_book(book, current_user.id)
+    except LoanError as e:
+        return _error(e.message, e.status)
+    return _json({'copy_id': copy_id, 'book_id': book_id, 'due_date': due_date}, 201)
+
+@api_bp.route('/books/<int:book_id>/buy', methods=['POST'])
+def buy_book(book_id):
+    denied = _patron_only()
+    if denied:
+        return denied
+    book = db.session.get(Book, book_id)
+    if book is None:
+        return _error('Book not found.', 404)
+    try:
+        price = loans.buy_book(book, current_user.id)
+    except LoanError as e:
+        return _error(e.message, e.status)
+    return _json({'book_id': book_id, 'price_paid': price})
+
+@api_bp.route('/loans/<int:copy_id>/return', methods=['POST'])
+def return_loan(copy_id):
+    denied = _patron_only()
+    if denied:
+        return denied
+    copy = db.session.get(UniqueBook, copy_id)
+    if copy is None:
+        return _error('Copy not found.', 404)
+    try:
+        loans.return_copy(copy, current_user.id)
+    except LoanError as e:
+        return _error(e.message, e.status)
+    return _json({'copy_id': copy_id, 'returned': True})
+
+@api_bp.route('/loans/<int:copy_id>/buy', methods=['POST'])
+def buy_loan(copy_id):
+    denied = _patron_only()
+    if denied:
+        return denied
+    copy = db.session.get(UniqueBook, copy_id)
+    if copy is None:
+        return _error('Copy not found.', 404)
+    book_id = copy.book_id
+    try:
+        price = loans.buy_borrowed_copy(copy, current_user.id)
+    except LoanError as e:
+        return _error(e.message, e.status)
+    return _json({'copy_id': copy_id, 'book_id': book_id, 'price_paid': price})
+
+@api_bp.route('/credits/topups', methods=['POST'])
+def credit_topups():
+    """Bulk top-up for librarians: a JSON ``{"reference", "note", "topups": [...]}`` body, or CSV with ``?reference=``."""
+    if current_user.role != 'librarian':
+        return _error('Only librarians can add credits.', 403)
+    if request.mimetype == 'text/csv':
+        rows = importer.read_records(io.StringIO(request.get_data(as_text=True), newline=''), 'csv')
+        reference, note = request.args.get('reference'), request.args.get('note')
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('topups'), list):
+            return _error('Send {"topups": [...]} as JSON or a CSV body.', 400)
+        rows = data['topups']
+        reference, note = data.get('reference'), data.get('note')
+    try:
+        result = credits.top_up(rows, reference and str(reference), current_user.id, note and str(note))
+    except credits.TopUpError as e:
+        return _json({'error': e.message, 'rejected': [{'row': n, 'reason': reason} for n, reason in e.rejected]}, e.status)
+    return _json({'reference': result.reference, 'patrons': result.users, 'total': result.total}, 201)
@@ -0,0 +1,111 @@
+# /library_project/app/archive.py
+
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import DDL, delete, event, func, select, union_all
+from sqlalchemy.schema import CreateIndex, CreateTable
+from app import db
+from app.models import ArchivedBorrow, BorrowHistory
+from app.sales import dialect_insert
+
+BATCH_SIZE = 5000
+
+SCHEMA = 'archive'
+
+# Outside SQLite the archive is a schema of the main database, created along with the tables.
+event.listen(db.metadata, 'before_create', DDL(f'CREATE SCHEMA IF NOT EXISTS {SCHEMA}').execute_if(dialect='postgresql'))
+
+def archive_path(database):
+    """The archive file kept next to a SQLite database file: library.db -> library.archive.db."""
+    if not database or database == ':memory:':
+        return ':memory:'
+    root, ext = os.path.splitext(database)
+    return f'{root}.{SCHEMA}{ext or ".db"}'
+
+def configure(app):
+    """Attaches the archive database to every new SQLite connection, creating its table if missing.
+
+    ARCHIVE_DATABASE overrides the file, which defaults to one next to the main database. The
+    main database's journal_mode and synchronous PRAGMAs are applied to the archive too.
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    path = app.config.get('ARCHIVE_DATABASE') or archive_path(engine.url.database)
+    pragmas = {name: value for name, value in (app.config.get('SQLITE_PRAGMAS') or {}).items()
+               if name in ('journal_mode', 'synchronous')}
+    table = ArchivedBorrow.__table__
+    ddl = [str(CreateTable(table, if_not_exists=True).compile(dialect=engine.dialect))]
+    ddl += [str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect)) for index in table.indexes]
+
+    @event.listens_for(engine, 'connect')
+    def attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {SCHEMA}.{name}={value}")
+        for statement in ddl:
+            cursor.execute(statement)
+        cursor.close()
+
+def tables():
+    """The live and archived borrow history tables, which share their columns."""
+    return BorrowHistory.__table__, ArchivedBorrow.__table__
+
+def history(user_id=None, copy_id=None, start=None, end=None):
+    """Live and archived borrow records as one subquery of (id, user_id, copy_id, borrowed_on, returned_on).
+
+    Filters are applied to each side before the UNION so both use their own indexes.
+    """
+    parts = []
+    for table in tables():
+        stmt = select(table.c.id, table.c.user_id, table.c.copy_id, table.c.borrowed_on, table.c.returned_on)
+        if user_id is not None:
+            stmt = stmt.where(table.c.user_id == user_id)
+        if copy_id is not None:
+            stmt = stmt.where(table.c.copy_id == copy_id)
+        if start:
+            stmt = stmt.where(table.c.borrowed_on >= start)
+        if end:
+            stmt = stmt.where(table.c.borrowed_on < end)
+        parts.append(stmt)
+    return union_all(*parts).subquery('history')
+
+def archive_closed(older_than_days, batch_size=BATCH_SIZE, echo=None):
+    """Moves records returned more than ``older_than_days`` ago into the archive, a batch per transaction.
+
+    Batches follow the live table's primary key, so the whole run is one pass over it. Copying
+    ignores ids already archived: SQLite commits attached WAL databases separately, and a batch
+    cut short between the two may leave its rows in both until the next run deletes them.
+    Returns the number of records moved.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    live, archived = tables()
+    insert = dialect_insert(db.engine.dialect.name)
+    columns = [live.c.id, live.c.user_id, live.c.copy_id, live.c.borrowed_on, live.c.returned_on]
+    moved, after = 0, 0
+    while True:
+        ids = db.session.execute(
+            select(live.c.id).where(live.c.id > after, live.c.returned_on < cutoff)
+            .order_by(live.c.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        # A closed record never reopens, so the id range plus the cutoff picks out the same rows twice.
+        batch = (live.c.id >= ids[0], live.c.id <= ids[-1], live.c.returned_on < cutoff)
+        db.session.execute(
+            insert(archived).from_select([c.name for c in columns], select(*columns).where(*batch))
+            .on_conflict_do_nothing(index_elements=['id'])
+        )
+        db.session.execute(delete(live).where(*batch))
+        db.session.commit()
+        moved += len(ids)
+        after = ids[-1]
+        if echo:
+            echo(f"Archived {moved} records (up to id {after}).")
+    return moved
+
+def counts():
+    """(live records, archived records)."""
+    return tuple(db.session.execute(select(func.count()).select_from(table)).scalar() for table in tables())
@@ -0,0 +1,83 @@
+# /library_project/app/bootstrap.py
+
+import os
+import random
+import json
+from flask import current_app
+from sqlalchemy import inspect
+from werkzeug.security import generate_password_hash
+from app import db, search, migrations
+from app.models import User, BookType
+from app.http_cache import bump_catalog_version
+
+def init_db(seed=True):
+    """Creates the schema on an empty database, marks every migration as applied and optionally seeds it.
+
+    Returns False, without changing anything, if the tables already exist.
+    """
+    if inspect(db.engine).has_table("user"):
+        return False
+    db.create_all()
+    search.create_index()
+    migrations.stamp_head()
+    bump_catalog_version()
+    db.session.commit()
+    if seed:
+        seed_data()
+    return True
+
+def _seed_cover(image):
+    """A seed book's cover, dropped when the file is not in the upload folder (the importer would reject the row)."""
+    if image and os.path.isfile(os.path.join(current_app.config['UPLOAD_FOLDER'], image)):
+        return image
+    return None
+
+def seed_data():
+    """Seeds the database with initial data from environment variables and JSON."""
+    # --- Seed Users ---
+    if not User.query.filter_by(role='admin').first():
+        admin_pass = os.environ.get('ADMIN_PASSWORD')
+        admin = User(
+            username=os.environ.get('ADMIN_USERNAME'),
+            email=os.environ.get('ADMIN_EMAIL'),
+            password=generate_password_hash(admin_pass, method='pbkdf2:sha256'),
+            role='admin'
+        )
+        db.session.add(admin)
+        print("Default admin created.")
+
+    if not User.query.filter_by(role='librarian').first():
+        librarian_pass = os.environ.get('LIBRARIAN_PASSWORD')
+        librarian = User(
+            username=os.environ.get('LIBRARIAN_USERNAME'),
+            email=os.environ.get('LIBRARIAN_EMAIL'),
+            password=generate_password_hash(librarian_pass, method='pbkdf2:sha256'),
+            role='librarian'
+        )
+        db.session.add(librarian)
+        print("Default librarian created.")
+
+    # --- Seed Book Types ---
+    if not BookType.query.first():
+        types_str = os.environ.get('INITIAL_BOOK_TYPES', '')
+        types = [t.strip() for t in types_str.split(',') if t.strip()]
+        for t in types:
+            db.session.add(BookType(name=t))
+        print("Default book types seeded.")
+    
+    db.session.commit()
+
+    # --- Seed Books from JSON ---
+    try:
+        with open('seed_books.json', 'r') as f:
+            dummy_books = json.load(f)
+        
+        from .importer import import_books
+        report = import_books({**book_data, 'copies': random.randint(2, 4), 'image': _seed_cover(book_data.get('image'))}
+                              for book_data in dummy_books)
+        print(report.summary())
+        print("Database seeded successfully! ✅")
+    except FileNotFoundError:
+        print("seed_books.json not found. Skipping book seeding.")
+    except json.JSONDecodeError:
+        print("Error decoding seed_books.json. Skipping book seeding.")
@@ -0,0 +1,84 @@
+# /library_project/app/catalog.py
+
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import load_only
+from app.models import Book
+from app.search import search_books
+
+PER_PAGE = 24
+TABLE_PER_PAGE = 100
+
+# sort key -> (column, descending)
+CATALOG_SORTS = {
+    'title': (Book.title, False),
+    'author': (Book.author, False),
+    'newest': (Book.id, True),
+    'rating': (Book.rating_avg, True),
+}
+
+class CatalogPage:
+    """One keyset-paginated page of the catalog."""
+
+    def __init__(self, books, sort, next_cursor, query=''):
+        self.books = books
+        self.sort = sort
+        self.next_cursor = next_cursor
+        self.query = query
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+def _after(column, descending, value, last_id):
+    if column is Book.id:
+        return Book.id < last_id if descending else Book.id > last_id
+    if descending:
+        return or_(column < value, and_(column == value, Book.id < last_id))
+    return or_(column > value, and_(column == value, Book.id > last_id))
+
+def search_page(query, offset, per_page=PER_PAGE):
+    """Ranked search results; pages by offset since rank order has no stable key."""
+    books = search_books(query, per_page + 1, offset)
+    next_cursor = None
+    if len(books) > per_page:
+        books = books[:per_page]
+        next_cursor = {'q': query, 'offset': offset + per_page}
+    return CatalogPage(books, 'relevance', next_cursor, query)
+
+def catalog_page(args, per_page=PER_PAGE, columns=None):
+    """Builds a catalog page from request args: ``q`` for search, else ``sort``, ``after`` and ``after_id``.
+
+    ``columns`` limits which Book columns are loaded; the sort column and id always are.
+    """
+    search = args.get('q', '').strip()
+    if search:
+        return search_page(search, max(args.get('offset', 0, type=int), 0), per_page)
+
+    sort = args.get('sort', 'title')
+    if sort not in CATALOG_SORTS:
+        sort = 'title'
+    column, descending = CATALOG_SORTS[sort]
+
+    query = Book.query
+    if columns:
+        query = query.options(load_only(Book.id, column, *columns))
+    last_id = args.get('after_id', type=int)
+    if last_id is not None:
+        after = args.get('after', 0.0, type=float) if column is Book.rating_avg else args.get('after', '')
+        query = query.filter(_after(column, descending, after, last_id))
+
+    if descending:
+        query = query.order_by(column.desc(), Book.id.desc())
+    else:
+        query = query.order_by(column, Book.id)
+    books = query.limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(books) > per_page:
+        books = books[:per_page]
+        last = books[-1]
+        next_cursor = {'sort': sort, 'after_id': last.id}
+        if column is not Book.id:
+            next_cursor['after'] = getattr(last, column.key)
+
+    return CatalogPage(books, sort, next_cursor)
@@ -0,0 +1,240 @@
+# /library_project/app/commands.py
+
+import click
+from flask.cli import with_appcontext
+from datetime import date
+from flask import current_app
+from app import db, search, inventory, sales, importer, images, migrations, query_plans, bootstrap, late_fees, recommendations, http_cache, deletion, archive, credits
+from app.models import Book, User, DeletionJob
+
+@click.command('init-db')
+@click.option('--no-seed', is_flag=True, help='Create the tables without default accounts, book types and books.')
+@with_appcontext
+def init_db_command(no_seed):
+    """Creates the schema on an empty database and seeds it."""
+    if bootstrap.init_db(seed=not no_seed):
+        click.echo("Database created.")
+    else:
+        click.echo("Tables already exist; run 'flask db upgrade' to apply pending migrations.")
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Adds default accounts, book types and seed_books.json entries that are missing."""
+    bootstrap.seed_data()
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Rebuilds the catalog full-text search index from the book table."""
+    count = search.rebuild_index()
+    click.echo(f"Indexed {count} books.")
+
+@click.command('reconcile-inventory')
+@click.option('--dry-run', is_flag=True, help='Report drift without fixing it.')
+@with_appcontext
+def reconcile_inventory_command(dry_run):
+    """Checks Book stock counters against UniqueBook rows and repairs any drift."""
+    drift = inventory.reconcile_counts(fix=not dry_run)
+    for book_id, total, available, actual_total, actual_available in drift:
+        click.echo(f"Book {book_id}: total {total} -> {actual_total}, available {available} -> {actual_available}")
+    if not drift:
+        click.echo("No drift found.")
+    elif dry_run:
+        click.echo(f"{len(drift)} books drifted (not fixed).")
+    else:
+        http_cache.bump_catalog_version()
+        db.session.commit()
+        click.echo(f"Fixed {len(drift)} books.")
+
+@click.command('rebuild-sales-rollup')
+@click.option('--start', type=date.fromisoformat, help='First day to rebuild (YYYY-MM-DD).')
+@click.option('--end', type=date.fromisoformat, help='Last day to rebuild (YYYY-MM-DD).')
+@with_appcontext
+def rebuild_sales_rollup_command(start, end):
+    """Recomputes the daily sales rollup from the purchase table."""
+    days = sales.rebuild_rollup(start, end)
+    click.echo(f"Rebuilt sales rollup for {days} days.")
+
+@click.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv', 'json']), help='Input format; guessed from the file extension by default.')
+@click.option('--copies', default=1, show_default=True, help='Copies to create for rows without a "copies" field.')
+@click.option('--batch-size', default=importer.BATCH_SIZE, show_default=True, help='Rows per INSERT batch and commit.')
+@with_appcontext
+def import_books_command(path, fmt, copies, batch_size):
+    """Bulk-loads books from a JSON-lines, CSV or JSON file. Existing ISBNs are skipped."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        records = importer.read_records(f, fmt or importer.detect_format(path))
+        report = importer.import_books(records, default_copies=copies, batch_size=batch_size)
+    for row_number, reason in report.rejected[:50]:
+        click.echo(f"Row {row_number}: {reason}", err=True)
+    if len(report.rejected) > 50:
+        click.echo(f"... and {len(report.rejected) - 50} more rejected rows.", err=True)
+    if report.inserted:
+        http_cache.bump_catalog_version()
+        db.session.commit()
+    if report.error:
+        raise click.ClickException(report.summary())
+    click.echo(report.summary())
+
+@click.command('build-image-variants')
+@click.option('--force', is_flag=True, help='Rebuild variants that already exist.')
+@with_appcontext
+def build_image_variants_command(force):
+    """Generates thumbnail, card and detail variants for every book image."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    filenames = db.session.execute(db.select(Book.image).where(Book.image.isnot(None)).distinct()).scalars()
+    written = 0
+    for filename in filenames:
+        try:
+            written += images.build_variants(upload_folder, filename, force=force)
+        except (OSError, ValueError) as e:
+            click.echo(f"{filename}: {e}", err=True)
+    click.echo(f"Wrote {written} image variants.")
+
+@click.command('accrue-late-fees')
+@click.option('--date', 'day', type=date.fromisoformat, help='Day to charge (YYYY-MM-DD); defaults to today (UTC).')
+@click.option('--batch-size', default=late_fees.BATCH_SIZE, show_default=True, help='Overdue copies per transaction.')
+@with_appcontext
+def accrue_late_fees_command(day, batch_size):
+    """Charges a day of late fees for overdue copies. Safe to run more than once per day."""
+    run, ran = late_fees.accrue_late_fees(day, batch_size)
+    if not ran:
+        click.echo(f"Late fees for {run.run_date} were already charged.")
+    click.echo(f"{run.run_date}: {run.overdue_copies} overdue copies, {run.patrons_charged} patrons, ${run.total_amount:.2f} charged.")
+
+@click.command('refresh-recommendations')
+@click.option('--full', is_flag=True, help='Rebuild from all borrow history instead of only what is new.')
+@click.option('--top-k', default=recommendations.TOP_K, show_default=True, help='Recommendations kept per book.')
+@with_appcontext
+def refresh_recommendations_command(full, top_k):
+    """Updates the "patrons also borrowed" recommendations from borrow history."""
+    recommendations.refresh(full=full, k=top_k, echo=click.echo)
+
+@click.command('archive-history')
+@click.option('--older-than', 'days', type=int, help='Archive records returned more than this many days ago; defaults to ARCHIVE_AFTER_DAYS.')
+@click.option('--batch-size', default=archive.BATCH_SIZE, show_default=True, help='Records moved per transaction.')
+@with_appcontext
+def archive_history_command(days, batch_size):
+    """Moves closed borrow history out of the hot table into the archive."""
+    days = current_app.config.get('ARCHIVE_AFTER_DAYS', 365) if days is None else days
+    moved = archive.archive_closed(days, batch_size, echo=click.echo)
+    live, archived = archive.counts()
+    click.echo(f"Moved {moved} records returned over {days} days ago; {live} live and {archived} archived records.")
+
+@click.command('run-deletions')
+@click.option('--user', 'user_id', type=int, help='Queue the deletion of this account first.')
+@click.option('--book', 'book_id', type=int, help='Queue the deletion of this book first.')
+@click.option('--resume', is_flag=True, help='Also rerun jobs left running by a stopped process.')
+@click.option('--chunk-size', type=int, help='Rows per transaction; defaults to DELETE_CHUNK_SIZE.')
+@with_appcontext
+def run_deletions_command(user_id, book_id, resume, chunk_size):
+    """Runs queued account and book deletions in the foreground, a chunk of rows at a time."""
+    if user_id is not None:
+        user = db.session.get(User, user_id)
+        if user is None or user.role == 'admin':
+            raise click.ClickException(f"No deletable account with id {user_id}.")
+        db.session.add(DeletionJob(kind='user', target_id=user.id, label=user.username,
+                                   total_rows=deletion.user_rows(user.id)))
+    if book_id is not None:
+        book = db.session.get(Book, book_id)
+        if book is None:
+            raise click.ClickException(f"No book with id {book_id}.")
+        db.session.add(DeletionJob(kind='book', target_id=book.id, label=book.title,
+                                   total_rows=deletion.book_rows(book.id)))
+    db.session.commit()
+    statuses = ('queued', 'running') if resume else ('queued',)
+    job_ids = [job_id for job_id, in db.session.query(DeletionJob.id)
+               .filter(DeletionJob.status.in_(statuses)).order_by(DeletionJob.id)]
+    for job_id in job_ids:
+        job = deletion.run_job(job_id, resume=resume, chunk=chunk_size)
+        if job is not None:
+            click.echo(f"Deleted {job.kind} '{job.label}': {job.deleted_rows} related rows.")
+    click.echo(f"Ran {len(job_ids)} deletion jobs.")
+
+@click.command('topup-credits')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv', 'json']), help='Input format; guessed from the file extension by default.')
+@click.option('--reference', help='Batch reference; a reference can only be applied once. Generated if omitted.')
+@click.option('--note', help='Note for rows without their own "note".')
+@with_appcontext
+def topup_credits_command(path, fmt, reference, note):
+    """Adds credits to the patrons listed in a CSV, JSON or JSON-lines file, all in one transaction."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        try:
+            result = credits.top_up(importer.read_records(f, fmt or importer.detect_format(path)), reference, note=note)
+        except credits.TopUpError as e:
+            for row_number, reason in e.rejected[:50]:
+                click.echo(f"Row {row_number}: {reason}", err=True)
+            if len(e.rejected) > 50:
+                click.echo(f"... and {len(e.rejected) - 50} more rejected rows.", err=True)
+            raise click.ClickException(e.message)
+    click.echo(result.summary())
+
+@click.command('verify-credits')
+@with_appcontext
+def verify_credits_command():
+    """Checks every balance against the sum of its credits ledger entries."""
+    mismatched = credits.verify_balances()
+    for user_id, username, balance, ledger in mismatched[:50]:
+        click.echo(f"User {user_id} ({username}): balance {balance:.2f}, ledger {ledger:.2f}", err=True)
+    if mismatched:
+        raise click.ClickException(f"{len(mismatched)} balances do not match the ledger.")
+    click.echo("All balances match the ledger.")
+
+@click.group('db')
+def db_group():
+    """Schema migrations and query-plan checks."""
+
+@db_group.command('upgrade')
+@click.option('--to', 'target', type=int, help='Stop after this migration version.')
+@with_appcontext
+def db_upgrade_command(target):
+    """Applies pending schema migrations."""
+    applied = migrations.upgrade(target, echo=click.echo)
+    click.echo(f"Applied {len(applied)} migrations; schema is at version {migrations.current_version()}.")
+
+@db_group.command('status')
+@with_appcontext
+def db_status_command():
+    """Shows the schema version and any pending migrations."""
+    click.echo(f"Schema version: {migrations.current_version()}")
+    for version, description, _ in migrations.pending():
+        click.echo(f"  pending {version}: {description}")
+
+@db_group.command('check-plans')
+@click.option('--verbose', '-v', is_flag=True, help='Print every plan, not just failures.')
+@with_appcontext
+def db_check_plans_command(verbose):
+    """Fails if any hot-path query plan falls back to a full table scan (SQLite only)."""
+    if db.engine.dialect.name != 'sqlite':
+        click.echo("Query plan checks only run against SQLite.")
+        return
+    failures = 0
+    for name, plan, scans in query_plans.check_plans():
+        if scans:
+            failures += 1
+        if scans or verbose:
+            click.echo(f"{'FULL SCAN' if scans else 'ok'}: {name}")
+            for line in plan:
+                click.echo(f"    {line}")
+    if failures:
+        raise click.ClickException(f"{failures} hot queries fall back to a full table scan.")
+    click.echo("All hot-path queries use indexes.")
+
+def register_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(reconcile_inventory_command)
+    app.cli.add_command(rebuild_sales_rollup_command)
+    app.cli.add_command(import_books_command)
+    app.cli.add_command(build_image_variants_command)
+    app.cli.add_command(accrue_late_fees_command)
+    app.cli.add_command(refresh_recommendations_command)
+    app.cli.add_command(run_deletions_command)
+    app.cli.add_command(archive_history_command)
+    app.cli.add_command(topup_credits_command)
+    app.cli.add_command(verify_credits_command)
+    app.cli.add_command(db_group)
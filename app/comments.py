@@ -0,0 +1,58 @@
+# /library_project/app/comments.py
+
+from datetime import datetime
+from flask import render_template
+from markupsafe import Markup
+from sqlalchemy import func, or_, and_
+from app import db, fragments
+from app.models import Comment, User
+
+PER_PAGE = 20
+
+class CommentPage:
+    """One keyset-paginated page of a book's comments, newest first, as (comment, username) pairs."""
+
+    def __init__(self, comments, total, next_cursor):
+        self.comments = comments
+        self.total = total
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+def _parse_before(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def comment_page(book_id, args, per_page=PER_PAGE):
+    """Builds a page of comments from request args: ``before`` and ``before_id`` continue from the last page."""
+    query = db.session.query(Comment, User.username).join(User, User.id == Comment.user_id) \
+        .filter(Comment.book_id == book_id)
+    before = _parse_before(args.get('before'))
+    before_id = args.get('before_id', type=int)
+    if before is not None and before_id is not None:
+        query = query.filter(or_(Comment.created_at < before,
+                                 and_(Comment.created_at == before, Comment.id < before_id)))
+    rows = query.order_by(Comment.created_at.desc(), Comment.id.desc()).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1][0]
+        next_cursor = {'before': last.created_at.isoformat(), 'before_id': last.id}
+
+    total = db.session.query(func.count(Comment.id)).filter(Comment.book_id == book_id).scalar()
+    return CommentPage(rows, total, next_cursor)
+
+def render_comments(book, endpoint, args, can_delete=False):
+    """Renders the comments section of a book page; the first page comes from the fragment cache."""
+    def render():
+        page = comment_page(book.id, args)
+        return render_template('book_comments.html', book=book, page=page, endpoint=endpoint, can_delete=can_delete)
+
+    if 'before_id' in args:
+        return Markup(render())
+    return fragments.render_cached(book.id, f'comments:{endpoint}', render)
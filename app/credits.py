@@ -0,0 +1,211 @@
+# /library_project/app/credits.py
+
+import io
+import math
+import secrets
+from datetime import datetime
+from sqlalchemy import DDL, String, cast, event, exists, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.importer import UnreadableFile, detect_format, read_records
+from app.models import CreditLedger, LateFee, User
+from app.user_cache import invalidate_on_commit
+
+# Users looked up per IN query when resolving a top-up file.
+LOOKUP_CHUNK = 500
+KEYS = ('user_id', 'username', 'email')
+# Credits are money, so a balance may differ from its ledger sum by float rounding only.
+TOLERANCE = 0.005
+
+# The database refuses to change or remove ledger entries; corrections are new entries.
+event.listen(CreditLedger.__table__, 'after_create', DDL(
+    "CREATE TRIGGER IF NOT EXISTS credit_ledger_no_update BEFORE UPDATE ON credit_ledger "
+    "BEGIN SELECT RAISE(ABORT, 'credit_ledger is append-only'); END"
+).execute_if(dialect='sqlite'))
+event.listen(CreditLedger.__table__, 'after_create', DDL(
+    "CREATE TRIGGER IF NOT EXISTS credit_ledger_no_delete BEFORE DELETE ON credit_ledger "
+    "BEGIN SELECT RAISE(ABORT, 'credit_ledger is append-only'); END"
+).execute_if(dialect='sqlite'))
+event.listen(CreditLedger.__table__, 'after_create', DDL(
+    "CREATE OR REPLACE FUNCTION credit_ledger_append_only() RETURNS trigger AS $$ "
+    "BEGIN RAISE EXCEPTION 'credit_ledger is append-only'; END $$ LANGUAGE plpgsql; "
+    "CREATE TRIGGER credit_ledger_append_only BEFORE UPDATE OR DELETE ON credit_ledger "
+    "FOR EACH ROW EXECUTE FUNCTION credit_ledger_append_only()"
+).execute_if(dialect='postgresql'))
+
+class TopUpError(Exception):
+    """A top-up batch that was not applied. ``rejected`` lists (row number, reason) for bad rows."""
+
+    def __init__(self, message, rejected=(), status=400):
+        super().__init__(message)
+        self.message = message
+        self.rejected = list(rejected)
+        self.status = status
+
+class TopUpResult:
+    def __init__(self, reference, users, total):
+        self.reference = reference
+        self.users = users
+        self.total = total
+
+    def summary(self):
+        return f'Batch "{self.reference}": ${self.total:.2f} added to {self.users} accounts.'
+
+def new_reference():
+    return f'{datetime.utcnow():%Y%m%d-%H%M%S}-{secrets.token_hex(3)}'
+
+def record(user_id, amount, kind, reference=None, note=None, created_by=None):
+    """Appends one ledger entry in the caller's transaction. Zero amounts are not recorded."""
+    if amount:
+        db.session.execute(insert(CreditLedger).values(
+            user_id=user_id, amount=amount, kind=kind, reference=reference,
+            note=note[:200] if note else None, created_by=created_by, created_at=datetime.utcnow()))
+
+def _clean(row):
+    if not isinstance(row, dict):
+        raise ValueError('row is not an object')
+    if '_error' in row:
+        raise ValueError(row['_error'])
+    keys = [key for key in KEYS if row.get(key) not in (None, '')]
+    if len(keys) != 1:
+        raise ValueError('give exactly one of user_id, username or email')
+    key = keys[0]
+    value = str(row[key]).strip()
+    if key == 'user_id':
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValueError('user_id must be a whole number')
+    try:
+        amount = round(float(row.get('amount')), 2)
+    except (TypeError, ValueError):
+        raise ValueError('amount must be a number')
+    if not math.isfinite(amount) or amount <= 0:
+        raise ValueError('amount must be positive')
+    note = row.get('note')
+    return key, value, amount, str(note).strip()[:200] if note else None
+
+def _resolve(wanted):
+    """Maps (key, value) pairs to (user id, role), a chunked IN query per key."""
+    found = {}
+    for key in KEYS:
+        values = list({value for k, value in wanted if k == key})
+        column = User.id if key == 'user_id' else getattr(User, key)
+        for start in range(0, len(values), LOOKUP_CHUNK):
+            rows = db.session.execute(
+                select(column, User.id, User.role).where(column.in_(values[start:start + LOOKUP_CHUNK])))
+            found.update(((key, value), (user_id, role)) for value, user_id, role in rows)
+    return found
+
+def top_up(records, reference=None, created_by=None, note=None):
+    """Adds credits to many patrons in one transaction and commits. Returns a TopUpResult.
+
+    ``records`` are dicts naming a patron by ``user_id``, ``username`` or ``email`` with an
+    ``amount`` and an optional ``note``. The batch is all or nothing: any bad row, unknown or
+    repeated patron rejects it whole. Each patron gets one ledger entry under ``reference`` and
+    every balance then moves in a single UPDATE that adds it, so a batch can never be applied
+    twice under the same reference.
+    """
+    reference = (reference or '').strip()[:100] or new_reference()
+    rows, rejected = [], []
+    try:
+        for row_number, row in enumerate(records, start=1):
+            try:
+                rows.append((row_number,) + _clean(row))
+            except ValueError as e:
+                rejected.append((row_number, str(e)))
+    except UnreadableFile as e:
+        raise TopUpError(f'Could not read the file: {e}; no credits were added.')
+    found = _resolve({(key, value) for _, key, value, _, _ in rows})
+
+    entries, seen = {}, {}
+    for row_number, key, value, amount, row_note in rows:
+        user_id, role = found.get((key, value), (None, None))
+        if user_id is None:
+            rejected.append((row_number, f'no account with {key} {value}'))
+        elif role != 'user':
+            rejected.append((row_number, f'{value} is not a patron account'))
+        elif user_id in seen:
+            rejected.append((row_number, f'same patron as row {seen[user_id]}'))
+        else:
+            seen[user_id] = row_number
+            entries[user_id] = {'user_id': user_id, 'amount': amount, 'kind': 'topup', 'reference': reference,
+                                'note': row_note or note, 'created_by': created_by}
+    if rejected:
+        rejected.sort()
+        raise TopUpError(f'{len(rejected)} rows rejected; no credits were added.', rejected)
+    if not entries:
+        raise TopUpError('The batch has no rows.')
+    in_batch = (CreditLedger.kind == 'topup', CreditLedger.reference == reference)
+    if db.session.execute(select(exists().where(*in_batch))).scalar():
+        raise TopUpError(f'Batch "{reference}" was already applied.', status=409)
+
+    now = datetime.utcnow()
+    try:
+        db.session.execute(CreditLedger.__table__.insert(), [dict(entry, created_at=now) for entry in entries.values()])
+    except IntegrityError:
+        db.session.rollback()
+        raise TopUpError(f'Batch "{reference}" was already applied.', status=409)
+    added = select(CreditLedger.amount).where(*in_batch, CreditLedger.user_id == User.id).scalar_subquery()
+    db.session.execute(
+        update(User).where(User.id.in_(select(CreditLedger.user_id).where(*in_batch)))
+        .values(credits=func.coalesce(User.credits, 0) + added),
+        execution_options={'synchronize_session': False},
+    )
+    for user_id in entries:
+        invalidate_on_commit(user_id)
+    db.session.commit()
+    return TopUpResult(reference, len(entries), round(sum(entry['amount'] for entry in entries.values()), 2))
+
+def top_up_upload(file_storage, reference=None, created_by=None, note=None):
+    """Runs a top-up straight from an uploaded CSV, JSON or JSON-lines file."""
+    stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    return top_up(read_records(stream, detect_format(file_storage.filename)), reference, created_by, note)
+
+def record_late_fees(*conditions):
+    """Appends a charge per LateFee row matching ``conditions``, referencing the fee's id."""
+    db.session.execute(insert(CreditLedger).from_select(
+        ['user_id', 'amount', 'kind', 'reference', 'note', 'created_at'],
+        select(LateFee.user_id, -LateFee.amount, literal('late_fee'), cast(LateFee.id, String),
+               LateFee.book_title, literal(datetime.utcnow(), db.DateTime))
+        .where(*conditions, LateFee.amount != 0),
+    ))
+
+def open_balances():
+    """Records each user's current credits as an opening entry unless they already have ledger entries."""
+    return db.session.execute(insert(CreditLedger).from_select(
+        ['user_id', 'amount', 'kind', 'created_at'],
+        select(User.id, User.credits, literal('opening'), literal(datetime.utcnow(), db.DateTime))
+        .where(User.credits.isnot(None), User.credits != 0,
+               ~exists().where(CreditLedger.user_id == User.id)),
+    )).rowcount
+
+def ledger_totals():
+    """Each user's ledger sum; a scan of ix_credit_ledger_user_amount alone."""
+    return select(CreditLedger.user_id, func.sum(CreditLedger.amount).label('total')) \
+        .group_by(CreditLedger.user_id).subquery()
+
+def verify_balances():
+    """(user id, username, credits, ledger sum) for every account whose balance disagrees with its ledger."""
+    totals = ledger_totals()
+    balance, ledger = func.coalesce(User.credits, 0), func.coalesce(totals.c.total, 0)
+    return db.session.execute(
+        select(User.id, User.username, balance, ledger)
+        .outerjoin(totals, totals.c.user_id == User.id)
+        .where(func.abs(balance - ledger) > TOLERANCE)
+        .order_by(User.id)
+    ).all()
+
+def recent_batches(limit=20):
+    """(reference, patrons, total, applied at, created by) for the latest top-up batches."""
+    return db.session.execute(
+        select(CreditLedger.reference, func.count(), func.sum(CreditLedger.amount),
+               func.min(CreditLedger.created_at), func.min(CreditLedger.created_by))
+        .where(CreditLedger.kind == 'topup')
+        .group_by(CreditLedger.reference)
+        .order_by(func.max(CreditLedger.id).desc()).limit(limit)
+    ).all()
+
+def entries(user_id, limit=200):
+    return CreditLedger.query.filter(CreditLedger.user_id == user_id) \
+        .order_by(CreditLedger.id.desc()).limit(limit).all()
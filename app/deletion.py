@@ -0,0 +1,199 @@
+# /library_project/app/deletion.py
+
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from app import db, fragments, images, ratings
+from app.http_cache import bump_catalog_version
+from app.inventory import add_available
+from app.models import ArchivedBorrow, Book, BookRecommendation, BorrowHistory, Comment, DeletionJob, Purchase, Rating, UniqueBook, User
+from app.search import unindex_book
+from app.user_cache import invalidate_on_commit
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Every statement below deletes children before parents, so nothing relies on the database
+# enforcing foreign keys (SQLite only does with PRAGMA foreign_keys=ON, which older schemas
+# without ON DELETE clauses cannot turn on).
+
+def _user_children(user_id):
+    return [
+        (BorrowHistory, BorrowHistory.user_id == user_id),
+        (ArchivedBorrow, ArchivedBorrow.user_id == user_id),
+        (Comment, Comment.user_id == user_id),
+        (Purchase, Purchase.user_id == user_id),
+    ]
+
+def _book_children(book_id):
+    copies = select(UniqueBook.id).where(UniqueBook.book_id == book_id)
+    return [
+        (BorrowHistory, BorrowHistory.copy_id.in_(copies)),
+        (ArchivedBorrow, ArchivedBorrow.copy_id.in_(copies)),
+        (UniqueBook, UniqueBook.book_id == book_id),
+        (Rating, Rating.book_id == book_id),
+        (Comment, Comment.book_id == book_id),
+    ]
+
+def _count(children):
+    return sum(db.session.execute(select(func.count()).where(condition)).scalar() for _, condition in children)
+
+def user_rows(user_id):
+    """How many rows deleting an account removes besides the user itself."""
+    return _count(_user_children(user_id)) + db.session.execute(
+        select(func.count()).where(Rating.user_id == user_id)).scalar()
+
+def book_rows(book_id):
+    """How many rows deleting a book removes besides the book itself."""
+    return _count(_book_children(book_id))
+
+def _delete_all(model, condition):
+    return db.session.execute(delete(model).where(condition), execution_options={'synchronize_session': False}).rowcount
+
+def _drain(children, chunk, progress):
+    """Deletes the child rows ``chunk`` at a time, committing after each chunk so no writer waits long."""
+    for model, condition in children:
+        while True:
+            batch = select(model.id).where(condition).limit(chunk).scalar_subquery()
+            removed = _delete_all(model, model.id.in_(batch))
+            if progress:
+                progress(removed)
+            db.session.commit()
+            if removed < chunk:
+                break
+
+def delete_user(user_id, chunk=None, progress=None):
+    """Deletes an account and everything hanging off it with bulk statements. Returns the rows removed.
+
+    Copies on loan go back on the shelf and the user's ratings leave the book aggregates. Without
+    ``chunk`` it all happens in the caller's transaction; with it the history, comments and
+    purchases are drained first in committed chunks, then the last transaction sweeps up anything
+    added meanwhile and removes the user.
+    """
+    children = _user_children(user_id)
+    commented = db.session.execute(select(Comment.book_id).where(Comment.user_id == user_id).distinct()).scalars().all()
+    if chunk:
+        _drain(children, chunk, progress)
+    returned = db.session.execute(
+        update(UniqueBook).where(UniqueBook.borrower_id == user_id)
+        .values(status='available', borrower_id=None, borrowed_on=None, due_date=None)
+        .returning(UniqueBook.book_id)
+    ).scalars().all()
+    add_available(Counter(returned))
+    removed = db.session.execute(select(func.count()).where(Rating.user_id == user_id)).scalar()
+    ratings.remove_user_ratings(user_id)
+    removed += sum(_delete_all(model, condition) for model, condition in children)
+    _delete_all(User, User.id == user_id)
+    invalidate_on_commit(user_id)
+    for book_id in commented:
+        fragments.invalidate_on_commit(book_id)
+    bump_catalog_version()
+    if progress:
+        progress(removed)
+    return removed
+
+def delete_book(book_id, chunk=None, progress=None):
+    """Deletes a book with its copies, their history, ratings, comments and recommendations. Returns the rows removed.
+
+    Chunking works as in ``delete_user``. The cover image is left for ``release_image``, to be
+    called once the deletion has committed.
+    """
+    children = _book_children(book_id)
+    if chunk:
+        _drain(children, chunk, progress)
+    removed = sum(_delete_all(model, condition) for model, condition in children)
+    _delete_all(BookRecommendation, BookRecommendation.book_id == book_id)
+    unindex_book(book_id)
+    _delete_all(Book, Book.id == book_id)
+    fragments.invalidate_on_commit(book_id)
+    bump_catalog_version()
+    if progress:
+        progress(removed)
+    return removed
+
+def release_image(filename):
+    """Removes a deleted book's cover unless another book shares it (images are stored by content hash)."""
+    if filename and not db.session.query(Book.id).filter(Book.image == filename).first():
+        images.remove_image(current_app.config['UPLOAD_FOLDER'], filename)
+
+# --- Background jobs ----------------------------------------------------------------------------
+
+def pending_job(kind, target_id):
+    return DeletionJob.query.filter(DeletionJob.kind == kind, DeletionJob.target_id == target_id,
+                                    DeletionJob.status.in_(('queued', 'running'))).first()
+
+def queue(kind, target_id, label, total_rows, requested_by=None):
+    """Records a deletion job and starts it on this process's worker thread. Commits."""
+    global _executor
+    job = DeletionJob(kind=kind, target_id=target_id, label=label, total_rows=total_rows, requested_by=requested_by)
+    db.session.add(job)
+    db.session.commit()
+    app = current_app._get_current_object()
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='deletions')
+    _executor.submit(_run_in_context, app, job.id)
+    return job
+
+def _run_in_context(app, job_id):
+    with app.app_context():
+        try:
+            run_job(job_id)
+        except Exception:
+            log.exception("Deletion job %s failed", job_id)
+
+def run_job(job_id, resume=False, chunk=None):
+    """Runs one deletion job if it is still queued (or running, with ``resume``). Returns the job, or None if taken."""
+    claimable = ('queued', 'running') if resume else ('queued',)
+    claimed = db.session.execute(
+        update(DeletionJob).where(DeletionJob.id == job_id, DeletionJob.status.in_(claimable))
+        .values(status='running', started_at=datetime.utcnow(), error=None)
+        .returning(DeletionJob.id)
+    ).scalar()
+    db.session.commit()
+    if claimed is None:
+        return None
+    job = db.session.get(DeletionJob, job_id)
+    kind, target_id = job.kind, job.target_id
+
+    def progress(removed):
+        db.session.execute(update(DeletionJob).where(DeletionJob.id == job_id)
+                           .values(deleted_rows=DeletionJob.deleted_rows + removed))
+
+    chunk = chunk or current_app.config.get('DELETE_CHUNK_SIZE', CHUNK_SIZE)
+    image = None
+    try:
+        if kind == 'user':
+            delete_user(target_id, chunk, progress)
+        else:
+            image = db.session.query(Book.image).filter(Book.id == target_id).scalar()
+            delete_book(target_id, chunk, progress)
+        db.session.execute(update(DeletionJob).where(DeletionJob.id == job_id)
+                           .values(status='done', finished_at=datetime.utcnow()))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        db.session.execute(update(DeletionJob).where(DeletionJob.id == job_id)
+                           .values(status='failed', finished_at=datetime.utcnow(), error=str(e)[:1000]))
+        db.session.commit()
+        raise
+    if image:
+        try:
+            release_image(image)
+        except (OSError, ValueError) as e:
+            log.warning("Could not remove image %s of deleted book %s: %s", image, target_id, e)
+    return db.session.get(DeletionJob, job_id)
+
+def recent_jobs(kind=None, limit=50):
+    query = DeletionJob.query
+    if kind:
+        query = query.filter(DeletionJob.kind == kind)
+    return query.order_by(DeletionJob.id.desc()).limit(limit).all()
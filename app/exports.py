@@ -0,0 +1,96 @@
+# /library_project/app/exports.py
+
+import csv
+import zlib
+from io import StringIO
+from datetime import date, datetime, timedelta
+from flask import Response, stream_with_context
+from app import db, archive
+from app.models import Purchase, UniqueBook, Book, User
+
+# Rows fetched per round trip, and roughly how much CSV text is buffered before each yield.
+YIELD_PER = 1000
+CHUNK_SIZE = 64 * 1024
+
+def _csv_chunks(header, rows):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def csv_response(filename, header, rows, compress=False):
+    """Streams ``rows`` as a CSV download, optionally gzipped, without building the file in memory."""
+    chunks = _csv_chunks(header, rows)
+    if compress:
+        return Response(stream_with_context(_gzip_chunks(chunks)), mimetype='application/gzip',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.gz'})
+    return Response(stream_with_context(chunks), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def _format_date(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else None
+
+def parse_date_range(args):
+    """Reads optional ``start``/``end`` (YYYY-MM-DD) args as a half-open datetime range; missing or bad values are open-ended."""
+    bounds = []
+    for name, shift in (('start', 0), ('end', 1)):
+        try:
+            day = date.fromisoformat(args.get(name, ''))
+            bounds.append(datetime.combine(day + timedelta(days=shift), datetime.min.time()))
+        except (ValueError, OverflowError):  # an end of 9999-12-31 has no next day; leave it open
+            bounds.append(None)
+    return tuple(bounds)
+
+def wants_gzip(args):
+    """Whether the ``gzip`` arg asks for a compressed download; ``gzip=0`` or ``gzip=false`` does not."""
+    return args.get('gzip', '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _in_range(query, column, start, end):
+    if start:
+        query = query.filter(column >= start)
+    if end:
+        query = query.filter(column < end)
+    return query
+
+def purchase_rows(user_id=None, start=None, end=None, with_user=False):
+    columns = [Purchase.book_title, Purchase.book_author, Purchase.price_paid, Purchase.bought_on]
+    if with_user:
+        columns = [User.username, User.email] + columns
+    query = db.session.query(*columns)
+    if with_user:
+        query = query.join(User, User.id == Purchase.user_id)
+    if user_id is not None:
+        query = query.filter(Purchase.user_id == user_id)
+    query = _in_range(query, Purchase.bought_on, start, end).order_by(Purchase.bought_on).yield_per(YIELD_PER)
+    for row in query:
+        *lead, price_paid, bought_on = row
+        yield [*lead, f"${price_paid:.2f}", _format_date(bought_on)]
+
+def borrow_rows(user_id=None, start=None, end=None, with_user=False):
+    records = archive.history(user_id=user_id, start=start, end=end)
+    columns = [records.c.copy_id, Book.title, records.c.borrowed_on, records.c.returned_on]
+    if with_user:
+        columns = [User.username, User.email] + columns
+    query = db.session.query(*columns) \
+        .join(UniqueBook, UniqueBook.id == records.c.copy_id) \
+        .join(Book, Book.id == UniqueBook.book_id)
+    if with_user:
+        query = query.join(User, User.id == records.c.user_id)
+    query = query.order_by(records.c.borrowed_on.desc()).yield_per(YIELD_PER)
+    for row in query:
+        *lead, borrowed_on, returned_on = row
+        yield [*lead, _format_date(borrowed_on), _format_date(returned_on) or 'Not Returned']
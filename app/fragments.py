@@ -0,0 +1,123 @@
+# /library_project/app/fragments.py
+
+import threading
+import time
+from collections import OrderedDict
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from flask import current_app
+from app import db
+from app.http_cache import catalog_version
+from app.models import Book, UniqueBook, Comment
+
+class FragmentCache:
+    """Thread-safe LRU of rendered HTML fragments per book, with a TTL.
+
+    Entries are keyed by book id and hold every fragment rendered for that book, so one
+    ``invalidate`` drops them all. Version stamps work as in ``UserCache``: a fragment rendered
+    while its book was being changed is never stored.
+
+    Invalidation only reaches this process, so each entry also carries the catalog version it was
+    rendered under and is served only while that version is current. Other workers' writes bump
+    the catalog version, so they drop this process's fragments within CATALOG_VERSION_TTL.
+    """
+
+    def __init__(self, maxsize=2048, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # book_id -> (expires_at, catalog version, {name: html})
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, book_id, name, catalog):
+        with self._lock:
+            entry = self._entries.get(book_id)
+            if entry is None:
+                return None
+            expires_at, rendered_under, fragments = entry
+            if expires_at < time.monotonic() or rendered_under != catalog:
+                del self._entries[book_id]
+                return None
+            self._entries.move_to_end(book_id)
+            return fragments.get(name)
+
+    def version(self, book_id):
+        with self._lock:
+            return self._versions.get(book_id, 0)
+
+    def put(self, book_id, name, html, version, catalog):
+        with self._lock:
+            if self._versions.get(book_id, 0) != version:
+                return
+            entry = self._entries.get(book_id)
+            if entry is None or entry[0] < time.monotonic() or entry[1] != catalog:
+                entry = (time.monotonic() + self.ttl, catalog, {})
+                self._entries[book_id] = entry
+            entry[2][name] = html
+            self._entries.move_to_end(book_id)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self._versions.pop(evicted, None)
+
+    def invalidate(self, book_id):
+        with self._lock:
+            self._entries.pop(book_id, None)
+            self._versions[book_id] = self._versions.get(book_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+cache = FragmentCache()
+
+def configure(app):
+    cache.maxsize = app.config.get('FRAGMENT_CACHE_SIZE', cache.maxsize)
+    cache.ttl = app.config.get('FRAGMENT_CACHE_TTL', cache.ttl)
+
+def render_cached(book_id, name, render):
+    """Returns fragment ``name`` of a book, calling ``render()`` for its HTML only on a miss."""
+    if not current_app.config.get('FRAGMENT_CACHE_TTL'):
+        return Markup(render())
+
+    catalog, _ = catalog_version()
+    html = cache.get(book_id, name, catalog)
+    if html is None:
+        version = cache.version(book_id)
+        html = render()
+        cache.put(book_id, name, html, version, catalog)
+    return Markup(html)
+
+def invalidate_on_commit(book_id):
+    """Drops a book's cached fragments once the current transaction commits.
+
+    Needed after bulk statements on books or copies, which the ORM flush hooks below cannot see.
+    """
+    db.session.info.setdefault('stale_books', set()).add(book_id)
+    cache.invalidate(book_id)
+
+def _book_id(obj):
+    if isinstance(obj, Book):
+        return obj.id
+    if isinstance(obj, (UniqueBook, Comment)):
+        return obj.book_id
+    return None
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_books(session, flush_context):
+    changed = {_book_id(obj) for obj in session.new | session.dirty | session.deleted} - {None}
+    if changed:
+        session.info.setdefault('stale_books', set()).update(changed)
+        for book_id in changed:
+            cache.invalidate(book_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_books(session):
+    # Same double invalidation as the user cache: a render may have re-cached between flush and commit.
+    for book_id in session.info.pop('stale_books', ()):
+        cache.invalidate(book_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_books(session):
+    session.info.pop('stale_books', None)
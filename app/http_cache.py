@@ -0,0 +1,97 @@
+# /library_project/app/http_cache.py
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models import CatalogVersion
+from app.sales import dialect_insert
+
+_lock = threading.Lock()
+_cached = None  # (expires_at, version, updated_at)
+
+def bump_catalog_version():
+    """Moves the catalog version stamp forward in the caller's transaction.
+
+    Call it from every request that changes what catalog or book pages show.
+    """
+    now = datetime.utcnow()
+    insert = dialect_insert(db.engine.dialect.name)
+    stmt = insert(CatalogVersion).values(id=1, version=1, updated_at=now)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[CatalogVersion.id],
+        set_={'version': CatalogVersion.version + 1, 'updated_at': stmt.excluded.updated_at},
+    ))
+    db.session.info['catalog_bumped'] = True
+
+def catalog_version():
+    """Returns (version, updated_at), re-read from the database at most every CATALOG_VERSION_TTL seconds.
+
+    This process sees its own bumps at once; bumps made by other workers show up within the TTL.
+    """
+    global _cached
+    with _lock:
+        cached = _cached
+    if cached and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    row = db.session.get(CatalogVersion, 1)
+    version, updated_at = (row.version, row.updated_at) if row else (0, None)
+    with _lock:
+        _cached = (time.monotonic() + current_app.config.get('CATALOG_VERSION_TTL', 2), version, updated_at)
+    return version, updated_at
+
+def _forget():
+    global _cached
+    with _lock:
+        _cached = None
+
+@event.listens_for(Session, 'after_commit')
+def _drop_committed_version(session):
+    if session.info.pop('catalog_bumped', False):
+        _forget()
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_bump(session):
+    session.info.pop('catalog_bumped', None)
+
+def _etag(version):
+    # The navbar shows who is logged in and their credits, so those are part of the page too.
+    viewer = f'{current_user.id}:{current_user.role}:{current_user.credits}' if current_user.is_authenticated else '-'
+    return hashlib.sha1(f'{version}|{viewer}'.encode()).hexdigest()[:20]
+
+def _validators(response, etag, updated_at):
+    response.set_etag(etag, weak=True)
+    if updated_at:
+        response.last_modified = updated_at.replace(tzinfo=timezone.utc)
+    # Pages are per user: browsers may keep them but must revalidate, and shared caches must not.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def conditional_on_catalog(view):
+    """Adds ETag/Last-Modified from the catalog version to a page and answers revalidations with 304.
+
+    A matching ``If-None-Match`` gets its 304 before the view runs. ``If-Modified-Since`` alone is
+    not trusted, since Last-Modified does not cover the viewer's credits. Pages with pending flash
+    messages are always rendered.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET' or session.get('_flashes'):
+            return view(*args, **kwargs)
+        version, updated_at = catalog_version()
+        etag = _etag(version)
+        if request.if_none_match.contains_weak(etag):
+            return _validators(current_app.response_class(status=304), etag, updated_at)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            _validators(response, etag, updated_at)
+        return response
+    return wrapper
@@ -0,0 +1,136 @@
+# /library_project/app/images.py
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+
+log = logging.getLogger(__name__)
+
+# variant name -> bounding box (width, height); images are scaled down to fit, keeping their aspect ratio.
+VARIANTS = {
+    'thumb': (160, 240),
+    'card': (400, 400),
+    'detail': (900, 1200),
+}
+VARIANT_DIR = 'variants'
+VARIANT_FORMAT = 'WEBP'
+VARIANT_EXT = '.webp'
+VARIANT_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=current_app.config.get('IMAGE_WORKERS', 2),
+                                           thread_name_prefix='image-variants')
+        return _executor
+
+def _safe_ext(filename):
+    ext = os.path.splitext(filename or '')[1].lower()
+    return ext if re.fullmatch(r'\.[a-z0-9]{1,5}', ext) else ''
+
+def _upload_path(upload_folder, filename):
+    """The real path of an upload, refusing any name that resolves outside ``upload_folder``."""
+    root = os.path.realpath(upload_folder)
+    path = os.path.realpath(os.path.join(root, filename))
+    if os.path.dirname(path) != root:
+        raise ValueError(f"{filename} is not a file in the upload folder")
+    return path
+
+def variant_name(filename, size):
+    return f"{os.path.splitext(filename)[0]}-{size}{VARIANT_EXT}"
+
+def save_upload(file_storage, upload_folder):
+    """Stores an uploaded image under the SHA-256 of its contents and queues its resized variants.
+
+    Identical uploads map to the same file, so they are stored once and never overwrite a different book's image.
+    Returns the stored filename.
+    """
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    with os.fdopen(fd, 'wb') as out:
+        for chunk in iter(lambda: file_storage.stream.read(64 * 1024), b''):
+            digest.update(chunk)
+            out.write(chunk)
+
+    filename = digest.hexdigest() + _safe_ext(file_storage.filename)
+    path = os.path.join(upload_folder, filename)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    queue_variants(upload_folder, filename)
+    return filename
+
+def queue_variants(upload_folder, filename):
+    """Generates an image's variants on the worker pool, off the request path."""
+    key = (upload_folder, filename)
+    with _executor_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    _get_executor().submit(_build_queued, upload_folder, filename)
+
+def _build_queued(upload_folder, filename):
+    try:
+        build_variants(upload_folder, filename)
+    except Exception:
+        log.exception("Building variants for %s failed", filename)
+    finally:
+        with _executor_lock:
+            _pending.discard((upload_folder, filename))
+
+def build_variants(upload_folder, filename, force=False):
+    """Writes every missing variant of one image. Returns the number of variants written."""
+    source = _upload_path(upload_folder, filename)
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        log.warning("Pillow is not installed; serving original images only.")
+        return 0
+
+    variant_folder = os.path.join(upload_folder, VARIANT_DIR)
+    os.makedirs(variant_folder, exist_ok=True)
+    todo = {size: os.path.join(variant_folder, variant_name(filename, size)) for size in VARIANTS}
+    if not force:
+        todo = {size: path for size, path in todo.items() if not os.path.exists(path)}
+    if not todo:
+        return 0
+
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        mode = 'RGBA' if original.mode in ('RGBA', 'LA', 'P') else 'RGB'
+        original = original.convert(mode)
+        for size, path in todo.items():
+            variant = original.copy()
+            variant.thumbnail(VARIANTS[size], Image.LANCZOS)
+            # Write next to the target and rename, so a half-written file is never served.
+            fd, tmp_path = tempfile.mkstemp(dir=variant_folder, suffix='.part')
+            with os.fdopen(fd, 'wb') as out:
+                variant.save(out, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+            os.replace(tmp_path, path)
+    return len(todo)
+
+def remove_image(upload_folder, filename):
+    """Deletes an original upload and its variants. Raises ValueError for a name outside the upload folder."""
+    paths = [_upload_path(upload_folder, filename)]
+    paths += [os.path.join(upload_folder, VARIANT_DIR, variant_name(filename, size)) for size in VARIANTS]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+def image_url(filename, size='card'):
+    """URL of the best available rendition of an upload: its ``size`` variant once built, else the original."""
+    variant = variant_name(filename, size)
+    if os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], VARIANT_DIR, variant)):
+        return url_for('static', filename=f'uploads/{VARIANT_DIR}/{variant}')
+    return url_for('static', filename=f'uploads/{filename}')
@@ -0,0 +1,185 @@
+# /library_project/app/importer.py
+
+import csv
+import io
+import json
+import os
+import time
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.utils import secure_filename
+from app import db, search
+from app.models import Book, UniqueBook, BookType
+
+BATCH_SIZE = 2000
+REQUIRED_FIELDS = ('title', 'author', 'isbn', 'publisher', 'book_type_id')
+TEXT_FIELDS = {'title': 200, 'author': 100, 'isbn': 20, 'publisher': 100, 'description': None, 'image': 200}
+FLOAT_FIELDS = ('price', 'cost_per_day')
+INT_FIELDS = ('genre_id', 'book_type_id')
+
+class ImportReport:
+    """Counts and rejected rows from one import run."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.copies = 0
+        self.duplicates = 0
+        self.rejected = []  # (row number, reason)
+        self.error = None  # why reading stopped early, if it did
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows(self):
+        return self.inserted + self.duplicates + len(self.rejected)
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        summary = (f"{self.rows} rows in {self.elapsed:.2f}s ({self.rate:.0f} rows/s): "
+                   f"{self.inserted} books and {self.copies} copies added, "
+                   f"{self.duplicates} duplicate ISBNs skipped, {len(self.rejected)} rejected.")
+        return f"Stopped reading the file: {self.error}. {summary}" if self.error else summary
+
+class UnreadableFile(ValueError):
+    """The input is not valid text of its format as a whole (bad encoding, malformed JSON array)."""
+
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.json'):
+        return 'json'
+    return 'jsonl'
+
+def read_records(stream, fmt):
+    """Yields records from a text stream of JSON lines, CSV with a header row, or a JSON array.
+
+    JSON lines and CSV are read one row at a time; a JSON array is loaded whole, so keep it for small files.
+    A line that is not valid JSON comes out as an ``_error`` record; input that cannot be read at all
+    raises UnreadableFile, possibly after earlier rows were yielded.
+    """
+    try:
+        if fmt == 'csv':
+            for row in csv.DictReader(stream):
+                yield {key: (value if value != '' else None) for key, value in row.items()}
+        elif fmt == 'json':
+            try:
+                records = json.load(stream)
+            except json.JSONDecodeError as e:
+                raise UnreadableFile(f'invalid JSON: {e.msg} (line {e.lineno})')
+            if not isinstance(records, list):
+                raise UnreadableFile('a .json file must hold an array of records')
+            yield from records
+        else:
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield {'_error': f'invalid JSON: {e.msg}'}
+    except UnicodeDecodeError:
+        raise UnreadableFile('the file is not UTF-8 text')
+    except csv.Error as e:
+        raise UnreadableFile(f'invalid CSV: {e}')
+
+def _clean(record, book_types, default_copies, upload_folder):
+    if not isinstance(record, dict):
+        raise ValueError('row is not an object')
+    if '_error' in record:
+        raise ValueError(record['_error'])
+    missing = [f for f in REQUIRED_FIELDS if record.get(f) in (None, '')]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    book = {}
+    for field, limit in TEXT_FIELDS.items():
+        value = record.get(field)
+        value = str(value).strip() if value is not None else None
+        if limit and value and len(value) > limit:
+            raise ValueError(f"{field} longer than {limit} characters")
+        book[field] = value or None
+    image = book['image']
+    if image and (secure_filename(image) != image or not os.path.isfile(os.path.join(upload_folder, image))):
+        raise ValueError(f"image {image} is not a file in the upload folder")
+    try:
+        for field in FLOAT_FIELDS:
+            book[field] = float(record[field]) if record.get(field) not in (None, '') else None
+        for field in INT_FIELDS:
+            book[field] = int(record[field]) if record.get(field) not in (None, '') else None
+        copies = int(record['copies']) if record.get('copies') not in (None, '') else default_copies
+    except (TypeError, ValueError):
+        raise ValueError("price, cost_per_day, genre_id, book_type_id and copies must be numbers")
+    if book['book_type_id'] not in book_types:
+        raise ValueError(f"unknown book_type_id {book['book_type_id']}")
+    if copies < 0:
+        raise ValueError("copies cannot be negative")
+
+    book['total_copies'] = book['available_copies'] = copies
+    return book
+
+def _flush_batch(batch, report):
+    isbns = [book['isbn'] for _, book in batch]
+    existing = set(db.session.execute(db.select(Book.isbn).where(Book.isbn.in_(isbns))).scalars())
+    fresh = []
+    for _, book in batch:
+        if book['isbn'] in existing:
+            report.duplicates += 1
+        else:
+            existing.add(book['isbn'])  # also dedupes repeats within the batch
+            fresh.append(book)
+    if not fresh:
+        return
+
+    ids = db.session.execute(insert(Book).returning(Book.id, Book.isbn), fresh).all()
+    id_by_isbn = {isbn: book_id for book_id, isbn in ids}
+    copies = [
+        {'book_id': id_by_isbn[book['isbn']], 'status': 'available'}
+        for book in fresh for _ in range(book['total_copies'])
+    ]
+    if copies:
+        db.session.execute(insert(UniqueBook), copies)
+    search.index_rows([dict(book, id=id_by_isbn[book['isbn']]) for book in fresh])
+    db.session.commit()
+    report.inserted += len(fresh)
+    report.copies += len(copies)
+
+def import_books(records, default_copies=1, batch_size=BATCH_SIZE):
+    """Loads book records in batches of core INSERTs, skipping ISBNs that already exist.
+
+    Each batch commits on its own, so re-running an import (or resuming a failed one) is safe.
+    If the input turns out to be unreadable, the rows read before that are still loaded and
+    ``report.error`` says what went wrong.
+    """
+    report = ImportReport()
+    book_types = set(db.session.execute(db.select(BookType.id)).scalars())
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    search.create_index()
+
+    batch = []
+    try:
+        for row_number, record in enumerate(records, start=1):
+            try:
+                batch.append((row_number, _clean(record, book_types, default_copies, upload_folder)))
+            except ValueError as e:
+                report.rejected.append((row_number, str(e)))
+                continue
+            if len(batch) >= batch_size:
+                _flush_batch(batch, report)
+                batch = []
+    except UnreadableFile as e:
+        report.error = str(e)
+    if batch:
+        _flush_batch(batch, report)
+
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+def import_upload(file_storage, default_copies=1):
+    """Runs an import straight from an uploaded file without saving it to disk."""
+    stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    return import_books(read_records(stream, detect_format(file_storage.filename)), default_copies)
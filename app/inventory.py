@@ -0,0 +1,199 @@
+# /library_project/app/inventory.py
+
+from sqlalchemy import func, case, update, delete, select, exists
+from sqlalchemy.orm import aliased, joinedload
+from app import db, credits, fragments
+from app.models import ArchivedBorrow, Book, UniqueBook, BorrowHistory, User
+from app.user_cache import invalidate_on_commit
+
+# How often a claim is retried when another transaction took the copy we picked first.
+CLAIM_RETRIES = 5
+
+def adjust_counts(book_id, total=0, available=0):
+    """Shifts a book's stock counters in the caller's transaction.
+
+    The increment happens in SQL so concurrent requests cannot overwrite each other's changes.
+    """
+    if not total and not available:
+        return
+    fragments.invalidate_on_commit(book_id)
+    db.session.execute(
+        update(Book).where(Book.id == book_id).values(
+            total_copies=Book.total_copies + total,
+            available_copies=Book.available_copies + available,
+        )
+    )
+
+def add_available(counts):
+    """Adds ``counts[book_id]`` to each book's available counter with one UPDATE, e.g. after a bulk return."""
+    if not counts:
+        return
+    for book_id in counts:
+        fragments.invalidate_on_commit(book_id)
+    db.session.execute(
+        update(Book).where(Book.id.in_(list(counts)))
+        .values(available_copies=Book.available_copies + case(counts, value=Book.id, else_=0)),
+        execution_options={'synchronize_session': False},
+    )
+
+def copies_with_borrowers(book_id):
+    """A book's copies in id order with their borrowers loaded by the same query."""
+    return UniqueBook.query.options(joinedload(UniqueBook.borrower)) \
+        .filter_by(book_id=book_id).order_by(UniqueBook.id).all()
+
+def _first_available(book_id):
+    return select(UniqueBook.id).where(
+        UniqueBook.book_id == book_id, UniqueBook.status == 'available'
+    ).limit(1).scalar_subquery()
+
+def account_exists(user_id):
+    return exists().where(User.id == user_id)
+
+def claim_copy(book_id, user_id, borrowed_on, due_date):
+    """Marks one available copy of a book as borrowed by ``user_id``.
+
+    The copy is picked and claimed by a single conditional UPDATE, so two patrons can never
+    end up holding the same copy, and a patron can never hold two copies of one book. The
+    UPDATE also requires the account to exist: another worker may still be serving a deleted
+    user from its cache. Returns the claimed copy id, or None if there was nothing to claim.
+    """
+    held = aliased(UniqueBook)
+    already_holding = exists().where(
+        held.book_id == book_id, held.borrower_id == user_id, held.status == 'borrowed'
+    )
+    for _ in range(CLAIM_RETRIES):
+        copy_id = db.session.execute(
+            update(UniqueBook)
+            .where(UniqueBook.id == _first_available(book_id), UniqueBook.status == 'available', ~already_holding,
+                   account_exists(user_id))
+            .values(status='borrowed', borrower_id=user_id, borrowed_on=borrowed_on, due_date=due_date)
+            .returning(UniqueBook.id)
+        ).scalar()
+        if copy_id is not None:
+            adjust_counts(book_id, available=-1)
+            return copy_id
+        if not db.session.query(_first_available(book_id)).scalar():
+            return None
+        if not db.session.query(account_exists(user_id)).scalar():
+            return None
+    return None
+
+def release_copy(copy_id, user_id):
+    """Returns a borrowed copy to the shelf if ``user_id`` still holds it. Returns True on success."""
+    book_id = db.session.execute(
+        update(UniqueBook)
+        .where(UniqueBook.id == copy_id, UniqueBook.borrower_id == user_id, UniqueBook.status == 'borrowed')
+        .values(status='available', borrower_id=None, borrowed_on=None, due_date=None)
+        .returning(UniqueBook.book_id)
+    ).scalar()
+    if book_id is None:
+        return False
+    adjust_counts(book_id, available=1)
+    return True
+
+# Copy ids per IN (...) list when removing several copies' history.
+IN_CHUNK = 500
+
+def _remove_copy_history(*copy_ids):
+    for start in range(0, len(copy_ids), IN_CHUNK):
+        chunk = copy_ids[start:start + IN_CHUNK]
+        for model in (BorrowHistory, ArchivedBorrow):
+            db.session.execute(delete(model).where(model.copy_id.in_(chunk)),
+                               execution_options={'synchronize_session': False})
+
+def sell_available_copy(book_id):
+    """Removes one available copy of a book from stock. Returns its id, or None if the book is sold out."""
+    for _ in range(CLAIM_RETRIES):
+        copy_id = db.session.execute(
+            delete(UniqueBook)
+            .where(UniqueBook.id == _first_available(book_id), UniqueBook.status == 'available')
+            .returning(UniqueBook.id)
+        ).scalar()
+        if copy_id is not None:
+            _remove_copy_history(copy_id)
+            adjust_counts(book_id, total=-1, available=-1)
+            return copy_id
+        if not db.session.query(_first_available(book_id)).scalar():
+            return None
+    return None
+
+def remove_available_copies(book_id, count):
+    """Takes up to ``count`` available copies of a book out of stock, with their history. Returns the removed ids.
+
+    Copies are picked and deleted by one conditional DELETE, so a copy lent out meanwhile is
+    skipped rather than removed while on loan; the shortfall is retried while any remain.
+    """
+    removed = []
+    for _ in range(CLAIM_RETRIES):
+        picked = select(UniqueBook.id).where(
+            UniqueBook.book_id == book_id, UniqueBook.status == 'available'
+        ).limit(count - len(removed))
+        removed += db.session.execute(
+            delete(UniqueBook)
+            .where(UniqueBook.id.in_(picked), UniqueBook.status == 'available')
+            .returning(UniqueBook.id),
+            execution_options={'synchronize_session': False},
+        ).scalars().all()
+        if len(removed) >= count or not db.session.query(_first_available(book_id)).scalar():
+            break
+    if removed:
+        _remove_copy_history(*removed)
+        adjust_counts(book_id, total=-len(removed), available=-len(removed))
+    return removed
+
+def sell_borrowed_copy(copy_id, user_id):
+    """Removes a copy ``user_id`` currently has on loan. Returns True on success."""
+    book_id = db.session.execute(
+        delete(UniqueBook)
+        .where(UniqueBook.id == copy_id, UniqueBook.borrower_id == user_id, UniqueBook.status == 'borrowed')
+        .returning(UniqueBook.book_id)
+    ).scalar()
+    if book_id is None:
+        return False
+    _remove_copy_history(copy_id)
+    adjust_counts(book_id, total=-1)
+    return True
+
+def debit_credits(user_id, amount, note=None):
+    """Takes ``amount`` from a user's credits only if the balance covers it, and records it in the ledger. Returns True on success.
+
+    A deleted account matches no row, so it is never debited whatever a cached snapshot says.
+    """
+    result = db.session.execute(
+        update(User)
+        .where(User.id == user_id, User.credits >= amount)
+        .values(credits=User.credits - amount)
+    )
+    if result.rowcount != 1:
+        return False
+    credits.record(user_id, -amount, 'purchase', note=note)
+    invalidate_on_commit(user_id)
+    return True
+
+def find_drift():
+    """Returns (book_id, stored_total, stored_available, actual_total, actual_available) for every book whose counters are wrong."""
+    actual = db.session.query(
+        UniqueBook.book_id.label('book_id'),
+        func.count(UniqueBook.id).label('total'),
+        func.sum(case((UniqueBook.status == 'available', 1), else_=0)).label('available'),
+    ).group_by(UniqueBook.book_id).subquery()
+    actual_total = func.coalesce(actual.c.total, 0)
+    actual_available = func.coalesce(actual.c.available, 0)
+    return db.session.query(
+        Book.id, Book.total_copies, Book.available_copies, actual_total, actual_available
+    ).outerjoin(actual, actual.c.book_id == Book.id).filter(
+        (Book.total_copies != actual_total) | (Book.available_copies != actual_available)
+    ).all()
+
+def reconcile_counts(fix=True):
+    """Detects counter drift and, if ``fix`` is set, rewrites the affected books. Returns the drifted rows."""
+    drift = find_drift()
+    if fix and drift:
+        db.session.execute(update(Book), [
+            {'id': book_id, 'total_copies': total, 'available_copies': available}
+            for book_id, _, _, total, available in drift
+        ])
+        for book_id, *_ in drift:
+            fragments.invalidate_on_commit(book_id)
+        db.session.commit()
+    return drift
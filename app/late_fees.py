@@ -0,0 +1,87 @@
+# /library_project/app/late_fees.py
+
+from datetime import datetime, time
+from sqlalchemy import func, select, update, or_, and_
+from app import db, credits
+from app.models import Book, UniqueBook, User, LateFee, OverdueRun
+from app.sales import dialect_insert
+from app.user_cache import invalidate_on_commit
+
+BATCH_SIZE = 5000
+
+def _overdue_batch(cutoff, after, batch_size):
+    # Keyset over (due_date, id) follows ix_uniquebook_status_due, so each batch is an index range read.
+    query = db.session.query(
+        UniqueBook.id, UniqueBook.borrower_id, UniqueBook.book_id, UniqueBook.due_date, Book.title, Book.cost_per_day
+    ).join(Book, Book.id == UniqueBook.book_id).filter(
+        UniqueBook.status == 'borrowed', UniqueBook.due_date < cutoff
+    )
+    if after:
+        last_due, last_id = after
+        query = query.filter(or_(UniqueBook.due_date > last_due,
+                                 and_(UniqueBook.due_date == last_due, UniqueBook.id > last_id)))
+    return query.order_by(UniqueBook.due_date, UniqueBook.id).limit(batch_size).all()
+
+def _charge_pending(day):
+    """Debits every patron's uncharged fees for ``day`` in one UPDATE, records them in the credits ledger, then marks them charged."""
+    pending = (LateFee.fee_date == day, LateFee.charged.is_(False))
+    user_ids = db.session.execute(select(LateFee.user_id).where(*pending).distinct()).scalars().all()
+    if not user_ids:
+        return
+    owed = select(func.sum(LateFee.amount)).where(LateFee.user_id == User.id, *pending).scalar_subquery()
+    db.session.execute(
+        update(User).where(User.id.in_(user_ids)).values(credits=User.credits - owed),
+        execution_options={'synchronize_session': False},
+    )
+    credits.record_late_fees(*pending)
+    db.session.execute(update(LateFee).where(*pending).values(charged=True),
+                       execution_options={'synchronize_session': False})
+    for user_id in user_ids:
+        invalidate_on_commit(user_id)
+
+def accrue_late_fees(day=None, batch_size=BATCH_SIZE):
+    """Charges one day of ``Book.cost_per_day`` for every copy that was due before ``day``.
+
+    Each batch inserts its ledger rows and debits the affected patrons in one transaction. Ledger
+    rows are unique per copy and day, and debits only touch rows not yet marked charged, so the job
+    can be re-run or resumed for a day without charging anyone twice. Days the job does not run
+    are not charged retroactively.
+    Returns (run, ran) where ``ran`` is False if the day had already been completed.
+    """
+    day = day or datetime.utcnow().date()
+    run = db.session.get(OverdueRun, day)
+    if run and run.finished_at:
+        return run, False
+    if run is None:
+        run = OverdueRun(run_date=day, started_at=datetime.utcnow())
+        db.session.add(run)
+        db.session.commit()
+
+    cutoff = datetime.combine(day, time.min)
+    insert = dialect_insert(db.engine.dialect.name)
+    after = None
+    while True:
+        rows = _overdue_batch(cutoff, after, batch_size)
+        if not rows:
+            break
+        after = (rows[-1].due_date, rows[-1].id)
+        now = datetime.utcnow()
+        fees = [{
+            'fee_date': day, 'copy_id': copy_id, 'user_id': user_id, 'book_id': book_id, 'book_title': title,
+            'due_date': due_date, 'days_overdue': (day - due_date.date()).days,
+            'amount': round(cost_per_day or 0, 2), 'charged': False, 'created_at': now,
+        } for copy_id, user_id, book_id, due_date, title, cost_per_day in rows]
+        db.session.execute(insert(LateFee).on_conflict_do_nothing(index_elements=['copy_id', 'fee_date']), fees)
+        _charge_pending(day)
+        db.session.commit()
+
+    # A resumed run may have found nothing left in the loop; charge anything an earlier attempt left behind.
+    _charge_pending(day)
+    copies, patrons, total = db.session.query(
+        func.count(LateFee.id), func.count(LateFee.user_id.distinct()), func.coalesce(func.sum(LateFee.amount), 0)
+    ).filter(LateFee.fee_date == day).one()
+    run = db.session.get(OverdueRun, day)
+    run.overdue_copies, run.patrons_charged, run.total_amount = copies, patrons, total
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run, True
@@ -1,19 +1,23 @@
 # /library_project/app/librarian/routes.py
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for, Response, current_app
+from datetime import date
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from sqlalchemy import extract
-import os
-import uuid
-import csv
-from io import StringIO
-from datetime import datetime
 from app import db
-from app.models import Book, UniqueBook, Purchase, BorrowHistory, User, BookType, Rating, Comment
+from app.models import Book, UniqueBook, Purchase, User, BookType, Rating, Comment, LateFee, OverdueRun
+from app.catalog import catalog_page, TABLE_PER_PAGE
+from app.search import index_book
+from app.inventory import adjust_counts, copies_with_borrowers, remove_available_copies
+from app.comments import render_comments
+from app.http_cache import bump_catalog_version, conditional_on_catalog
+from app import sales, exports, importer, images, fragments, deletion, archive, credits
 
 librarian_bp = Blueprint('librarian', __name__, url_prefix='/librarian')
 
+# Columns the compact table view shows; the card view loads whole rows.
+TABLE_COLUMNS = (Book.title, Book.author, Book.isbn, Book.price, Book.cost_per_day,
+                 Book.total_copies, Book.available_copies, Book.rating_avg, Book.rating_count)
+
 def is_librarian():
     return current_user.is_authenticated and current_user.role == 'librarian'
 
@@ -26,12 +30,32 @@ def before_request():
 
 @librarian_bp.route('/dashboard')
 def librarian_dashboard():
-    current_month = datetime.utcnow().month
-    current_year = datetime.utcnow().year
-    monthly_purchases = Purchase.query.filter(extract('month', Purchase.bought_on) == current_month, extract('year', Purchase.bought_on) == current_year).all()
-    total_books_sold = len(monthly_purchases)
-    total_sales_amount = sum(p.price_paid for p in monthly_purchases)
-    return render_template('librarian/librarian_dashboard.html', total_books_sold=total_books_sold, total_sales_amount=total_sales_amount)
+    start, end = sales.parse_range(request.args)
+    total_books_sold, total_sales_amount = sales.sales_summary(start, end)
+    trend = sales.sales_trend(start, end)
+    return render_template('librarian/librarian_dashboard.html', total_books_sold=total_books_sold, total_sales_amount=total_sales_amount,
+                           start=start, end=end, presets=sales.range_presets(), trend=trend)
+
+@librarian_bp.route('/overdue')
+def overdue_report():
+    runs = OverdueRun.query.order_by(OverdueRun.run_date.desc()).limit(30).all()
+    run = None
+    day = request.args.get('date')
+    if day:
+        try:
+            run = db.session.get(OverdueRun, date.fromisoformat(day))
+        except ValueError:
+            run = None
+        if run and run not in runs:
+            runs.append(run)  # older than the picker's runs, so it goes last
+    elif runs:
+        run = runs[0]
+    fees = []
+    if run:
+        fees = db.session.query(LateFee, User.username).outerjoin(User, User.id == LateFee.user_id) \
+            .filter(LateFee.fee_date == run.run_date) \
+            .order_by(LateFee.days_overdue.desc(), LateFee.id).limit(500).all()
+    return render_template('librarian/overdue_report.html', runs=runs, run=run, fees=fees)
 
 @librarian_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
@@ -44,8 +68,7 @@ def add_book():
         filename = None
         image = request.files['image']
         if image and image.filename != '':
-            filename = secure_filename(image.filename)
-            image.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+            filename = images.save_upload(image, current_app.config['UPLOAD_FOLDER'])
 
         new_book = Book(
             title=request.form['title'], author=request.form['author'], isbn=isbn,
@@ -54,22 +77,54 @@ def add_book():
             genre_id=int(request.form['genre_id']), book_type_id=int(request.form['book_type_id']),
             image=filename
         )
+        num_copies = int(request.form['num_copies'])
+        new_book.total_copies = new_book.available_copies = num_copies
         db.session.add(new_book)
         db.session.flush() # Use flush to get the new_book.id before commit
+        index_book(new_book)
 
-        num_copies = int(request.form['num_copies'])
         for _ in range(num_copies):
             db.session.add(UniqueBook(book_id=new_book.id, status='available'))
         
+        bump_catalog_version()
         db.session.commit()
         flash(f'Book "{new_book.title}" added with {num_copies} copies.', 'success')
         return redirect(url_for('librarian.librarian_dashboard'))
     return render_template('librarian/add_book.html')
 
+@librarian_bp.route('/import_books', methods=['GET', 'POST'])
+def import_books():
+    report = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or upload.filename == '':
+            flash('Please choose a file to import.', 'warning')
+            return redirect(url_for('librarian.import_books'))
+        try:
+            default_copies = max(int(request.form.get('copies') or 1), 0)
+        except ValueError:
+            flash('Invalid number of copies.', 'danger')
+            return redirect(url_for('librarian.import_books'))
+        report = importer.import_upload(upload, default_copies)
+        if report.inserted:
+            bump_catalog_version()
+            db.session.commit()
+        flash(report.summary(), 'danger' if report.error else 'success' if report.inserted else 'info')
+    return render_template('librarian/import_books.html', report=report)
+
 @librarian_bp.route('/view_available_books')
+@conditional_on_catalog
 def view_available_books():
-    books = Book.query.all()
-    return render_template('librarian/view_available_books.html', books=books)
+    if request.args.get('view') == 'table':
+        view, page = 'table', catalog_page(request.args, TABLE_PER_PAGE, TABLE_COLUMNS)
+    else:
+        view, page = 'cards', catalog_page(request.args)
+    return render_template('librarian/view_available_books.html', page=page, view=view)
+
+def back_to_catalog():
+    """Redirects to the catalog in the view the librarian submitted a dialog from."""
+    view = 'table' if request.form.get('view') == 'table' else None
+    return redirect(url_for('librarian.view_available_books', view=view))
 
 @librarian_bp.route('/edit_book/<int:book_id>', methods=['GET', 'POST'])
 def edit_book(book_id):
@@ -79,10 +134,9 @@ def edit_book(book_id):
         book.cost_per_day = float(request.form['cost_per_day'])
         image = request.files.get('image')
         if image and image.filename != '':
-            ext = os.path.splitext(image.filename)[1]
-            filename = secure_filename(f"{uuid.uuid4().hex}{ext}")
-            image.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
-            book.image = filename
+            book.image = images.save_upload(image, current_app.config['UPLOAD_FOLDER'])
+        index_book(book)
+        bump_catalog_version()
         db.session.commit()
         flash('Book details updated.', 'success')
         return redirect(url_for('librarian.view_available_books'))
@@ -96,27 +150,41 @@ def add_copies(book_id):
         if num_copies < 1: raise ValueError
     except:
         flash('Invalid number of copies.', 'danger')
-        return redirect(url_for('librarian.view_available_books'))
+        return back_to_catalog()
     for _ in range(num_copies):
         db.session.add(UniqueBook(book_id=book.id, status='available'))
+    adjust_counts(book.id, total=num_copies, available=num_copies)
+    bump_catalog_version()
     db.session.commit()
     flash(f'{num_copies} copies added to "{book.title}".', 'success')
-    return redirect(url_for('librarian.view_available_books'))
+    return back_to_catalog()
 
 @librarian_bp.route('/delete_book/<int:book_id>', methods=['POST'])
 def delete_book(book_id):
     book = Book.query.get_or_404(book_id)
-    if book.image:
-        image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], book.image)
-        if os.path.exists(image_path):
-            try:
-                os.remove(image_path)
-            except Exception as e:
-                flash(f"Failed to delete image file: {e}", 'warning')
-    db.session.delete(book) # Cascading delete will handle related items
+    title, image = book.title, book.image
+    if deletion.pending_job('book', book.id):
+        flash(f'"{title}" is already being deleted.', 'info')
+        return redirect(url_for('librarian.deletions'))
+    rows = deletion.book_rows(book.id)
+    if rows > current_app.config.get('DELETE_INLINE_ROWS', 20000):
+        deletion.queue('book', book.id, title, rows, current_user.id)
+        flash(f'Deleting "{title}" and {rows} related rows in the background.', 'info')
+        return redirect(url_for('librarian.deletions'))
+
+    deletion.delete_book(book.id)
     db.session.commit()
-    flash(f'Book "{book.title}" and all its data were deleted.', 'success')
-    return redirect(url_for('librarian.view_available_books'))
+    try:
+        deletion.release_image(image)
+    except Exception as e:
+        flash(f"Failed to delete image file: {e}", 'warning')
+    flash(f'Book "{title}" and all its data were deleted.', 'success')
+    return back_to_catalog()
+
+@librarian_bp.route('/deletions')
+def deletions():
+    return render_template('deletion_jobs.html', jobs=deletion.recent_jobs('book'),
+                           back=url_for('librarian.view_available_books'))
 
 @librarian_bp.route('/remove_copies/<int:book_id>', methods=['POST'])
 def remove_copies(book_id):
@@ -126,28 +194,32 @@ def remove_copies(book_id):
         if num_copies < 1: raise ValueError
     except ValueError:
         flash('Invalid number of copies.', 'danger')
-        return redirect(url_for('librarian.view_available_books'))
-    
-    available_copies = UniqueBook.query.filter_by(book_id=book.id, status='available').limit(num_copies).all()
-    if len(available_copies) < num_copies:
-        flash(f'Only {len(available_copies)} available copies found to remove.', 'warning')
+        return back_to_catalog()
+
+    removed = len(remove_available_copies(book.id, num_copies))
+    if removed < num_copies:
+        flash(f'Only {removed} available copies found to remove.', 'warning')
     else:
         flash(f'{num_copies} copies removed successfully.', 'success')
-    
-    for copy in available_copies:
-        db.session.delete(copy)
+    bump_catalog_version()
     db.session.commit()
-    return redirect(url_for('librarian.view_available_books'))
+    return back_to_catalog()
 
 @librarian_bp.route('/view_book/<int:book_id>')
+@conditional_on_catalog
 def view_book_librarian(book_id):
     book = Book.query.get_or_404(book_id)
-    return render_template('librarian/view_book_librarian.html', book=book, copies=book.copies, comments=book.comments)
+    detail = fragments.render_cached(book.id, 'librarian', lambda: render_template(
+        'librarian/book_detail.html', book=book, copies=copies_with_borrowers(book.id)))
+    comments = render_comments(book, 'librarian.view_book_librarian', request.args)
+    return render_template('librarian/view_book_librarian.html', book=book, detail=detail, comments=comments)
 
 @librarian_bp.route('/view_history/<int:copy_id>')
 def view_copy_history(copy_id):
     copy = UniqueBook.query.get_or_404(copy_id)
-    history = BorrowHistory.query.filter_by(copy_id=copy_id).order_by(BorrowHistory.borrowed_on.desc()).all()
+    records = archive.history(copy_id=copy_id)
+    history = db.session.query(records.c.borrowed_on, records.c.returned_on, User.username) \
+        .join(User, User.id == records.c.user_id).order_by(records.c.borrowed_on.desc(), records.c.id.desc()).all()
     return render_template('librarian/view_history.html', copy=copy, history=history)
 
 @librarian_bp.route('/registered_users')
@@ -159,16 +231,37 @@ def registered_users():
 def add_credits(user_id):
     user = User.query.get_or_404(user_id)
     try:
-        amount = float(request.form['amount'])
-        if amount <= 0: raise ValueError
-    except ValueError:
-        flash('Invalid credit amount.', 'danger')
+        result = credits.top_up([{'user_id': user.id, 'amount': request.form.get('amount')}], created_by=current_user.id)
+    except credits.TopUpError as e:
+        flash(f'Could not add credits: {e.rejected[0][1]}.' if e.rejected else e.message, 'danger')
         return redirect(url_for('librarian.registered_users'))
-    user.credits += amount
-    db.session.commit()
-    flash(f'${amount:.2f} added to {user.username}. New balance: ${user.credits:.2f}', 'success')
+    flash(f'${result.total:.2f} added to {user.username}. New balance: ${user.credits:.2f}', 'success')
     return redirect(url_for('librarian.registered_users'))
 
+@librarian_bp.route('/credits', methods=['GET', 'POST'])
+def credit_topups():
+    rejected = []
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or upload.filename == '':
+            flash('Please choose a file of top-ups.', 'warning')
+            return redirect(url_for('librarian.credit_topups'))
+        try:
+            result = credits.top_up_upload(upload, request.form.get('reference'), current_user.id,
+                                           request.form.get('note') or None)
+        except credits.TopUpError as e:
+            flash(e.message, 'danger')
+            rejected = e.rejected
+        else:
+            flash(result.summary(), 'success')
+            return redirect(url_for('librarian.credit_topups'))
+    return render_template('librarian/credit_topups.html', batches=credits.recent_batches(), rejected=rejected)
+
+@librarian_bp.route('/user_credits/<int:user_id>')
+def view_user_credits(user_id):
+    user = User.query.get_or_404(user_id)
+    return render_template('librarian/user_credits.html', user=user, entries=credits.entries(user.id))
+
 @librarian_bp.route('/user_purchases/<int:user_id>')
 def view_user_purchases(user_id):
     user = User.query.get_or_404(user_id)
@@ -177,29 +270,34 @@ def view_user_purchases(user_id):
 @librarian_bp.route('/user_borrows/<int:user_id>')
 def view_user_borrow_history(user_id):
     user = User.query.get_or_404(user_id)
-    history = BorrowHistory.query.filter_by(user_id=user.id).order_by(BorrowHistory.borrowed_on.desc()).all()
+    records = archive.history(user_id=user.id)
+    history = db.session.query(records.c.copy_id, Book.title, records.c.borrowed_on, records.c.returned_on) \
+        .join(UniqueBook, UniqueBook.id == records.c.copy_id).join(Book, Book.id == UniqueBook.book_id) \
+        .order_by(records.c.borrowed_on.desc(), records.c.id.desc()).all()
     return render_template('librarian/user_borrows.html', user=user, history=history)
 
 @librarian_bp.route('/download_purchases/<int:user_id>')
 def download_purchases(user_id):
     user = User.query.get_or_404(user_id)
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['Book Title', 'Author', 'Price Paid', 'Date'])
-    for p in user.purchases:
-        cw.writerow([p.book_title, p.book_author, f"${p.price_paid:.2f}", p.bought_on.strftime('%Y-%m-%d %H:%M')])
-    output = si.getvalue()
-    return Response(output, mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename={user.username}_purchases.csv'})
+    rows = exports.purchase_rows(user_id=user.id)
+    return exports.csv_response(f'{user.username}_purchases.csv', ['Book Title', 'Author', 'Price Paid', 'Date'], rows)
 
 @librarian_bp.route('/download_borrows/<int:user_id>')
 def download_borrows(user_id):
     user = User.query.get_or_404(user_id)
-    history = BorrowHistory.query.filter_by(user_id=user.id).order_by(BorrowHistory.borrowed_on.desc()).all()
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['Copy ID', 'Book Title', 'Borrowed On', 'Returned On'])
-    for h in history:
-        returned_date = h.returned_on.strftime('%Y-%m-%d %H:%M') if h.returned_on else 'Not Returned'
-        cw.writerow([h.copy.id, h.copy.book.title, h.borrowed_on.strftime('%Y-%m-%d %H:%M'), returned_date])
-    output = si.getvalue()
-    return Response(output, mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename={user.username}_borrows.csv'})
\ No newline at end of file
+    rows = exports.borrow_rows(user_id=user.id)
+    return exports.csv_response(f'{user.username}_borrows.csv', ['Copy ID', 'Book Title', 'Borrowed On', 'Returned On'], rows)
+
+@librarian_bp.route('/export/purchases')
+def export_all_purchases():
+    start, end = exports.parse_date_range(request.args)
+    rows = exports.purchase_rows(start=start, end=end, with_user=True)
+    header = ['Username', 'Email', 'Book Title', 'Author', 'Price Paid', 'Date']
+    return exports.csv_response('all_purchases.csv', header, rows, compress=exports.wants_gzip(request.args))
+
+@librarian_bp.route('/export/borrows')
+def export_all_borrows():
+    start, end = exports.parse_date_range(request.args)
+    rows = exports.borrow_rows(start=start, end=end, with_user=True)
+    header = ['Username', 'Email', 'Copy ID', 'Book Title', 'Borrowed On', 'Returned On']
+    return exports.csv_response('all_borrows.csv', header, rows, compress=exports.wants_gzip(request.args))
\ No newline at end of file
@@ -0,0 +1,100 @@
+# /library_project/app/loans.py
+
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import UniqueBook, Purchase, BorrowHistory
+from app.http_cache import bump_catalog_version
+from app.sales import record_sale
+from app.inventory import (account_exists, claim_copy, release_copy, sell_available_copy, sell_borrowed_copy,
+                           debit_credits)
+
+LOAN_DAYS = 7
+
+class LoanError(Exception):
+    """A loan or purchase that cannot go ahead.
+
+    ``category`` is the flash category the HTML pages use and ``status`` the API's HTTP status.
+    """
+
+    def __init__(self, message, category='danger', status=409):
+        super().__init__(message)
+        self.message = message
+        self.category = category
+        self.status = status
+
+def _refuse(message, user_id, **kwargs):
+    """Rolls back and raises ``message``, unless the account was deleted meanwhile (another worker may have cached it)."""
+    db.session.rollback()
+    if not db.session.query(account_exists(user_id)).scalar():
+        raise LoanError('This account no longer exists.', status=403)
+    raise LoanError(message, **kwargs)
+
+def current_loans(user_id):
+    """Copies ``user_id`` has on loan, with their books loaded by the same query, soonest due first."""
+    return UniqueBook.query.options(joinedload(UniqueBook.book)) \
+        .filter_by(borrower_id=user_id, status='borrowed').order_by(UniqueBook.due_date).all()
+
+def issue_book(book, user_id):
+    """Lends ``user_id`` a copy of ``book`` and commits. Returns (copy id, due date)."""
+    already_borrowed = UniqueBook.query.filter_by(book_id=book.id, borrower_id=user_id, status='borrowed').first()
+    if already_borrowed:
+        raise LoanError('You have already issued this book.', 'warning')
+
+    borrowed_on = datetime.utcnow()
+    due_date = borrowed_on + timedelta(days=LOAN_DAYS)
+    copy_id = claim_copy(book.id, user_id, borrowed_on, due_date)
+    if copy_id is None:
+        _refuse('Sorry, no copies available to issue.', user_id)
+
+    db.session.add(BorrowHistory(user_id=user_id, copy_id=copy_id, borrowed_on=borrowed_on))
+    bump_catalog_version()
+    db.session.commit()
+    return copy_id, due_date
+
+def return_copy(copy, user_id):
+    """Puts a copy ``user_id`` has on loan back on the shelf and commits."""
+    if copy.borrower_id != user_id:
+        raise LoanError('You can only return your own borrowed books.', status=403)
+    if not release_copy(copy.id, user_id):
+        db.session.rollback()
+        raise LoanError('This book has already been returned.', 'warning')
+
+    last_borrow = BorrowHistory.query.filter_by(copy_id=copy.id, user_id=user_id).order_by(BorrowHistory.borrowed_on.desc()).first()
+    if last_borrow and last_borrow.returned_on is None:
+        last_borrow.returned_on = datetime.utcnow()
+
+    bump_catalog_version()
+    db.session.commit()
+
+def _record_purchase(book, user_id, price):
+    db.session.add(Purchase(user_id=user_id, book_title=book.title, book_author=book.author, price_paid=price))
+    record_sale(price)
+    bump_catalog_version()
+    db.session.commit()
+
+def buy_book(book, user_id):
+    """Sells ``user_id`` an available copy of ``book`` and commits. Returns the price paid."""
+    price = book.price or 0
+    if sell_available_copy(book.id) is None:
+        db.session.rollback()
+        raise LoanError('Sorry, this book is out of stock.')
+    if not debit_credits(user_id, price, note=book.title):
+        _refuse(f'Not enough credits to buy "{book.title}".', user_id, status=402)
+    _record_purchase(book, user_id, price)
+    return price
+
+def buy_borrowed_copy(copy, user_id):
+    """Sells ``user_id`` the copy they have on loan and commits. Returns the price paid."""
+    if copy.borrower_id != user_id:
+        raise LoanError('You can only buy books you have borrowed.', status=403)
+
+    book = copy.book
+    price = book.price or 0
+    if not debit_credits(user_id, price, note=book.title):
+        _refuse(f'Not enough credits to buy "{book.title}". You need ${price:.2f}.', user_id, status=402)
+    if not sell_borrowed_copy(copy.id, user_id):
+        db.session.rollback()
+        raise LoanError('This copy is no longer on loan to you.', 'warning')
+    _record_purchase(book, user_id, price)
+    return price
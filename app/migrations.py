@@ -0,0 +1,158 @@
+# /library_project/app/migrations.py
+
+from datetime import datetime
+from sqlalchemy import inspect, text
+from app import db
+
+# (version, description, function), applied in version order. Each function must be safe to
+# re-run against a schema that already has its change, because databases created before this
+# table existed start at version 0 whatever their actual shape.
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+def _ensure_version_table():
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_on DATETIME NOT NULL)"
+    ))
+
+def _record(version, description):
+    db.session.execute(
+        text("INSERT INTO schema_version (version, description, applied_on) VALUES (:v, :d, :t)"),
+        {'v': version, 'd': description, 't': datetime.utcnow()},
+    )
+
+def current_version():
+    _ensure_version_table()
+    return db.session.execute(text("SELECT coalesce(max(version), 0) FROM schema_version")).scalar()
+
+def pending():
+    version = current_version()
+    return [m for m in MIGRATIONS if m[0] > version]
+
+def upgrade(target=None, echo=print):
+    """Applies pending migrations up to ``target`` (all by default), committing after each one."""
+    applied = []
+    for version, description, fn in pending():
+        if target is not None and version > target:
+            break
+        echo(f"Applying migration {version}: {description}")
+        fn()
+        _record(version, description)
+        db.session.commit()
+        applied.append(version)
+    return applied
+
+def stamp_head():
+    """Marks every migration as applied; for databases just built from the current models by create_all."""
+    for version, description, _ in pending():
+        _record(version, description)
+    db.session.commit()
+
+def _has_column(table, column):
+    return column in {c['name'] for c in inspect(db.session.connection()).get_columns(table)}
+
+def _create_indexes(model):
+    """Creates a model's indexes; only for tables the same migration creates."""
+    for index in model.__table__.indexes:
+        index.create(db.session.connection(), checkfirst=True)
+
+def _create_index(name, table, *columns):
+    # Spelled out rather than taken from the models, which may index columns later migrations add.
+    db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+@migration(1, "Add stock counters to book")
+def _add_stock_counters():
+    from app.inventory import reconcile_counts
+    for column in ('total_copies', 'available_copies'):
+        if not _has_column('book', column):
+            db.session.execute(text(f"ALTER TABLE book ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"))
+    reconcile_counts()
+
+@migration(2, "Add daily sales rollup")
+def _add_sales_rollup():
+    from app.models import SalesDaily
+    from app.sales import rebuild_rollup
+    SalesDaily.__table__.create(db.session.connection(), checkfirst=True)
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_purchase_bought_on ON purchase (bought_on)"))
+    rebuild_rollup()
+
+@migration(3, "Add catalog search index")
+def _add_search_index():
+    from app.search import rebuild_index
+    rebuild_index()
+
+@migration(4, "Add hot-path indexes")
+def _add_hot_path_indexes():
+    _create_index('ix_book_title_id', 'book', 'title', 'id')
+    _create_index('ix_book_author_id', 'book', 'author', 'id')
+    _create_index('ix_uniquebook_book_status', 'uniquebook', 'book_id', 'status')
+    _create_index('ix_uniquebook_borrower_status', 'uniquebook', 'borrower_id', 'status')
+    _create_index('ix_borrow_history_copy_user_borrowed', 'borrow_history', 'copy_id', 'user_id', 'borrowed_on')
+    _create_index('ix_borrow_history_user_borrowed', 'borrow_history', 'user_id', 'borrowed_on')
+    _create_index('ix_comment_book_created', 'comment', 'book_id', 'created_at')
+    _create_index('ix_purchase_user_bought', 'purchase', 'user_id', 'bought_on')
+
+@migration(5, "Add late fee ledger and overdue runs")
+def _add_late_fees():
+    from app.models import LateFee, OverdueRun
+    for model in (LateFee, OverdueRun):
+        model.__table__.create(db.session.connection(), checkfirst=True)
+    _create_index('ix_uniquebook_status_due', 'uniquebook', 'status', 'due_date')
+
+@migration(6, "Add book rating aggregates")
+def _add_rating_aggregates():
+    from app.ratings import rebuild_aggregates
+    for column, kind in (('rating_sum', 'FLOAT'), ('rating_count', 'INTEGER'), ('rating_avg', 'FLOAT')):
+        if not _has_column('book', column):
+            db.session.execute(text(f"ALTER TABLE book ADD COLUMN {column} {kind} NOT NULL DEFAULT 0"))
+    # Keep only each patron's latest rating of a book before enforcing one per patron.
+    db.session.execute(text(
+        "DELETE FROM rating WHERE id NOT IN (SELECT max(id) FROM rating GROUP BY user_id, book_id)"
+    ))
+    db.session.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_rating_user_book ON rating (user_id, book_id)"
+    ))
+    db.session.execute(text("CREATE INDEX IF NOT EXISTS ix_book_rating_id ON book (rating_avg, id)"))
+    rebuild_aggregates()
+
+@migration(7, "Add book recommendations")
+def _add_recommendations():
+    from app.models import BookRecommendation
+    BookRecommendation.__table__.create(db.session.connection(), checkfirst=True)
+
+@migration(8, "Add catalog version stamp")
+def _add_catalog_version():
+    from app.models import CatalogVersion
+    from app.http_cache import bump_catalog_version
+    CatalogVersion.__table__.create(db.session.connection(), checkfirst=True)
+    bump_catalog_version()
+
+@migration(9, "Add deletion jobs and indexes for set-based deletes")
+def _add_deletion_jobs():
+    from app.models import DeletionJob
+    DeletionJob.__table__.create(db.session.connection(), checkfirst=True)
+    _create_index('ix_rating_book', 'rating', 'book_id')
+    _create_index('ix_comment_user', 'comment', 'user_id')
+
+@migration(10, "Add borrow history archive")
+def _add_borrow_archive():
+    from app.models import ArchivedBorrow
+    # On SQLite the attached archive database gets its table on connect; elsewhere it is a schema.
+    if db.engine.dialect.name != 'sqlite':
+        db.session.execute(text("CREATE SCHEMA IF NOT EXISTS archive"))
+    ArchivedBorrow.__table__.create(db.session.connection(), checkfirst=True)
+    _create_indexes(ArchivedBorrow)
+
+@migration(11, "Add credits ledger with opening balances")
+def _add_credit_ledger():
+    from app.models import CreditLedger
+    from app.credits import open_balances
+    CreditLedger.__table__.create(db.session.connection(), checkfirst=True)
+    open_balances()
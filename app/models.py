@@ -34,6 +34,11 @@ class User(UserMixin, db.Model):
 
 class Book(db.Model):
     __tablename__ = 'book'
+    __table_args__ = (
+        db.Index('ix_book_title_id', 'title', 'id'),
+        db.Index('ix_book_author_id', 'author', 'id'),
+        db.Index('ix_book_rating_id', 'rating_avg', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     author = db.Column(db.String(100), nullable=False)
@@ -45,6 +50,15 @@ class Book(db.Model):
     image = db.Column(db.String(200), nullable=True)
     genre_id = db.Column(db.Integer, nullable=True)
     book_type_id = db.Column(db.Integer, db.ForeignKey('booktype.id'), nullable=False)
+
+    # Denormalized stock counters, kept in step with UniqueBook rows by app.inventory.
+    total_copies = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    available_copies = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    # Running rating aggregates, kept in step with Rating rows by app.ratings. Unrated books average 0.
+    rating_sum = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_avg = db.Column(db.Float, nullable=False, default=0, server_default='0')
     
     # "One" side of the relationships. Cascades are defined here.
     copies = db.relationship('UniqueBook', backref='book', lazy=True, cascade="all, delete-orphan")
@@ -56,33 +70,73 @@ class Book(db.Model):
 
 class Purchase(db.Model):
     __tablename__ = 'purchase'
+    __table_args__ = (db.Index('ix_purchase_user_bought', 'user_id', 'bought_on'),)
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     book_title = db.Column(db.String(200), nullable=False)
     book_author = db.Column(db.String(100), nullable=False)
     price_paid = db.Column(db.Float, nullable=False)
-    bought_on = db.Column(db.DateTime, default=datetime.utcnow)
+    bought_on = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f'<Purchase {self.book_title}>'
 
+class SalesDaily(db.Model):
+    """Per-day sales rollup, updated alongside every Purchase so reports never scan the purchase table."""
+    __tablename__ = 'sales_daily'
+    day = db.Column(db.Date, primary_key=True)
+    books_sold = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SalesDaily {self.day} {self.books_sold}>'
+
 class BorrowHistory(db.Model):
     __tablename__ = 'borrow_history'
+    __table_args__ = (
+        db.Index('ix_borrow_history_copy_user_borrowed', 'copy_id', 'user_id', 'borrowed_on'),
+        db.Index('ix_borrow_history_user_borrowed', 'user_id', 'borrowed_on'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    copy_id = db.Column(db.Integer, db.ForeignKey('uniquebook.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    copy_id = db.Column(db.Integer, db.ForeignKey('uniquebook.id', ondelete='CASCADE'), nullable=False)
     borrowed_on = db.Column(db.DateTime, nullable=False)
     returned_on = db.Column(db.DateTime, nullable=True)
 
     def __repr__(self):
         return f"<BorrowHistory user={self.user_id} copy={self.copy_id}>"
 
+class ArchivedBorrow(db.Model):
+    """A closed BorrowHistory row moved out of the hot table by app.archive, keeping its id.
+
+    It lives in the ``archive`` schema: an attached database file on SQLite, a schema of its own elsewhere.
+    """
+    __tablename__ = 'borrow_history'
+    __table_args__ = (
+        db.Index('ix_archive_borrow_user_borrowed', 'user_id', 'borrowed_on'),
+        db.Index('ix_archive_borrow_copy_borrowed', 'copy_id', 'borrowed_on'),
+        {'schema': 'archive'},
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    copy_id = db.Column(db.Integer, nullable=False)
+    borrowed_on = db.Column(db.DateTime, nullable=False)
+    returned_on = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<ArchivedBorrow user={self.user_id} copy={self.copy_id}>"
+
 class UniqueBook(db.Model):
     __tablename__ = 'uniquebook'
+    __table_args__ = (
+        db.Index('ix_uniquebook_book_status', 'book_id', 'status'),
+        db.Index('ix_uniquebook_borrower_status', 'borrower_id', 'status'),
+        db.Index('ix_uniquebook_status_due', 'status', 'due_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id', ondelete='CASCADE'), nullable=False)
     status = db.Column(db.String(50), default='available')
-    borrower_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    borrower_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
     borrowed_on = db.Column(db.DateTime, nullable=True)
     due_date = db.Column(db.DateTime, nullable=True)
     
@@ -92,24 +146,125 @@ class UniqueBook(db.Model):
     def __repr__(self):
         return f'<UniqueBook Copy {self.id} of {self.book.title}>'
 
+class LateFee(db.Model):
+    """One day's late fee for one overdue copy. Ids and titles are copied, not foreign keys, so the ledger outlives sold copies and deleted accounts."""
+    __tablename__ = 'late_fee'
+    __table_args__ = (
+        db.UniqueConstraint('copy_id', 'fee_date', name='uq_late_fee_copy_day'),
+        db.Index('ix_late_fee_day_charged', 'fee_date', 'charged'),
+        db.Index('ix_late_fee_user_day', 'user_id', 'fee_date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    fee_date = db.Column(db.Date, nullable=False)
+    copy_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    book_id = db.Column(db.Integer, nullable=False)
+    book_title = db.Column(db.String(200), nullable=False)
+    due_date = db.Column(db.DateTime, nullable=False)
+    days_overdue = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False, default=0)
+    charged = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LateFee copy={self.copy_id} {self.fee_date} {self.amount}>'
+
+class CreditLedger(db.Model):
+    """One change to a user's credits. Append-only: ``User.credits`` always equals the sum of a user's entries.
+
+    ``user_id`` is not a foreign key, so the ledger outlives deleted accounts.
+    """
+    __tablename__ = 'credit_ledger'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'reference', 'user_id', name='uq_credit_ledger_reference'),
+        db.Index('ix_credit_ledger_user_amount', 'user_id', 'amount'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    amount = db.Column(db.Float, nullable=False)  # positive for credits added, negative for charges
+    kind = db.Column(db.String(20), nullable=False)  # opening, topup, purchase, late_fee
+    reference = db.Column(db.String(100), nullable=True)  # top-up batch or late fee id
+    note = db.Column(db.String(200), nullable=True)
+    created_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CreditLedger user={self.user_id} {self.kind} {self.amount}>'
+
+class OverdueRun(db.Model):
+    """Summary of the late-fee job for one day; at most one completed run per day."""
+    __tablename__ = 'overdue_run'
+    run_date = db.Column(db.Date, primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    overdue_copies = db.Column(db.Integer, nullable=False, default=0)
+    patrons_charged = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<OverdueRun {self.run_date}>'
+
 class Rating(db.Model):
     __tablename__ = 'rating'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'book_id', name='uq_rating_user_book'),
+        db.Index('ix_rating_book', 'book_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     rating = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id', ondelete='CASCADE'), nullable=False)
     
     def __repr__(self):
         return f'<Rating {self.rating}>'
 
+class CatalogVersion(db.Model):
+    """Single-row stamp bumped by every change to what catalog and book pages show; see app.http_cache."""
+    __tablename__ = 'catalog_version'
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class BookRecommendation(db.Model):
+    """Top-k "patrons also borrowed" books per book, written by app.recommendations.refresh."""
+    __tablename__ = 'book_recommendation'
+    book_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    recommended_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class DeletionJob(db.Model):
+    """A queued or running deletion of one account or book, removed a chunk of rows at a time by app.deletion."""
+    __tablename__ = 'deletion_job'
+    __table_args__ = (db.Index('ix_deletion_job_target', 'kind', 'target_id', 'status'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)  # 'user' or 'book'
+    target_id = db.Column(db.Integer, nullable=False)
+    label = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued, running, done, failed
+    total_rows = db.Column(db.Integer, nullable=False, default=0)
+    deleted_rows = db.Column(db.Integer, nullable=False, default=0)
+    requested_by = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f'<DeletionJob {self.kind} {self.target_id} {self.status}>'
+
 class Comment(db.Model):
     __tablename__ = 'comment'
+    __table_args__ = (
+        db.Index('ix_comment_book_created', 'book_id', 'created_at'),
+        db.Index('ix_comment_user', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id', ondelete='CASCADE'), nullable=False)
     
     def __repr__(self):
         return f'<Comment by {self.user.username}>'
\ No newline at end of file
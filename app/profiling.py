@@ -0,0 +1,177 @@
+# /library_project/app/profiling.py
+
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+log = logging.getLogger(__name__)
+
+HEADER = 'X-Profile'
+SALT = 'request-profiling'
+
+# Where time goes, by the file or builtin a function lives in; first match wins.
+CATEGORIES = (
+    ('Password hashing', re.compile(r'pbkdf2|hashlib|werkzeug[/\\]security')),
+    ('Templates (Jinja)', re.compile(r'jinja2|markupsafe|<template>|\.html')),
+    ('ORM (hydration, unit of work)', re.compile(r'sqlalchemy[/\\]orm')),
+    ('SQL driver and engine', re.compile(r'sqlite3|psycopg|sqlalchemy[/\\](engine|sql|pool|dialects)')),
+    ('Flask and Werkzeug', re.compile(r'flask|werkzeug')),
+    ('Application code', re.compile(r'[/\\]app[/\\]')),
+)
+
+class Settings:
+    """Per-process profiling switches; admins change them at runtime from the Profiles page."""
+
+    def __init__(self):
+        self.sample_rate = 0.0
+
+settings = Settings()
+
+def profile_dir():
+    return current_app.config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+
+def make_token():
+    """A header value that has the request carrying it profiled, valid for PROFILE_TOKEN_MAX_AGE seconds."""
+    return URLSafeTimedSerializer(current_app.secret_key, salt=SALT).dumps('profile')
+
+def _token_ok(token):
+    try:
+        URLSafeTimedSerializer(current_app.secret_key, salt=SALT).loads(
+            token, max_age=current_app.config.get('PROFILE_TOKEN_MAX_AGE', 3600))
+        return True
+    except BadSignature:
+        return False
+
+def _wanted():
+    token = request.headers.get(HEADER)
+    if token is not None:
+        return _token_ok(token)
+    return settings.sample_rate > 0 and random.random() < settings.sample_rate
+
+def _save(profiler, endpoint, elapsed):
+    folder = os.path.join(profile_dir(), endpoint)
+    os.makedirs(folder, exist_ok=True)
+    name = f'{time.strftime("%Y%m%d-%H%M%S")}-{int(elapsed * 1000)}ms-{os.getpid()}-{threading.get_ident() % 10000}.prof'
+    profiler.dump_stats(os.path.join(folder, name))
+    keep = current_app.config.get('PROFILE_KEEP', 50)
+    files = sorted(f for f in os.listdir(folder) if f.endswith('.prof'))
+    for old in files[:-keep]:
+        try:
+            os.remove(os.path.join(folder, old))
+        except OSError:
+            pass
+
+def configure(app):
+    """Profiles a sample of requests (PROFILE_SAMPLE_RATE) plus any carrying a valid X-Profile header.
+
+    While the rate is 0 an unprofiled request only pays for one header lookup; PROFILING=0
+    registers nothing at all.
+    """
+    if not app.config.get('PROFILING', True):
+        return
+    settings.sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+
+    @app.before_request
+    def _start():
+        if not _wanted():
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler is already running in this process
+            return
+        g.profiler = (profiler, time.perf_counter())
+
+    @app.teardown_request
+    def _stop(exc):
+        started = g.pop('profiler', None)
+        if started is None:
+            return
+        profiler, t0 = started
+        profiler.disable()
+        if request.endpoint is None:
+            return
+        try:
+            _save(profiler, request.endpoint, time.perf_counter() - t0)
+        except OSError as e:
+            log.warning("Could not save profile for %s: %s", request.endpoint, e)
+
+# --- Browsing -----------------------------------------------------------------------------------
+
+def endpoints():
+    """(endpoint, number of profiles, newest file time) for every endpoint with saved profiles."""
+    root = profile_dir()
+    if not os.path.isdir(root):
+        return []
+    rows = []
+    for endpoint in sorted(os.listdir(root)):
+        folder = os.path.join(root, endpoint)
+        files = [os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.prof')] if os.path.isdir(folder) else []
+        if files:
+            rows.append((endpoint, len(files), max(os.path.getmtime(f) for f in files)))
+    return rows
+
+def _files(endpoint):
+    if endpoint not in {row[0] for row in endpoints()}:
+        return []
+    folder = os.path.join(profile_dir(), endpoint)
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith('.prof'))
+
+def _short_path(filename):
+    for prefix in sorted({p for p in sys.path if p}, key=len, reverse=True):
+        if filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+def summary(endpoint, sort='tottime', limit=40):
+    """Merged stats of an endpoint's saved profiles, or None if it has none.
+
+    Returns a dict with the profile count, total seconds, time by category and the top
+    functions by ``sort`` ('tottime' or 'cumtime').
+    """
+    files = _files(endpoint)
+    if not files:
+        return None
+    stats = pstats.Stats(files[0])
+    for path in files[1:]:
+        stats.add(path)
+
+    functions = []
+    categories = {}
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        where = f'{filename}:{name}'
+        category = next((label for label, pattern in CATEGORIES if pattern.search(where)), 'Other')
+        categories[category] = categories.get(category, 0.0) + tottime
+        location = name if filename == '~' else f'{_short_path(filename)}:{line}({name})'
+        functions.append({'function': location, 'calls': calls, 'tottime': tottime, 'cumtime': cumtime,
+                          'percall': cumtime / calls if calls else 0.0, 'category': category})
+    key = 'cumtime' if sort == 'cumtime' else 'tottime'
+    functions.sort(key=lambda f: f[key], reverse=True)
+    total = stats.total_tt
+    return {
+        'profiles': len(files),
+        'total': total,
+        'per_request': total / len(files),
+        'categories': sorted(categories.items(), key=lambda item: item[1], reverse=True),
+        'functions': functions[:limit],
+    }
+
+def clear():
+    """Deletes every saved profile. Returns how many files were removed."""
+    removed = 0
+    for endpoint, _, _ in endpoints():
+        for path in _files(endpoint):
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
@@ -0,0 +1,76 @@
+# /library_project/app/query_plans.py
+
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from app import db
+from app.models import ArchivedBorrow, Book, CreditLedger, UniqueBook, BorrowHistory, Comment, Purchase, SalesDaily, LateFee, Rating, BookRecommendation
+
+def hot_queries():
+    """The statements behind the busiest pages, with representative bind values."""
+    now = datetime.utcnow()
+    today = date.today()
+    return {
+        'catalog page by title': select(Book).order_by(Book.title, Book.id).limit(25),
+        'catalog page by author': select(Book).order_by(Book.author, Book.id).limit(25),
+        'catalog page by rating': select(Book).order_by(Book.rating_avg.desc(), Book.id.desc()).limit(25),
+        'patron rating of book': select(Rating.rating).where(Rating.book_id == 1, Rating.user_id == 1),
+        'available copy for checkout': select(UniqueBook.id)
+            .where(UniqueBook.book_id == 1, UniqueBook.status == 'available').limit(1),
+        'patron loans': select(UniqueBook)
+            .where(UniqueBook.borrower_id == 1, UniqueBook.status == 'borrowed'),
+        'open borrow on return': select(BorrowHistory)
+            .where(BorrowHistory.copy_id == 1, BorrowHistory.user_id == 1)
+            .order_by(BorrowHistory.borrowed_on.desc()).limit(1),
+        'copy borrow history': select(BorrowHistory)
+            .where(BorrowHistory.copy_id == 1).order_by(BorrowHistory.borrowed_on.desc()),
+        'patron borrow history': select(BorrowHistory)
+            .where(BorrowHistory.user_id == 1).order_by(BorrowHistory.borrowed_on.desc()),
+        'archived copy borrow history': select(ArchivedBorrow)
+            .where(ArchivedBorrow.copy_id == 1).order_by(ArchivedBorrow.borrowed_on.desc()),
+        'archived patron borrow history': select(ArchivedBorrow)
+            .where(ArchivedBorrow.user_id == 1).order_by(ArchivedBorrow.borrowed_on.desc()),
+        'book recommendations': select(BookRecommendation)
+            .where(BookRecommendation.book_id == 1).order_by(BookRecommendation.rank).limit(6),
+        'book comments page': select(Comment)
+            .where(Comment.book_id == 1).order_by(Comment.created_at.desc(), Comment.id.desc()).limit(21),
+        'patron purchases': select(Purchase)
+            .where(Purchase.user_id == 1).order_by(Purchase.bought_on),
+        'purchases in date range': select(Purchase)
+            .where(Purchase.bought_on >= now - timedelta(days=30), Purchase.bought_on < now),
+        'sales rollup range': select(SalesDaily)
+            .where(SalesDaily.day >= today - timedelta(days=30), SalesDaily.day <= today),
+        'overdue copies': select(UniqueBook.id)
+            .where(UniqueBook.status == 'borrowed', UniqueBook.due_date < now)
+            .order_by(UniqueBook.due_date, UniqueBook.id).limit(5000),
+        'patron credits ledger': select(CreditLedger)
+            .where(CreditLedger.user_id == 1).order_by(CreditLedger.id.desc()).limit(200),
+        'credit top-up batch': select(CreditLedger.user_id)
+            .where(CreditLedger.kind == 'topup', CreditLedger.reference == 'batch'),
+        'overdue report': select(LateFee)
+            .where(LateFee.fee_date == today).order_by(LateFee.days_overdue.desc()).limit(500),
+    }
+
+def _bind_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(' ') if isinstance(value, datetime) else value.isoformat()
+    return value
+
+def explain(statement):
+    """Returns SQLite's EXPLAIN QUERY PLAN detail lines for a statement."""
+    compiled = statement.compile(dialect=db.engine.dialect)
+    params = tuple(_bind_value(compiled.params[name]) for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled.string}", params)
+    return [row[-1] for row in rows]
+
+def full_scans(plan):
+    # "SCAN t USING INDEX ..." walks an index in order (paired with LIMIT that is cheap);
+    # a bare "SCAN t" reads the whole table.
+    return [line for line in plan if line.startswith('SCAN ') and ' USING ' not in line]
+
+def check_plans():
+    """Returns [(name, plan lines, full-scan lines)] for every hot query. SQLite only."""
+    results = []
+    for name, statement in hot_queries().items():
+        plan = explain(statement)
+        results.append((name, plan, full_scans(plan)))
+    return results
@@ -0,0 +1,101 @@
+# /library_project/app/ratings.py
+
+from sqlalchemy import func, case, update, delete, select
+from app import db, fragments
+from app.models import Book, Rating
+from app.sales import dialect_insert
+
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+# How often rate_book switches between its update and insert paths when racing another request.
+RATE_RETRIES = 3
+
+def _average(rating_sum, rating_count):
+    return case((rating_count > 0, rating_sum / rating_count), else_=0)
+
+def _shift(book_id, delta_sum, delta_count):
+    """Moves a book's running aggregates in SQL, recomputing the average from the new values."""
+    new_sum = Book.rating_sum + delta_sum
+    new_count = Book.rating_count + delta_count
+    db.session.execute(
+        update(Book).where(Book.id == book_id)
+        .values(rating_sum=new_sum, rating_count=new_count, rating_avg=_average(new_sum, new_count))
+    )
+    fragments.invalidate_on_commit(book_id)
+
+def user_rating(book_id, user_id):
+    return db.session.query(Rating.rating).filter_by(book_id=book_id, user_id=user_id).scalar()
+
+def rate_book(book_id, user_id, value):
+    """Sets ``user_id``'s rating of a book, replacing any earlier one, in the caller's transaction.
+
+    The book's aggregates move by the difference in the same statement that finds the old
+    rating, so concurrent ratings of one book never lose an update.
+    """
+    existing = select(Rating.rating).where(Rating.book_id == book_id, Rating.user_id == user_id).scalar_subquery()
+    insert = dialect_insert(db.engine.dialect.name)
+    for _ in range(RATE_RETRIES):
+        new_sum = Book.rating_sum + value - existing
+        updated = db.session.execute(
+            update(Book).where(Book.id == book_id, existing.is_not(None))
+            .values(rating_sum=new_sum, rating_avg=_average(new_sum, Book.rating_count))
+        ).rowcount
+        if updated:
+            db.session.execute(
+                update(Rating).where(Rating.book_id == book_id, Rating.user_id == user_id).values(rating=value)
+            )
+            fragments.invalidate_on_commit(book_id)
+            return
+        inserted = db.session.execute(
+            insert(Rating).values(book_id=book_id, user_id=user_id, rating=value)
+            .on_conflict_do_nothing(index_elements=['user_id', 'book_id'])
+            .returning(Rating.id)
+        ).scalar()
+        if inserted is not None:
+            _shift(book_id, value, 1)
+            return
+
+def remove_rating(book_id, user_id):
+    """Deletes ``user_id``'s rating of a book. Returns True if there was one."""
+    value = db.session.execute(
+        delete(Rating).where(Rating.book_id == book_id, Rating.user_id == user_id).returning(Rating.rating)
+    ).scalar()
+    if value is None:
+        return False
+    _shift(book_id, -value, -1)
+    return True
+
+def remove_user_ratings(user_id):
+    """Takes every rating by ``user_id`` out of the book aggregates, e.g. before deleting the account."""
+    book_ids = db.session.execute(select(Rating.book_id).where(Rating.user_id == user_id)).scalars().all()
+    if not book_ids:
+        return
+    theirs = (Rating.user_id == user_id, Rating.book_id == Book.id)
+    their_sum = select(func.coalesce(func.sum(Rating.rating), 0)).where(*theirs).scalar_subquery()
+    their_count = select(func.count(Rating.id)).where(*theirs).scalar_subquery()
+    new_sum, new_count = Book.rating_sum - their_sum, Book.rating_count - their_count
+    db.session.execute(
+        update(Book).where(Book.id.in_(book_ids))
+        .values(rating_sum=new_sum, rating_count=new_count, rating_avg=_average(new_sum, new_count)),
+        execution_options={'synchronize_session': False},
+    )
+    db.session.execute(delete(Rating).where(Rating.user_id == user_id))
+    for book_id in book_ids:
+        fragments.invalidate_on_commit(book_id)
+
+def rebuild_aggregates():
+    """Recomputes every book's aggregates from the rating table.
+
+    The ratings are grouped in one pass and written back by primary key; a correlated
+    subquery per book would scan the rating table once for every book.
+    """
+    totals = db.session.query(Rating.book_id, func.sum(Rating.rating), func.count(Rating.id)) \
+        .group_by(Rating.book_id).all()
+    db.session.execute(update(Book).where(Book.rating_count != 0).values(rating_sum=0, rating_count=0, rating_avg=0),
+                       execution_options={'synchronize_session': False})
+    if totals:
+        db.session.execute(update(Book), [
+            {'id': book_id, 'rating_sum': total, 'rating_count': count, 'rating_avg': total / count}
+            for book_id, total, count in totals
+        ])
+    fragments.cache.clear()
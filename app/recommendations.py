@@ -0,0 +1,194 @@
+# /library_project/app/recommendations.py
+
+import logging
+import os
+from itertools import chain
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, delete, func
+from app import db, archive
+from app.models import Book, BookRecommendation, BorrowHistory, UniqueBook
+from app.http_cache import bump_catalog_version
+
+log = logging.getLogger(__name__)
+
+TOP_K = 10
+FETCH_SIZE = 200_000
+IN_CHUNK = 500  # ids per IN (...) list
+
+def state_path():
+    return current_app.config.get('RECOMMENDATION_STATE') or os.path.join(current_app.instance_path, 'coborrow.npz')
+
+# --- Lookups used by the pages ------------------------------------------------------------------
+
+def recommended_for_book(book_id, limit=6):
+    """Books most often borrowed by the patrons who borrowed ``book_id``, best first."""
+    return Book.query.join(BookRecommendation, BookRecommendation.recommended_id == Book.id) \
+        .filter(BookRecommendation.book_id == book_id) \
+        .order_by(BookRecommendation.rank).limit(limit).all()
+
+def recommended_for_user(user_id, limit=6):
+    """Recommendations for the book ``user_id`` borrowed most recently, as one statement."""
+    last_borrowed = select(UniqueBook.book_id).join(BorrowHistory, BorrowHistory.copy_id == UniqueBook.id) \
+        .where(BorrowHistory.user_id == user_id) \
+        .order_by(BorrowHistory.borrowed_on.desc()).limit(1).scalar_subquery()
+    return Book.query.join(BookRecommendation, BookRecommendation.recommended_id == Book.id) \
+        .filter(BookRecommendation.book_id == last_borrowed) \
+        .order_by(BookRecommendation.rank).limit(limit).all()
+
+# --- Offline job -------------------------------------------------------------------------------
+
+def _borrow_rows(where):
+    """Yields (history ids, user ids, book ids) NumPy arrays of live and archived borrow history, a partition at a time.
+
+    ``where`` maps a history table's columns to the conditions to apply to it.
+    """
+    import numpy as np
+    for table in archive.tables():
+        stmt = select(table.c.id, table.c.user_id, UniqueBook.book_id) \
+            .join(UniqueBook, UniqueBook.id == table.c.copy_id).where(*where(table.c))
+        result = db.session.execute(stmt.execution_options(yield_per=FETCH_SIZE))
+        for rows in result.partitions():
+            rows = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=3 * len(rows)).reshape(-1, 3)
+            yield rows[:, 0], rows[:, 1], rows[:, 2]
+
+def _collect(chunks):
+    import numpy as np
+    columns = [[np.empty(0, dtype=np.int64)] for _ in range(3)]
+    for chunk in chunks:
+        for column, values in zip(columns, chunk):
+            column.append(values)
+    return [np.concatenate(column) for column in columns]
+
+def _incidence(rows, books, n_patrons, n_books):
+    """Binary patron-by-book matrix: 1 where the patron borrowed any copy of the book."""
+    import numpy as np
+    from scipy import sparse
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, books)), shape=(n_patrons, n_books))
+    matrix.data[:] = 1  # repeat borrows of a book count once
+    return matrix
+
+def _patron_incidence(patrons, n_books, last_id, high_id):
+    """Incidence of a sorted array of patrons up to ``last_id`` and up to ``high_id``, read once via the user index."""
+    import numpy as np
+    def chunks():
+        for start in range(0, len(patrons), IN_CHUNK):
+            ids = patrons[start:start + IN_CHUNK].tolist()
+            yield from _borrow_rows(lambda c: (c.user_id.in_(ids), c.id <= high_id))
+    history_ids, users, books = _collect(chunks())
+    rows = np.searchsorted(patrons, users)
+    old = history_ids <= last_id
+    return (_incidence(rows[old], books[old], len(patrons), n_books),
+            _incidence(rows, books, len(patrons), n_books))
+
+def _cooccurrence(incidence):
+    return (incidence.T @ incidence).tocsr()
+
+def _resize(matrix, n):
+    if matrix.shape[0] < n:
+        matrix = matrix.tocsr(copy=True)
+        matrix.resize((n, n))
+    return matrix
+
+def _top_k(cooccurrence, book_ids, k):
+    """(book, rank, recommended, score) arrays for ``book_ids``, by cosine similarity of their borrowers."""
+    import numpy as np
+    counts = cooccurrence.diagonal().astype(np.float64)
+    rows = cooccurrence[book_ids].tocoo()
+    books, others, shared = book_ids[rows.row], rows.col, rows.data.astype(np.float64)
+    keep = books != others
+    books, others, shared = books[keep], others[keep], shared[keep]
+    scores = shared / np.sqrt(counts[books] * counts[others])
+
+    # Sort by book, then best score, then id for a stable order; keep each book's first k.
+    order = np.lexsort((others, -scores, books))
+    books, others, scores = books[order], others[order], scores[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(books)) + 1]
+    ranks = np.arange(len(books)) - np.repeat(starts, np.diff(np.r_[starts, len(books)]))
+    keep = ranks < k
+    return books[keep], ranks[keep], others[keep], scores[keep]
+
+def _store(book_ids, books, ranks, others, scores, replace_all=False):
+    if replace_all:
+        db.session.execute(delete(BookRecommendation))
+    for start in range(0, 0 if replace_all else len(book_ids), IN_CHUNK):
+        db.session.execute(delete(BookRecommendation).where(
+            BookRecommendation.book_id.in_(book_ids[start:start + IN_CHUNK].tolist())))
+    rows = [
+        {'book_id': int(b), 'rank': int(r), 'recommended_id': int(o), 'score': float(s)}
+        for b, r, o, s in zip(books, ranks, others, scores)
+    ]
+    for start in range(0, len(rows), FETCH_SIZE):
+        db.session.execute(BookRecommendation.__table__.insert(), rows[start:start + FETCH_SIZE])
+
+def _save_state(path, cooccurrence, last_history_id):
+    import numpy as np
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, data=cooccurrence.data, indices=cooccurrence.indices, indptr=cooccurrence.indptr,
+             shape=cooccurrence.shape, last_history_id=last_history_id)
+    os.replace(tmp, path)
+
+def _load_state(path):
+    import numpy as np
+    from scipy import sparse
+    if not os.path.exists(path):
+        return None, 0
+    with np.load(path) as state:
+        matrix = sparse.csr_matrix((state['data'], state['indices'], state['indptr']), shape=tuple(state['shape']))
+        return matrix, int(state['last_history_id'])
+
+def refresh(full=False, k=TOP_K, echo=log.info):
+    """Brings the co-borrow matrix and stored recommendations up to date with borrow history.
+
+    Incremental runs read only history rows added since the last run plus the earlier history
+    of the patrons in them, and rewrite recommendations only for books whose scores moved.
+    History that was deleted since (sold copies, deleted accounts) is only dropped by a
+    ``full`` rebuild, which is also what the first run does.
+    Returns the number of books whose recommendations were rewritten.
+    """
+    import numpy as np
+    path = state_path()
+    cooccurrence, last_id = (None, 0) if full else _load_state(path)
+    high_id = max(db.session.query(func.max(table.c.id)).scalar() or 0 for table in archive.tables())
+    n_books = (db.session.query(func.max(Book.id)).scalar() or 0) + 1
+    started = datetime.utcnow()
+
+    rebuild = cooccurrence is None
+    if rebuild:
+        _, users, books = _collect(_borrow_rows(lambda c: (c.id <= high_id,)))
+        patrons, rows = np.unique(users, return_inverse=True)
+        incidence = _incidence(rows, books, len(patrons), n_books)
+        cooccurrence = _cooccurrence(incidence)
+        touched = np.arange(n_books)
+        echo(f"Built co-borrow matrix from {incidence.shape[0]} patrons and {incidence.nnz} patron-book pairs.")
+    else:
+        if high_id <= last_id:
+            echo("No new borrow history since the last refresh.")
+            return 0
+        users = set()
+        for table in archive.tables():
+            users.update(db.session.execute(
+                select(table.c.user_id).where(table.c.id > last_id, table.c.id <= high_id).distinct()).scalars())
+        users = np.array(sorted(users), dtype=np.int64)
+        # Deleting the highest-id book shrinks max(Book.id); the stored matrix keeps its size.
+        n_books = max(cooccurrence.shape[0], n_books)
+        before, after = _patron_incidence(users, n_books, last_id, high_id)
+        cooccurrence = _resize(cooccurrence, n_books)
+        cooccurrence = (cooccurrence + _cooccurrence(after) - _cooccurrence(before)).tocsr()
+        cooccurrence.eliminate_zeros()
+        # A book's scores move when its own pairs or any neighbour's borrower count changed.
+        newly_borrowed = np.flatnonzero(np.asarray((after - before).sum(axis=0)).ravel())
+        touched = np.union1d(newly_borrowed, cooccurrence[newly_borrowed].indices)
+        echo(f"Folded in history rows {last_id + 1}..{high_id} from {len(users)} patrons.")
+
+    books, ranks, others, scores = _top_k(cooccurrence, touched, k)
+    _store(touched, books, ranks, others, scores, replace_all=rebuild)
+    # Save the matrix before committing: if the commit fails the next run re-scores these books,
+    # whereas a saved-late matrix would fold the same history in twice.
+    _save_state(path, cooccurrence, high_id)
+    bump_catalog_version()
+    db.session.commit()
+    echo(f"Recommendations rewritten for {len(np.unique(books))} books in "
+         f"{(datetime.utcnow() - started).total_seconds():.1f}s.")
+    return len(touched)
@@ -0,0 +1,112 @@
+# /library_project/app/sales.py
+
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, delete
+from app import db
+from app.models import Purchase, SalesDaily
+
+# Ranges longer than this are charted per month instead of per day.
+DAILY_TREND_MAX_DAYS = 92
+# Longer ranges are cut to this many days ending at ``end``, so a page never reads more rollup rows.
+MAX_RANGE_DAYS = 5 * 366
+
+def dialect_insert(dialect_name):
+    """The dialect's ``insert`` construct, which adds ON CONFLICT support (SQLite and PostgreSQL)."""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def record_sale(price, when=None):
+    """Adds one sale to the daily rollup, inside the caller's transaction."""
+    day = (when or datetime.utcnow()).date()
+    insert = dialect_insert(db.engine.dialect.name)
+    stmt = insert(SalesDaily).values(day=day, books_sold=1, revenue=price)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[SalesDaily.day],
+        set_={
+            'books_sold': SalesDaily.books_sold + 1,
+            'revenue': SalesDaily.revenue + stmt.excluded.revenue,
+        },
+    ))
+
+def rebuild_rollup(start=None, end=None):
+    """Recomputes rollup rows for [start, end] (whole history by default) from the purchase table.
+
+    Uses a range filter on the indexed bought_on column. Returns the number of days written.
+    """
+    query = db.session.query(
+        func.date(Purchase.bought_on), func.count(Purchase.id), func.sum(Purchase.price_paid)
+    )
+    clear = delete(SalesDaily)
+    if start:
+        query = query.filter(Purchase.bought_on >= datetime.combine(start, datetime.min.time()))
+        clear = clear.where(SalesDaily.day >= start)
+    if end:
+        query = query.filter(Purchase.bought_on < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        clear = clear.where(SalesDaily.day <= end)
+    rows = query.group_by(func.date(Purchase.bought_on)).all()
+
+    db.session.execute(clear)
+    for day, sold, revenue in rows:
+        if not isinstance(day, date):
+            day = date.fromisoformat(day)
+        db.session.add(SalesDaily(day=day, books_sold=sold, revenue=revenue or 0))
+    db.session.commit()
+    return len(rows)
+
+def parse_range(args):
+    """Reads ``start``/``end`` (YYYY-MM-DD) from request args; defaults to the current month so far."""
+    today = datetime.utcnow().date()
+    try:
+        start = date.fromisoformat(args['start'])
+    except (KeyError, ValueError):
+        start = today.replace(day=1)
+    try:
+        end = date.fromisoformat(args['end'])
+    except (KeyError, ValueError):
+        end = today
+    if start > end:
+        start, end = end, start
+    if (end - start).days > MAX_RANGE_DAYS:
+        start = end - timedelta(days=MAX_RANGE_DAYS)
+    return start, end
+
+def range_presets(today=None):
+    today = today or datetime.utcnow().date()
+    return [
+        ('This month', today.replace(day=1), today),
+        ('Last 30 days', today - timedelta(days=29), today),
+        ('Last 90 days', today - timedelta(days=89), today),
+        ('This year', today.replace(month=1, day=1), today),
+    ]
+
+def sales_summary(start, end):
+    """Returns (books_sold, revenue) for the inclusive date range."""
+    sold, revenue = db.session.query(
+        func.coalesce(func.sum(SalesDaily.books_sold), 0), func.coalesce(func.sum(SalesDaily.revenue), 0)
+    ).filter(SalesDaily.day >= start, SalesDaily.day <= end).one()
+    return sold, revenue
+
+def _months(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield f'{year:04d}-{month:02d}'
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def sales_trend(start, end):
+    """Returns [(label, books_sold, revenue)] per day, or per month for long ranges, with empty buckets filled in."""
+    rows = SalesDaily.query.filter(SalesDaily.day >= start, SalesDaily.day <= end).order_by(SalesDaily.day).all()
+    if (end - start).days > DAILY_TREND_MAX_DAYS:
+        key, labels = (lambda d: d.strftime('%Y-%m')), _months(start, end)
+    else:
+        key = lambda d: d.isoformat()
+        labels = ((start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1))
+
+    buckets = {label: [0, 0.0] for label in labels}
+    for row in rows:
+        bucket = buckets[key(row.day)]
+        bucket[0] += row.books_sold
+        bucket[1] += row.revenue
+    return [(label, sold, revenue) for label, (sold, revenue) in buckets.items()]
@@ -0,0 +1,79 @@
+# /library_project/app/search.py
+
+import re
+from sqlalchemy import text, or_
+from app import db
+from app.models import Book
+
+# bm25 weights, in column order: title, author, publisher, description, isbn
+FTS_COLUMNS = ('title', 'author', 'publisher', 'description', 'isbn')
+FTS_WEIGHTS = (10.0, 5.0, 2.0, 1.0, 3.0)
+
+def fts_enabled():
+    return db.engine.dialect.name == 'sqlite'
+
+def create_index():
+    """Creates the FTS5 table backing catalog search if it does not exist yet."""
+    if not fts_enabled():
+        return
+    db.session.execute(text(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5({', '.join(FTS_COLUMNS)}, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+
+def rebuild_index():
+    """Drops and refills the search index from the book table. Returns the number of indexed books."""
+    if not fts_enabled():
+        return 0
+    db.session.execute(text("DROP TABLE IF EXISTS book_fts"))
+    create_index()
+    columns = ', '.join(FTS_COLUMNS)
+    db.session.execute(text(f"INSERT INTO book_fts(rowid, {columns}) SELECT id, {columns} FROM book"))
+    db.session.commit()
+    return db.session.execute(text("SELECT count(*) FROM book_fts")).scalar()
+
+def index_book(book):
+    """Adds or refreshes one book in the index, inside the caller's transaction."""
+    if not fts_enabled():
+        return
+    unindex_book(book.id)
+    index_rows([dict({column: getattr(book, column) for column in FTS_COLUMNS}, id=book.id)])
+
+def index_rows(rows):
+    """Indexes freshly inserted books in one executemany; ``rows`` are dicts with ``id`` and the indexed columns."""
+    if not fts_enabled() or not rows:
+        return
+    db.session.execute(text(
+        f"INSERT INTO book_fts(rowid, {', '.join(FTS_COLUMNS)}) "
+        f"VALUES (:id, {', '.join(':' + c for c in FTS_COLUMNS)})"
+    ), [{'id': row['id'], **{c: row.get(c) for c in FTS_COLUMNS}} for row in rows])
+
+def unindex_book(book_id):
+    if not fts_enabled():
+        return
+    db.session.execute(text("DELETE FROM book_fts WHERE rowid = :id"), {'id': book_id})
+
+def _match_expression(query):
+    # Every term must match; each one is quoted so FTS syntax in user input is inert,
+    # and starred so "gats" finds "Gatsby".
+    terms = re.findall(r'\w+', query)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search_books(query, limit, offset=0):
+    """Returns books matching ``query``, best match first."""
+    match = _match_expression(query)
+    if not match:
+        return []
+
+    if not fts_enabled():
+        pattern = f'%{query.strip()}%'
+        return Book.query.filter(or_(*[getattr(Book, c).ilike(pattern) for c in FTS_COLUMNS])) \
+            .order_by(Book.title, Book.id).offset(offset).limit(limit).all()
+
+    weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+    ids = db.session.execute(text(
+        f"SELECT rowid FROM book_fts WHERE book_fts MATCH :match "
+        f"ORDER BY bm25(book_fts, {weights}) LIMIT :limit OFFSET :offset"
+    ), {'match': match, 'limit': limit, 'offset': offset}).scalars().all()
+    books = {book.id: book for book in Book.query.filter(Book.id.in_(ids))}
+    return [books[book_id] for book_id in ids if book_id in books]
@@ -0,0 +1,160 @@
+# /library_project/app/sql_metrics.py
+
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from app import db
+
+log = logging.getLogger(__name__)
+
+# Longest statement text kept in logs and on the admin page.
+SHAPE_LENGTH = 300
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement):
+    """A statement with whitespace collapsed and expanded IN lists folded, so repeats compare equal."""
+    shape = ' '.join(statement.split())
+    return re.sub(r'\((?:\?|%\(\w+\)s|:\w+)(?:, (?:\?|%\(\w+\)s|:\w+))+\)', '(?, ...)', shape)
+
+class RequestMetrics:
+    """Statements one request ran: a count and total time, plus how often each shape repeated."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.shapes = {}  # shape -> times run
+        self.slow = []  # (seconds, shape)
+
+    def record(self, statement, seconds, slow_seconds):
+        shape = statement_shape(statement)
+        self.queries += 1
+        self.sql_seconds += seconds
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        if seconds >= slow_seconds:
+            self.slow.append((seconds, shape))
+
+    def repeated(self, threshold):
+        """(times, shape) for every shape run at least ``threshold`` times, most repeated first."""
+        return sorted(((n, shape) for shape, n in self.shapes.items() if n >= threshold), reverse=True)
+
+class EndpointStats:
+    """Thread-safe running totals per endpoint since the process started or was last reset."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+        self.since = time.time()
+
+    def add(self, endpoint, metrics, elapsed, repeated_shape=None):
+        """Adds one request; ``repeated_shape`` is its most repeated (shape, times) if it looked like an N+1."""
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'sql_seconds': 0.0, 'seconds': 0.0,
+                'max_seconds': 0.0, 'slow_queries': 0, 'n_plus_one': 0, 'repeated_shape': None,
+            })
+            stats['requests'] += 1
+            stats['queries'] += metrics.queries
+            stats['max_queries'] = max(stats['max_queries'], metrics.queries)
+            stats['sql_seconds'] += metrics.sql_seconds
+            stats['seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+            stats['slow_queries'] += len(metrics.slow)
+            if repeated_shape:
+                stats['n_plus_one'] += 1
+                stats['repeated_shape'] = repeated_shape
+
+    def snapshot(self):
+        """Per-endpoint dicts with averages filled in, the most SQL time first."""
+        with self._lock:
+            rows = [dict(stats, endpoint=endpoint) for endpoint, stats in self._stats.items()]
+        for row in rows:
+            row['avg_queries'] = row['queries'] / row['requests']
+            row['avg_sql_ms'] = row['sql_seconds'] * 1000 / row['requests']
+            row['avg_ms'] = row['seconds'] * 1000 / row['requests']
+        return sorted(rows, key=lambda row: row['sql_seconds'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.since = time.time()
+
+stats = EndpointStats()
+
+def configure(app):
+    """Times every statement of every request on ``app``'s engine, unless SQL_METRICS is off.
+
+    Turning it off registers nothing, so the statement path carries no extra work at all.
+    """
+    if not app.config.get('SQL_METRICS', True):
+        return
+    slow_query = app.config.get('SLOW_QUERY_MS', 200) / 1000
+    slow_request = app.config.get('SLOW_REQUEST_MS', 1000) / 1000
+    threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+    server_timing = app.config.get('SERVER_TIMING', True)
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('sql_metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _finish(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info['sql_metrics_started'].pop()
+        if has_request_context():
+            metrics = g.get('sql_metrics')
+            if metrics is not None:
+                metrics.record(statement, seconds, slow_query)
+
+    @event.listens_for(engine, 'handle_error')
+    def _failed(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('sql_metrics_started'):
+            connection.info['sql_metrics_started'].pop()
+
+    @app.before_request
+    def _begin():
+        g.sql_metrics = RequestMetrics()
+
+    def report(metrics, endpoint, method, path):
+        elapsed = time.perf_counter() - metrics.started
+        repeated = metrics.repeated(threshold)
+        for times, shape in repeated:
+            log.warning("Possible N+1 in %s: %d runs of %s", endpoint, times, shape[:SHAPE_LENGTH])
+        for seconds, shape in metrics.slow:
+            log.warning("Slow query in %s (%.0f ms): %s", endpoint, seconds * 1000, shape[:SHAPE_LENGTH])
+        if elapsed >= slow_request:
+            log.warning("Slow request %s %s: %.0f ms, %d queries in %.0f ms", method, path,
+                        elapsed * 1000, metrics.queries, metrics.sql_seconds * 1000)
+        worst = (repeated[0][1][:SHAPE_LENGTH], repeated[0][0]) if repeated else None
+        stats.add(endpoint, metrics, elapsed, worst)
+
+    @app.after_request
+    def _server_timing(response):
+        metrics = g.get('sql_metrics')
+        if metrics is None:
+            return response
+        if server_timing:
+            elapsed = time.perf_counter() - metrics.started
+            response.headers.add('Server-Timing', f'db;dur={metrics.sql_seconds * 1000:.1f};desc="{metrics.queries} queries"')
+            response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+        if response.is_streamed and request.endpoint is not None:
+            # A streamed body (CSV exports) runs its statements after teardown, so report once it is closed.
+            g.sql_metrics_streamed = True
+            args = (metrics, request.endpoint, request.method, request.path)
+            response.call_on_close(lambda: report(*args))
+        return response
+
+    @app.teardown_request
+    def _record(exc):
+        if g.get('sql_metrics_streamed'):
+            return
+        metrics = g.pop('sql_metrics', None)
+        if metrics is not None and request.endpoint is not None:
+            report(metrics, request.endpoint, request.method, request.path)
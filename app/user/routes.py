@@ -2,23 +2,29 @@
 
 from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_required, current_user
-from app import db
-from app.models import Book, Comment, UniqueBook, Purchase, BorrowHistory
-from datetime import datetime, timedelta
+from app import db, fragments, ratings, recommendations, loans
+from app.models import Book, Comment, UniqueBook, Purchase
+from app.catalog import catalog_page
+from app.comments import render_comments
+from app.http_cache import bump_catalog_version, conditional_on_catalog
+from app.loans import LoanError
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
 @user_bp.route('/dashboard')
 @login_required
+@conditional_on_catalog
 def user_dashboard():
     if current_user.role != 'user':
         flash('Access denied.', 'danger')
         return redirect(url_for('main.home'))
-    books = Book.query.all()
-    return render_template('user/user_dashboard.html', books=books)
+    page = catalog_page(request.args)
+    recommended = recommendations.recommended_for_user(current_user.id)
+    return render_template('user/user_dashboard.html', page=page, recommended=recommended)
 
 @user_bp.route('/book/<int:book_id>', methods=['GET', 'POST'])
 @login_required
+@conditional_on_catalog
 def view_book(book_id):
     book = Book.query.get_or_404(book_id)
     if request.method == 'POST':
@@ -28,14 +34,41 @@ def view_book(book_id):
         else:
             new_comment = Comment(content=comment_text.strip(), user_id=current_user.id, book_id=book.id)
             db.session.add(new_comment)
+            bump_catalog_version()
             db.session.commit()
             flash('Comment posted successfully!', 'success')
         return redirect(url_for('user.view_book', book_id=book_id))
 
-    comments = Comment.query.filter_by(book_id=book.id).order_by(Comment.created_at.desc()).all()
-    available_copies = [copy for copy in book.copies if copy.status == 'available']
-    available_count = len(available_copies)
-    return render_template('user/view_book.html', book=book, available_count=available_count, comments=comments)
+    detail = fragments.render_cached(book.id, 'user', lambda: render_template('user/book_detail.html', book=book))
+    comments = render_comments(book, 'user.view_book', request.args)
+    my_rating = ratings.user_rating(book.id, current_user.id) if current_user.role == 'user' else None
+    recommended = recommendations.recommended_for_book(book.id)
+    return render_template('user/view_book.html', book=book, detail=detail, comments=comments,
+                           my_rating=my_rating, recommended=recommended)
+
+@user_bp.route('/rate_book/<int:book_id>', methods=['POST'])
+@login_required
+def rate_book(book_id):
+    if current_user.role != 'user':
+        flash('Only regular users can rate books.', 'danger')
+        return redirect(url_for('main.home'))
+    book = Book.query.get_or_404(book_id)
+    if request.form.get('remove'):
+        if ratings.remove_rating(book.id, current_user.id):
+            bump_catalog_version()
+            db.session.commit()
+            flash('Your rating was removed.', 'info')
+        return redirect(url_for('user.view_book', book_id=book.id))
+
+    value = request.form.get('rating', type=int)
+    if value not in ratings.RATING_VALUES:
+        flash('Please pick a rating from 1 to 5.', 'warning')
+        return redirect(url_for('user.view_book', book_id=book.id))
+    ratings.rate_book(book.id, current_user.id, value)
+    bump_catalog_version()
+    db.session.commit()
+    flash(f'You rated "{book.title}" {value}/5.', 'success')
+    return redirect(url_for('user.view_book', book_id=book.id))
 
 @user_bp.route('/issue_book/<int:book_id>')
 @login_required
@@ -44,26 +77,13 @@ def issue_book(book_id):
         flash('Only regular users can issue books.', 'danger')
         return redirect(url_for('main.home'))
     book = Book.query.get_or_404(book_id)
-    already_borrowed = UniqueBook.query.filter_by(book_id=book.id, borrower_id=current_user.id, status='borrowed').first()
-    if already_borrowed:
-        flash('You have already issued this book.', 'warning')
+    try:
+        _, due_date = loans.issue_book(book, current_user.id)
+    except LoanError as e:
+        flash(e.message, e.category)
         return redirect(url_for('user.view_book', book_id=book.id))
-    
-    available_copy = UniqueBook.query.filter_by(book_id=book.id, status='available').first()
-    if not available_copy:
-        flash('Sorry, no copies available to issue.', 'danger')
-        return redirect(url_for('user.view_book', book_id=book.id))
-
-    available_copy.status = 'borrowed'
-    available_copy.borrower_id = current_user.id
-    available_copy.borrowed_on = datetime.utcnow()
-    available_copy.due_date = datetime.utcnow() + timedelta(days=7)
-
-    history = BorrowHistory(user_id=current_user.id, copy_id=available_copy.id, borrowed_on=datetime.utcnow())
-    db.session.add(history)
-    db.session.commit()
 
-    flash(f'You have successfully issued "{book.title}". Return by {available_copy.due_date.strftime("%Y-%m-%d")}.', 'success')
+    flash(f'You have successfully issued "{book.title}". Return by {due_date.strftime("%Y-%m-%d")}.', 'success')
     return redirect(url_for('user.user_dashboard'))
 
 @user_bp.route('/buy_book/<int:book_id>')
@@ -82,20 +102,12 @@ def confirm_buy_book(book_id):
         flash('Only regular users can buy books.', 'danger')
         return redirect(url_for('main.home'))
     book = Book.query.get_or_404(book_id)
-    available_copy = UniqueBook.query.filter_by(book_id=book.id, status='available').first()
-    if not available_copy:
-        flash('Sorry, this book is out of stock.', 'danger')
-        return redirect(url_for('user.view_book', book_id=book.id))
-    if current_user.credits < book.price:
-        flash(f'Not enough credits to buy "{book.title}".', 'danger')
+    try:
+        book_price = loans.buy_book(book, current_user.id)
+    except LoanError as e:
+        flash(e.message, e.category)
         return redirect(url_for('user.view_book', book_id=book.id))
-
-    new_purchase = Purchase(user_id=current_user.id, book_title=book.title, book_author=book.author, price_paid=book.price)
-    db.session.add(new_purchase)
-    current_user.credits -= book.price
-    db.session.delete(available_copy)
-    db.session.commit()
-    flash(f'You have successfully bought "{book.title}" for ${book.price:.2f}.', 'success')
+    flash(f'You have successfully bought "{book.title}" for ${book_price:.2f}.', 'success')
     return redirect(url_for('user.user_dashboard'))
 
 @user_bp.route('/my_books')
@@ -104,7 +116,7 @@ def my_books():
     if current_user.role != 'user':
         flash('Access denied.', 'danger')
         return redirect(url_for('main.home'))
-    borrowed_copies = UniqueBook.query.filter_by(borrower_id=current_user.id, status='borrowed').all()
+    borrowed_copies = loans.current_loans(current_user.id)
     purchases = Purchase.query.filter_by(user_id=current_user.id).all()
     return render_template('user/my_books.html', borrowed_copies=borrowed_copies, purchases=purchases)
 
@@ -112,20 +124,11 @@ def my_books():
 @login_required
 def return_book(copy_id):
     copy = UniqueBook.query.get_or_404(copy_id)
-    if copy.borrower_id != current_user.id:
-        flash('You can only return your own borrowed books.', 'danger')
+    try:
+        loans.return_copy(copy, current_user.id)
+    except LoanError as e:
+        flash(e.message, e.category)
         return redirect(url_for('user.my_books'))
-
-    copy.status = 'available'
-    copy.borrower_id = None
-    copy.borrowed_on = None
-    copy.due_date = None
-    
-    last_borrow = BorrowHistory.query.filter_by(copy_id=copy.id, user_id=current_user.id).order_by(BorrowHistory.borrowed_on.desc()).first()
-    if last_borrow and last_borrow.returned_on is None:
-        last_borrow.returned_on = datetime.utcnow()
-
-    db.session.commit()
     flash('Book returned successfully!', 'success')
     return redirect(url_for('user.my_books'))
 
@@ -133,21 +136,12 @@ def return_book(copy_id):
 @login_required
 def buy_borrowed_book(copy_id):
     copy = UniqueBook.query.get_or_404(copy_id)
-    if copy.borrower_id != current_user.id:
-        flash('You can only buy books you have borrowed.', 'danger')
-        return redirect(url_for('user.my_books'))
-
-    book = copy.book
-    book_price = book.price or 0
-    if current_user.credits < book_price:
-        flash(f'Not enough credits to buy "{book.title}". You need ${book_price:.2f}.', 'danger')
+    title = copy.book.title
+    try:
+        book_price = loans.buy_borrowed_copy(copy, current_user.id)
+    except LoanError as e:
+        flash(e.message, e.category)
         return redirect(url_for('user.my_books'))
-    
-    current_user.credits -= book_price
-    new_purchase = Purchase(user_id=current_user.id, book_title=book.title, book_author=book.author, price_paid=book_price)
-    db.session.add(new_purchase)
-    db.session.delete(copy)
-    db.session.commit()
 
-    flash(f'You have successfully bought "{book.title}" for ${book_price:.2f}.', 'success')
-    return redirect(url_for('user.my_books'))
\ No newline at end of file
+    flash(f'You have successfully bought "{title}" for ${book_price:.2f}.', 'success')
+    return redirect(url_for('user.my_books'))
@@ -0,0 +1,117 @@
+# /library_project/app/user_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from flask import current_app
+from app import db
+from app.models import User
+
+class UserCache:
+    """Thread-safe LRU of user column snapshots with a TTL.
+
+    Each user id also has a version stamp that ``invalidate`` bumps. A loader records the version
+    before it queries and ``put`` drops the result if an invalidation happened in between, so a
+    slow read can never re-cache data that was already superseded.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, snapshot)
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return snapshot
+
+    def version(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def put(self, user_id, snapshot, version):
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return
+            self._entries[user_id] = (time.monotonic() + self.ttl, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self._versions.pop(evicted, None)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+cache = UserCache()
+
+def configure(app):
+    cache.maxsize = app.config.get('USER_CACHE_SIZE', cache.maxsize)
+    cache.ttl = app.config.get('USER_CACHE_TTL', cache.ttl)
+
+def _snapshot(user):
+    return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+def load_user(user_id):
+    """Flask-Login user loader that skips the database while the user's snapshot is cached.
+
+    A cached user is rebuilt and merged into the request's session without a SELECT, so
+    relationships still lazy-load as usual.
+    """
+    if not current_app.config.get('USER_CACHE_TTL'):
+        return db.session.get(User, user_id)
+
+    snapshot = cache.get(user_id)
+    if snapshot is None:
+        version = cache.version(user_id)
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.put(user_id, _snapshot(user), version)
+        return user
+
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def invalidate_on_commit(user_id):
+    """Drops a user's cached snapshot once the current transaction commits.
+
+    Needed after bulk UPDATEs on the user table, which the ORM flush hooks below cannot see.
+    """
+    db.session.info.setdefault('stale_users', set()).add(user_id)
+    cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in session.dirty | session.deleted if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('stale_users', set()).update(changed)
+        for user_id in changed:
+            cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    # Invalidate again after commit: another request may have re-cached the old row between our flush and commit.
+    for user_id in session.info.pop('stale_users', ()):
+        cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_users(session):
+    session.info.pop('stale_users', None)
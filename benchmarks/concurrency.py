@@ -0,0 +1,118 @@
+# /library_project/benchmarks/concurrency.py
+"""Read and write throughput against a throwaway SQLite database as worker threads increase,
+for each config profile (development: driver defaults; production: pooled, WAL, busy_timeout).
+
+    python -m benchmarks.concurrency --workers 1,2,4,8 --seconds 3
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# init_db seeds the default accounts and book types from the environment, and the config reads
+# SECRET_KEY from it; give them throwaway values.
+for key, value in {
+    'SECRET_KEY': 'benchmark', 'ADMIN_USERNAME': 'bench-admin', 'ADMIN_EMAIL': 'admin@bench.local',
+    'ADMIN_PASSWORD': 'bench-admin', 'LIBRARIAN_USERNAME': 'bench-librarian',
+    'LIBRARIAN_EMAIL': 'librarian@bench.local', 'LIBRARIAN_PASSWORD': 'bench-librarian',
+    'INITIAL_BOOK_TYPES': 'Learning,Movie,Magazine,Novel,Comic',
+}.items():
+    os.environ.setdefault(key, value)
+
+from sqlalchemy.exc import OperationalError
+from app import create_app, db
+from app.models import Book, User
+from app.importer import import_books
+from app.bootstrap import init_db
+from app.inventory import claim_copy, release_copy
+from config import configs
+
+BOOKS = 500
+
+def make_app(profile, path):
+    base = configs[profile]
+    config = type(f'Bench{base.__name__}', (base,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'DEBUG': False,
+        'USER_CACHE_TTL': 0,
+    })
+    app = create_app(config)
+    with app.app_context():
+        init_db()
+        import_books(
+            {'title': f'Bench {i}', 'author': 'Bench', 'isbn': f'bench-{i}', 'publisher': 'Bench',
+             'book_type_id': 1, 'copies': 4}
+            for i in range(BOOKS)
+        )
+        for i in range(64):
+            db.session.add(User(username=f'bench-user-{i}', email=f'u{i}@bench.local', password='-', role='user'))
+        db.session.commit()
+    return app
+
+def _read(user_id):
+    book = db.session.get(Book, random.randint(1, BOOKS))
+    return book.available_copies
+
+def _write(user_id):
+    book_id = random.randint(1, BOOKS)
+    now = datetime.utcnow()
+    copy_id = claim_copy(book_id, user_id, now, now + timedelta(days=7))
+    db.session.commit()
+    if copy_id is not None:
+        release_copy(copy_id, user_id)
+        db.session.commit()
+
+def run(app, op, workers, seconds):
+    """Returns (operations per second, lock errors) for ``workers`` threads running ``op`` for ``seconds``."""
+    with app.app_context():
+        user_ids = [u.id for u in User.query.filter(User.username.like('bench-user-%')).limit(workers)]
+    counts = [0] * workers
+    errors = [0] * workers
+    start = threading.Barrier(workers + 1)
+
+    def worker(index):
+        with app.app_context():
+            start.wait()
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                try:
+                    op(user_ids[index])
+                    counts[index] += 1
+                except OperationalError:
+                    db.session.rollback()
+                    errors[index] += 1
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds, sum(errors)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4,8,16', help='Comma-separated worker counts.')
+    parser.add_argument('--seconds', type=float, default=3.0, help='Duration of each measurement.')
+    parser.add_argument('--profiles', default=','.join(configs), help='Config profiles to compare.')
+    args = parser.parse_args()
+    worker_counts = [int(n) for n in args.workers.split(',')]
+
+    print(f"{'profile':<12} {'workers':>7} {'reads/s':>10} {'writes/s':>10} {'lock errors':>12}")
+    for profile in args.profiles.split(','):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = make_app(profile, os.path.join(tmp, 'bench.db'))
+            for workers in worker_counts:
+                reads, read_errors = run(app, _read, workers, args.seconds)
+                writes, write_errors = run(app, _write, workers, args.seconds)
+                print(f"{profile:<12} {workers:>7} {reads:>10.0f} {writes:>10.0f} {read_errors + write_errors:>12}")
+            with app.app_context():
+                db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
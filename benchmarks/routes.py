@@ -0,0 +1,276 @@
+# /library_project/benchmarks/routes.py
+"""Latency, queries per request and peak memory of every blueprint's routes on a synthetic library.
+
+    python -m benchmarks.routes --scale 100k --requests 50
+    python -m benchmarks.routes --scale 1k --only user.,api. --update-baseline
+
+The library for a scale is generated once (see benchmarks.synthetic) and copied for each run,
+so the writes one run makes never leak into the next. Requests go through the Flask test client
+as a patron, a librarian or an admin. Results are compared with benchmarks/baselines/<scale>.json:
+the run exits non-zero when a route issues more queries than its baseline, or its p50 latency or
+peak memory grew by more than --tolerance. Latencies only compare on the same machine, so
+refresh the baseline with --update-baseline after moving it.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import date
+
+from benchmarks import synthetic
+from sqlalchemy import event, func
+from app import db, migrations
+from app.archive import archive_path
+from app.models import Book, UniqueBook, User
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+WARMUP = 2
+MEMORY_SAMPLES = 3
+# Differences below these are noise whatever the tolerance says.
+MIN_LATENCY_MS = 5.0
+MIN_MEMORY_KIB = 64
+
+# ``build(ctx)`` returns (method, url) or (method, url, form data); ``role`` picks the signed-in account.
+Route = namedtuple('Route', 'name role build')
+
+def _book(ctx):
+    return ctx.rng.randint(*ctx.books)
+
+def _popular_book(ctx):
+    return synthetic._popular(ctx.rng, ctx.books)
+
+def _issue(ctx):
+    return 'POST', f'/api/v1/books/{_popular_book(ctx)}/issue'
+
+def _return(ctx):
+    return 'POST', f'/api/v1/loans/{ctx.loans.pop() if ctx.loans else 0}/return'
+
+ROUTES = [
+    Route('main.home', None, lambda ctx: ('GET', '/')),
+    Route('auth.login', None, lambda ctx: ('GET', '/login')),
+    # Only loads the signed-in user, so with the user cache warm it should run no queries at all.
+    Route('main.home.signed_in', 'patron', lambda ctx: ('GET', '/')),
+    Route('user.dashboard', 'patron', lambda ctx: ('GET', '/user/dashboard')),
+    Route('user.dashboard.top_rated', 'patron', lambda ctx: ('GET', '/user/dashboard?sort=rating')),
+    Route('user.dashboard.search', 'patron', lambda ctx: ('GET', f'/user/dashboard?q={ctx.rng.choice(synthetic.WORDS)}')),
+    Route('user.view_book', 'patron', lambda ctx: ('GET', f'/user/book/{_popular_book(ctx)}')),
+    Route('user.my_books', 'patron', lambda ctx: ('GET', '/user/my_books')),
+    Route('user.rate_book', 'patron', lambda ctx: ('POST', f'/user/rate_book/{_book(ctx)}', {'rating': ctx.rng.randint(1, 5)})),
+    Route('librarian.dashboard', 'librarian', lambda ctx: ('GET', '/librarian/dashboard')),
+    Route('librarian.catalog', 'librarian', lambda ctx: ('GET', '/librarian/view_available_books')),
+    Route('librarian.catalog.table', 'librarian', lambda ctx: ('GET', '/librarian/view_available_books?view=table')),
+    Route('librarian.view_book', 'librarian', lambda ctx: ('GET', f'/librarian/view_book/{_popular_book(ctx)}')),
+    Route('librarian.view_history', 'librarian', lambda ctx: ('GET', f'/librarian/view_history/{ctx.rng.randint(*ctx.copies)}')),
+    Route('librarian.overdue', 'librarian', lambda ctx: ('GET', '/librarian/overdue')),
+    Route('librarian.registered_users', 'librarian', lambda ctx: ('GET', '/librarian/registered_users')),
+    Route('librarian.user_borrows', 'librarian', lambda ctx: ('GET', f'/librarian/user_borrows/{ctx.rng.randint(*ctx.patrons)}')),
+    Route('librarian.user_credits', 'librarian', lambda ctx: ('GET', f'/librarian/user_credits/{ctx.rng.randint(*ctx.patrons)}')),
+    Route('librarian.export_borrows', 'librarian', lambda ctx: ('GET', f'/librarian/export/borrows?start={ctx.today}&end={ctx.today}')),
+    Route('admin.view_users', 'admin', lambda ctx: ('GET', '/admin/view_users')),
+    Route('admin.view_books', 'admin', lambda ctx: ('GET', '/admin/view_books')),
+    Route('admin.view_book', 'admin', lambda ctx: ('GET', f'/admin/view_book/{_popular_book(ctx)}')),
+    Route('api.books', 'patron', lambda ctx: ('GET', '/api/v1/books?limit=50')),
+    Route('api.availability', 'patron', lambda ctx: ('GET', f'/api/v1/books/{_book(ctx)}/availability')),
+    Route('api.loans', 'patron', lambda ctx: ('GET', '/api/v1/loans')),
+    Route('api.issue', 'patron', _issue),
+    Route('api.return', 'patron', _return),
+]
+
+class Context:
+    """Id ranges to draw from, plus the copies api.issue lent out for api.return to bring back."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.books = db.session.query(func.min(Book.id), func.max(Book.id)).one()
+        self.copies = db.session.query(func.min(UniqueBook.id), func.max(UniqueBook.id)).one()
+        self.patrons = db.session.query(func.min(User.id), func.max(User.id)).filter(User.role == 'user').one()
+        self.accounts = {
+            'patron': db.session.query(User.id).filter(User.username == 'patron1').scalar(),
+            'librarian': db.session.query(User.id).filter(User.role == 'librarian').order_by(User.id).limit(1).scalar(),
+            'admin': db.session.query(User.id).filter(User.role == 'admin').order_by(User.id).limit(1).scalar(),
+        }
+        self.today = date.today().isoformat()
+        self.loans = []
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+def _client(app, user_id):
+    client = app.test_client()
+    if user_id is not None:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    return client
+
+def _send(client, ctx, route):
+    method, url, *data = route.build(ctx)
+    response = client.open(url, method=method, data=data[0] if data else None)
+    response.get_data()
+    response.close()
+    if route.name == 'api.issue' and response.status_code == 201:
+        ctx.loans.append(response.get_json()['copy_id'])
+    return response
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def measure(app, routes, requests, max_seconds, seed=1):
+    """Returns {route name: {p50_ms, p99_ms, queries, peak_kib, requests, errors}}."""
+    results = {}
+    # Requests must not run inside an outer app context: Flask would reuse it, and with it the
+    # signed-in user Flask-Login caches on ``g``.
+    with app.app_context():
+        ctx = Context(seed)
+        counter = QueryCounter(db.engine)
+    clients = {}
+    for route in routes:
+        client = clients.get(route.role) or clients.setdefault(route.role, _client(app, ctx.accounts.get(route.role)))
+        for _ in range(WARMUP):
+            _send(client, ctx, route)
+
+        latencies, queries, errors = [], [], 0
+        deadline = time.perf_counter() + max_seconds
+        while len(latencies) < requests and (not latencies or time.perf_counter() < deadline):
+            before = counter.count
+            started = time.perf_counter()
+            response = _send(client, ctx, route)
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count - before)
+            errors += response.status_code >= 500
+
+        # Allocation tracing slows requests down, so peak memory gets a pass of its own.
+        peaks = []
+        tracemalloc.start()
+        for _ in range(MEMORY_SAMPLES):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            _send(client, ctx, route)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+
+        results[route.name] = {
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p99_ms': round(_percentile(latencies, 99), 2),
+            'queries': statistics.median(queries),
+            'peak_kib': round(max(peaks) / 1024, 1),
+            'requests': len(latencies),
+            'errors': errors,
+        }
+    return results
+
+def regressions(results, baseline, tolerance):
+    """{route name: [how it got worse than its baseline]} for each route that did."""
+    found = {}
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        problems = []
+        if now['queries'] > before['queries']:
+            problems.append(f"{now['queries']:g} queries per request, baseline {before['queries']:g}")
+        if now['p50_ms'] > before['p50_ms'] * (1 + tolerance) and now['p50_ms'] - before['p50_ms'] > MIN_LATENCY_MS:
+            problems.append(f"p50 {now['p50_ms']:.1f} ms, baseline {before['p50_ms']:.1f} ms")
+        if now['peak_kib'] > before['peak_kib'] * (1 + tolerance) and now['peak_kib'] - before['peak_kib'] > MIN_MEMORY_KIB:
+            problems.append(f"peak {now['peak_kib']:.0f} KiB, baseline {before['peak_kib']:.0f} KiB")
+        if problems:
+            found[name] = problems
+    return found
+
+def _delta(now, before, key):
+    if not before:
+        return ''
+    if not before[key]:
+        return '' if not now[key] else ' (new)'
+    return f" ({(now[key] - before[key]) / before[key]:+.0%})"
+
+def report(results, baseline):
+    print(f"{'route':<30} {'n':>4} {'p50 ms':>16} {'p99 ms':>9} {'queries':>12} {'peak KiB':>18} {'5xx':>4}")
+    for name, r in results.items():
+        before = baseline.get(name)
+        print(f"{name:<30} {r['requests']:>4} {r['p50_ms']:>8.1f}{_delta(r, before, 'p50_ms'):>8} {r['p99_ms']:>9.1f} "
+              f"{r['queries']:>6g}{_delta(r, before, 'queries'):>6} {r['peak_kib']:>10.0f}{_delta(r, before, 'peak_kib'):>8} "
+              f"{r['errors']:>4}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='1k', help=f"Library size: {', '.join(synthetic.SCALES)} or a number of titles.")
+    parser.add_argument('--db', help='Generated library to use; built on first use if missing.')
+    parser.add_argument('--regenerate', action='store_true', help='Rebuild the library even if it exists.')
+    parser.add_argument('--requests', type=int, default=30, help='Timed requests per route.')
+    parser.add_argument('--max-seconds', type=float, default=10.0, help='Stop timing a route after this long.')
+    parser.add_argument('--only', help='Comma-separated route name prefixes to run, e.g. user.,api.books')
+    parser.add_argument('--baseline', help='Baseline file; defaults to benchmarks/baselines/<scale>.json.')
+    parser.add_argument('--update-baseline', action='store_true', help='Write these results as the new baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative growth of p50 and peak memory.')
+    args = parser.parse_args()
+
+    scale = args.scale.lower()
+    source = args.db or synthetic.default_path(scale)
+    if args.regenerate or not os.path.exists(source):
+        print(f"Generating a {scale} library in {source}...")
+        synthetic.generate(source, synthetic.parse_scale(scale))
+
+    routes = ROUTES
+    if args.only:
+        prefixes = tuple(p.strip() for p in args.only.split(','))
+        routes = [r for r in ROUTES if r.name.startswith(prefixes)]
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f'{scale}.json')
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)['routes']
+
+    found = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'library.db')
+        shutil.copyfile(source, path)
+        if os.path.exists(archive_path(source)):
+            shutil.copyfile(archive_path(source), archive_path(path))
+        app = synthetic.make_app(path)
+        with app.app_context():
+            migrations.upgrade(echo=lambda message: None)  # libraries generated before a schema change
+        results = measure(app, routes, args.requests, args.max_seconds)
+        if not args.update_baseline:
+            found = regressions(results, baseline, args.tolerance)
+            # Timings are noisy: a route only counts as slower if a second measurement agrees.
+            again = measure(app, [r for r in routes if r.name in found], args.requests, args.max_seconds, seed=2)
+            found = {name: problems for name, problems in regressions(again, baseline, args.tolerance).items()
+                     if name in found}
+        with app.app_context():
+            db.engine.dispose()
+    report(results, baseline)
+    try:
+        import resource
+        print(f"\nPeak resident memory of this run: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+    except ImportError:  # not available on Windows
+        pass
+
+    if args.update_baseline:
+        merged = dict(baseline, **results)
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump({'scale': scale, 'routes': merged}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline written to {baseline_path}.")
+    elif found:
+        sys.exit(f'\nRegressions against {baseline_path}:\n' + '\n'.join(
+            f'  {name}: {problem}' for name, problems in found.items() for problem in problems))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# /library_project/benchmarks/startup.py
+"""Cold-start latency of `create_app()` in fresh interpreters, with an import-time breakdown.
+
+    python -m benchmarks.startup --runs 10 --max-ms 1500
+
+Exits non-zero when the median exceeds --max-ms, so CI can guard worker recycling and autoscaling latency.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter: time the import and the factory separately.
+PROBE = """
+import time
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+create_app()
+t2 = time.perf_counter()
+print(f"{(t1 - t0) * 1000:.3f} {(t2 - t1) * 1000:.3f}")
+"""
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault('SECRET_KEY', 'benchmark')
+    # Point at a database that does not exist: startup must not need one.
+    env['DATABASE_URL'] = 'sqlite:////nonexistent-dir/never-opened.db'
+    return env
+
+def measure(runs):
+    """Returns a list of (import ms, create_app ms, process wall ms) per run."""
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=_env(),
+                             capture_output=True, text=True, check=True)
+        import_ms, factory_ms = map(float, out.stdout.split()[-2:])
+        results.append((import_ms, factory_ms, import_ms + factory_ms))
+    return results
+
+def import_breakdown(top):
+    """Top modules by cumulative import time, from `python -X importtime`."""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from app import create_app; create_app()'],
+                         cwd=ROOT, env=_env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        rows.append((int(cumulative_us), int(self_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15, help='Modules to show in the import breakdown.')
+    parser.add_argument('--max-ms', type=float, help='Fail if the median startup exceeds this many milliseconds.')
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    for label, index in (('import app', 0), ('create_app()', 1), ('total', 2)):
+        values = [r[index] for r in results]
+        print(f"{label:<14} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+
+    print(f"\n{'cumulative ms':>13} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in import_breakdown(args.top):
+        print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>9.1f}  {name}")
+
+    median = statistics.median(r[2] for r in results)
+    if args.max_ms is not None and median > args.max_ms:
+        sys.exit(f"\nMedian startup {median:.1f} ms exceeds the {args.max_ms:.1f} ms budget.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# /library_project/benchmarks/synthetic.py
+"""Builds a synthetic library of a given size into a throwaway SQLite database.
+
+    python -m benchmarks.synthetic --scale 100k [--out /tmp/library.db] [--seed 1]
+
+Scales name the number of titles (1k, 100k, 1m). Copies, patrons, borrow history, purchases,
+comments and ratings grow with it, and borrowing and comments favour a popular head of the
+catalog the way real circulation does. The same scale and seed always build the same library.
+Every generated patron is called ``patron<N>`` and has the password ``patron``.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# init_db seeds the default accounts and book types from the environment, and the config reads
+# SECRET_KEY from it; give them throwaway values.
+for key, value in {
+    'SECRET_KEY': 'benchmark', 'ADMIN_USERNAME': 'bench-admin', 'ADMIN_EMAIL': 'admin@bench.local',
+    'ADMIN_PASSWORD': 'bench-admin', 'LIBRARIAN_USERNAME': 'bench-librarian',
+    'LIBRARIAN_EMAIL': 'librarian@bench.local', 'LIBRARIAN_PASSWORD': 'bench-librarian',
+    'INITIAL_BOOK_TYPES': 'Learning,Movie,Magazine,Novel,Comic',
+}.items():
+    os.environ.setdefault(key, value)
+
+from werkzeug.security import generate_password_hash
+from app import create_app, credits, db, search, sales, ratings, recommendations
+from app.archive import archive_path
+from app.bootstrap import init_db
+from app.http_cache import bump_catalog_version
+from app.models import Book, BorrowHistory, Comment, Purchase, Rating, UniqueBook, User
+from config import configs
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+PATRON_PASSWORD = 'patron'
+CHUNK = 50_000
+NOW = datetime(2025, 1, 1)  # fixed so the same seed builds the same library
+
+# Per title: how many rows of each kind to generate.
+PATRONS_PER_TITLE = 0.2
+HISTORY_PER_TITLE = 3
+PURCHASES_PER_TITLE = 0.5
+COMMENTS_PER_TITLE = 1
+RATINGS_PER_TITLE = 1
+BORROWED_SHARE = 0.1  # of copies, out on loan right now
+
+WORDS = ('river', 'shadow', 'garden', 'empire', 'winter', 'silent', 'glass', 'city', 'last', 'storm',
+         'night', 'paper', 'ocean', 'iron', 'secret', 'golden', 'broken', 'north', 'house', 'fire',
+         'memory', 'stone', 'light', 'wild', 'letters', 'machine', 'forest', 'hidden', 'summer', 'crown')
+FIRST_NAMES = ('Ada', 'Ben', 'Chloe', 'Dev', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jonas',
+               'Kemi', 'Liam', 'Mei', 'Nora', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sami', 'Tara')
+LAST_NAMES = ('Adams', 'Brooks', 'Chen', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jensen',
+              'Khan', 'Lopez', 'Moreau', 'Novak', 'Okafor', 'Patel', 'Rossi', 'Silva', 'Tanaka', 'Weber')
+PUBLISHERS = ('Northwind Press', 'Harbor House', 'Blue Finch', 'Meridian', 'Lantern Books', 'Cedar & Co.')
+
+def parse_scale(value):
+    """Accepts a named scale (1k, 100k, 1m) or a plain number of titles."""
+    value = value.lower()
+    if value in SCALES:
+        return SCALES[value]
+    return int(value.replace('_', ''))
+
+def default_path(scale):
+    return os.path.join(tempfile.gettempdir(), f'library-synthetic-{scale.lower()}.db')
+
+def make_app(path, profile='production'):
+    """An app on the SQLite file at ``path``, with the per-process caches left on as in production."""
+    base = configs[profile]
+    config = type(f'Synthetic{base.__name__}', (base,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {},
+        'DEBUG': False,
+        'TESTING': True,
+        'RECOMMENDATION_STATE': path + '.coborrow.npz',
+    })
+    return create_app(config)
+
+def _popular(rng, ids):
+    """An id in the inclusive range ``ids``, skewed so the first few percent draw most of the picks."""
+    low, high = ids
+    return low + min(int((high - low + 1) * rng.random() ** 3), high - low)
+
+def _next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+def _insert(table, rows):
+    rows = list(rows)
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[start:start + CHUNK])
+
+def _patrons(rng, count):
+    password = generate_password_hash(PATRON_PASSWORD, method='pbkdf2:sha256')
+    first = _next_id(User)
+    _insert(User.__table__, (
+        {'id': first + i, 'username': f'patron{i + 1}', 'email': f'patron{i + 1}@synthetic.local',
+         'password': password, 'role': 'user', 'credits': float(rng.randint(0, 200))}
+        for i in range(count)
+    ))
+    credits.open_balances()
+    return first, first + count - 1
+
+def _books_and_copies(rng, n_books, patrons):
+    """Books with 1-4 copies each, some of them on loan; returns (book id range, copy id range, open loans)."""
+    low, high = patrons
+    first_book, first_copy = _next_id(Book), _next_id(UniqueBook)
+    last_book = first_book + n_books - 1
+    copy_id = first_copy - 1
+    loans = []  # (copy id, patron, borrowed on)
+    for start in range(first_book, last_book + 1, CHUNK):
+        books, copies = [], []
+        for book_id in range(start, min(start + CHUNK - 1, last_book) + 1):
+            words = rng.sample(WORDS, rng.randint(2, 4))
+            n_copies = rng.randint(1, 4)
+            holders = set()
+            for _ in range(n_copies):
+                copy_id += 1
+                copy = {'id': copy_id, 'book_id': book_id, 'status': 'available',
+                        'borrower_id': None, 'borrowed_on': None, 'due_date': None}
+                patron = rng.randint(low, high)
+                if rng.random() < BORROWED_SHARE and patron not in holders:
+                    holders.add(patron)
+                    borrowed_on = NOW - timedelta(days=rng.randint(0, 20), minutes=rng.randint(0, 1440))
+                    copy.update(status='borrowed', borrower_id=patron, borrowed_on=borrowed_on,
+                                due_date=borrowed_on + timedelta(days=7))
+                    loans.append((copy_id, patron, borrowed_on))
+                copies.append(copy)
+            books.append({
+                'id': book_id,
+                'title': ' '.join(words).title(),
+                'author': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                'isbn': f'978{book_id:010d}',
+                'publisher': rng.choice(PUBLISHERS),
+                'description': f'A story of {" and ".join(rng.sample(WORDS, 3))}.',
+                'price': round(rng.uniform(5, 60), 2),
+                'cost_per_day': round(rng.uniform(0.1, 2), 2),
+                'book_type_id': rng.randint(1, 5),
+                'total_copies': n_copies,
+                'available_copies': n_copies - len(holders),
+            })
+        _insert(Book.__table__, books)
+        _insert(UniqueBook.__table__, copies)
+    return (first_book, last_book), (first_copy, copy_id), loans
+
+def _history(rng, count, copies, patrons, loans):
+    low, high = patrons
+    rows = [{'copy_id': copy_id, 'user_id': patron, 'borrowed_on': borrowed_on, 'returned_on': None}
+            for copy_id, patron, borrowed_on in loans]
+    for _ in range(count):
+        borrowed_on = NOW - timedelta(days=rng.randint(21, 730), minutes=rng.randint(0, 1440))
+        rows.append({'copy_id': _popular(rng, copies), 'user_id': rng.randint(low, high),
+                     'borrowed_on': borrowed_on, 'returned_on': borrowed_on + timedelta(days=rng.randint(1, 14))})
+        if len(rows) >= CHUNK:
+            _insert(BorrowHistory.__table__, rows)
+            rows = []
+    _insert(BorrowHistory.__table__, rows)
+
+def _purchases(rng, count, books, patrons):
+    low, high = patrons
+    for start in range(0, count, CHUNK):
+        picks = [_popular(rng, books) for _ in range(min(CHUNK, count - start))]
+        titles = {}
+        ids = sorted(set(picks))
+        for i in range(0, len(ids), 500):
+            for book_id, title, author, price in db.session.query(Book.id, Book.title, Book.author, Book.price) \
+                    .filter(Book.id.in_(ids[i:i + 500])):
+                titles[book_id] = (title, author, price or 0)
+        _insert(Purchase.__table__, (
+            {'user_id': rng.randint(low, high), 'book_title': titles[b][0], 'book_author': titles[b][1],
+             'price_paid': titles[b][2], 'bought_on': NOW - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86399))}
+            for b in picks
+        ))
+
+def _comments(rng, count, books, patrons):
+    low, high = patrons
+    for start in range(0, count, CHUNK):
+        _insert(Comment.__table__, (
+            {'book_id': _popular(rng, books), 'user_id': rng.randint(low, high),
+             'content': ' '.join(rng.choices(WORDS, k=rng.randint(5, 30))).capitalize() + '.',
+             'created_at': NOW - timedelta(days=rng.randint(0, 730), seconds=rng.randint(0, 86399))}
+            for _ in range(min(CHUNK, count - start))
+        ))
+
+def _ratings(rng, count, books, patrons):
+    low, high = patrons
+    seen = set()
+    rows = []
+    for _ in range(count):
+        pair = (rng.randint(low, high), _popular(rng, books))
+        if pair in seen:
+            continue
+        seen.add(pair)
+        rows.append({'user_id': pair[0], 'book_id': pair[1], 'rating': float(rng.randint(1, 5)), 'created_at': NOW})
+    _insert(Rating.__table__, rows)
+
+def generate(path, n_books, seed=1, echo=print):
+    """Writes a fresh synthetic library of ``n_books`` titles to ``path``. Returns row counts by table."""
+    leftovers = [base + suffix for base in (path, archive_path(path)) for suffix in ('', '-wal', '-shm')]
+    for leftover in leftovers + [path + '.coborrow.npz']:
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    rng = random.Random(seed)
+    random.seed(seed)  # init_db picks seed_books.json copy counts with the module-level generator
+    app = make_app(path)
+    started = time.perf_counter()
+
+    def step(label, fn, *args):
+        t = time.perf_counter()
+        result = fn(*args)
+        db.session.commit()
+        echo(f"  {label:<24} {time.perf_counter() - t:6.1f}s")
+        return result
+
+    with app.app_context():
+        init_db()
+        patrons = step('patrons', _patrons, rng, max(50, int(n_books * PATRONS_PER_TITLE)))
+        books, copies, loans = step('books and copies', _books_and_copies, rng, n_books, patrons)
+        step('borrow history', _history, rng, int(n_books * HISTORY_PER_TITLE), copies, patrons, loans)
+        step('purchases', _purchases, rng, int(n_books * PURCHASES_PER_TITLE), books, patrons)
+        step('comments', _comments, rng, int(n_books * COMMENTS_PER_TITLE), books, patrons)
+        step('ratings', _ratings, rng, int(n_books * RATINGS_PER_TITLE), books, patrons)
+        step('rating aggregates', ratings.rebuild_aggregates)
+        step('search index', search.rebuild_index)
+        step('sales rollup', sales.rebuild_rollup)
+        step('recommendations', recommendations.refresh, True, recommendations.TOP_K, lambda message: None)
+        bump_catalog_version()
+        db.session.commit()
+        counts = {model.__tablename__: db.session.query(db.func.count()).select_from(model).scalar()
+                  for model in (User, Book, UniqueBook, BorrowHistory, Purchase, Comment, Rating)}
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        db.engine.dispose()
+    echo(f"Built {path} in {time.perf_counter() - started:.1f}s: "
+         + ', '.join(f'{count} {table}' for table, count in counts.items()))
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', default='1k', help=f"Titles to generate: {', '.join(SCALES)} or a number.")
+    parser.add_argument('--out', help='Database file to (re)create; defaults to one in the temp directory.')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    generate(args.out or default_path(args.scale), parse_scale(args.scale), args.seed)
+
+if __name__ == '__main__':
+    main()
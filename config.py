@@ -8,13 +8,94 @@ load_dotenv()
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+def engine_options(uri, pool_size, max_overflow, pool_timeout, pool_recycle, statement_timeout_ms):
+    """SQLAlchemy engine options for a database URL; pool sizing is skipped for in-memory SQLite."""
+    uri = uri or ''
+    if uri.startswith('sqlite') and (':memory:' in uri or uri.rstrip('/') == 'sqlite:'):
+        return {}
+    options = {
+        'pool_pre_ping': True,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+    }
+    if uri.startswith('postgresql') and statement_timeout_ms:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout_ms}'}
+    return options
+
 class Config:
     """Base configuration."""
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(basedir, 'app/static/uploads')
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+    # Seconds a logged-in user's row is served from the per-process cache; 0 disables it.
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    # Seconds rendered book-page fragments are kept; edits, copy changes and comments drop them sooner,
+    # in every worker once it sees the new catalog version (CATALOG_VERSION_TTL). 0 disables.
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 2048))
+    # Seconds a worker trusts its copy of the catalog version stamp behind page ETags.
+    CATALOG_VERSION_TTL = float(os.environ.get('CATALOG_VERSION_TTL', 2))
+    # Where refresh-recommendations keeps its co-borrow matrix; defaults to instance/coborrow.npz.
+    RECOMMENDATION_STATE = os.environ.get('RECOMMENDATION_STATE')
+    # Per-request SQL counts and timings: Server-Timing headers, slow-query and N+1 warnings on the
+    # app.sql_metrics logger, and the admin SQL Stats page. SQL_METRICS=0 turns all of it off.
+    SQL_METRICS = os.environ.get('SQL_METRICS', '1') != '0'
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '1') != '0'
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 1000))
+    # Runs of one statement shape within a request that count as a likely N+1.
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+    # cProfile for sampled requests and for any sent with a signed X-Profile header (minted on the
+    # admin Profiles page); one .prof file per request under PROFILE_DIR/<endpoint>/.
+    # PROFILE_SAMPLE_RATE is the starting fraction (0-1), adjustable per process from that page.
+    PROFILING = os.environ.get('PROFILING', '1') != '0'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+    PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 3600))
+    # Deleting an account or book with more related rows than this runs as a background job that
+    # removes DELETE_CHUNK_SIZE rows per transaction; smaller deletions happen in the request.
+    DELETE_INLINE_ROWS = int(os.environ.get('DELETE_INLINE_ROWS', 20000))
+    DELETE_CHUNK_SIZE = int(os.environ.get('DELETE_CHUNK_SIZE', 5000))
+    # Borrow records returned more than ARCHIVE_AFTER_DAYS ago are moved out of the hot table by
+    # 'flask archive-history'. On SQLite they go to ARCHIVE_DATABASE, a file attached to every
+    # connection; it defaults to one next to the main database (library.db -> library.archive.db).
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    ARCHIVE_DATABASE = os.environ.get('ARCHIVE_DATABASE')
+    # PRAGMA name -> value, applied to every new SQLite connection.
+    SQLITE_PRAGMAS = {}
 
 class DevelopmentConfig(Config):
     """Development configuration."""
     DEBUG = True
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+
+class ProductionConfig(Config):
+    """Production configuration: pooled connections and SQLite tuned for concurrent writers."""
+    DEBUG = False
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        SQLALCHEMY_DATABASE_URI,
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        statement_timeout_ms=int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000)),
+    )
+    SQLITE_PRAGMAS = {
+        'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -20000)),
+        'temp_store': 'MEMORY',
+    }
+
+# FLASK_CONFIG picks one of these; create_app falls back to development.
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
@@ -5,4 +5,8 @@ from app import create_app
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # The dev server creates and seeds an empty database for convenience; deployments run `flask init-db`.
+    from app.bootstrap import init_db
+    with app.app_context():
+        init_db()
+    app.run(debug=app.config['DEBUG'])
\ No newline at end of file
@@ -0,0 +1,92 @@
+-- The schema as it stood before any numbered migration, for tests that upgrade from it.
+CREATE TABLE booktype (
+	id INTEGER NOT NULL, 
+	name VARCHAR(100) NOT NULL, 
+	PRIMARY KEY (id), 
+	UNIQUE (name)
+);
+
+CREATE TABLE user (
+	id INTEGER NOT NULL, 
+	username VARCHAR(150) NOT NULL, 
+	password VARCHAR(200) NOT NULL, 
+	email VARCHAR(120) NOT NULL, 
+	role VARCHAR(50) NOT NULL, 
+	credits FLOAT, 
+	PRIMARY KEY (id), 
+	UNIQUE (username), 
+	UNIQUE (email)
+);
+
+CREATE TABLE book (
+	id INTEGER NOT NULL, 
+	title VARCHAR(200) NOT NULL, 
+	author VARCHAR(100) NOT NULL, 
+	isbn VARCHAR(20) NOT NULL, 
+	publisher VARCHAR(100) NOT NULL, 
+	description TEXT, 
+	cost_per_day FLOAT, 
+	price FLOAT, 
+	image VARCHAR(200), 
+	genre_id INTEGER, 
+	book_type_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	UNIQUE (isbn), 
+	FOREIGN KEY(book_type_id) REFERENCES booktype (id)
+);
+
+CREATE TABLE purchase (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	book_title VARCHAR(200) NOT NULL, 
+	book_author VARCHAR(100) NOT NULL, 
+	price_paid FLOAT NOT NULL, 
+	bought_on DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id)
+);
+
+CREATE TABLE comment (
+	id INTEGER NOT NULL, 
+	content TEXT NOT NULL, 
+	created_at DATETIME, 
+	user_id INTEGER NOT NULL, 
+	book_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id), 
+	FOREIGN KEY(book_id) REFERENCES book (id)
+);
+
+CREATE TABLE rating (
+	id INTEGER NOT NULL, 
+	rating FLOAT NOT NULL, 
+	created_at DATETIME, 
+	user_id INTEGER NOT NULL, 
+	book_id INTEGER NOT NULL, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id), 
+	FOREIGN KEY(book_id) REFERENCES book (id)
+);
+
+CREATE TABLE uniquebook (
+	id INTEGER NOT NULL, 
+	book_id INTEGER NOT NULL, 
+	status VARCHAR(50), 
+	borrower_id INTEGER, 
+	borrowed_on DATETIME, 
+	due_date DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(book_id) REFERENCES book (id), 
+	FOREIGN KEY(borrower_id) REFERENCES user (id)
+);
+
+CREATE TABLE borrow_history (
+	id INTEGER NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	copy_id INTEGER NOT NULL, 
+	borrowed_on DATETIME NOT NULL, 
+	returned_on DATETIME, 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES user (id), 
+	FOREIGN KEY(copy_id) REFERENCES uniquebook (id)
+);
@@ -0,0 +1,51 @@
+# /library_project/tests/conftest.py
+
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import synthetic  # noqa: E402  (also sets throwaway default accounts)
+from app import db  # noqa: E402
+from app.models import User  # noqa: E402
+from app.archive import archive_path  # noqa: E402
+
+# Titles in the library the tests run against; small enough to build in about a second.
+LIBRARY_TITLES = 200
+
+@pytest.fixture(scope='session')
+def library_file(tmp_path_factory):
+    """A small synthetic library, built once per run. Tests get their own copy through ``app``."""
+    path = str(tmp_path_factory.mktemp('library') / 'library.db')
+    synthetic.generate(path, LIBRARY_TITLES, echo=lambda message: None)
+    return path
+
+@pytest.fixture
+def app(library_file, tmp_path):
+    path = str(tmp_path / 'library.db')
+    for source, target in ((library_file, path), (archive_path(library_file), archive_path(path)),
+                           (library_file + '.coborrow.npz', path + '.coborrow.npz')):
+        if os.path.exists(source):
+            shutil.copyfile(source, target)
+    app = synthetic.make_app(path)
+    app.config['PROFILE_DIR'] = str(tmp_path / 'profiles')
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client_for(app):
+    """``client_for(username)``: a test client already signed in as that account."""
+    def make(username):
+        with app.app_context():
+            user_id = db.session.query(User.id).filter(User.username == username).scalar()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return make
@@ -0,0 +1,50 @@
+# /library_project/tests/test_api.py
+
+import base64
+import json
+import pytest
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.mark.parametrize('body', [
+    [1, 2], 'patron', 7, None, {}, {'username': 'patron1'},
+    {'username': 'patron1', 'password': 123}, {'username': ['patron1'], 'password': 'patron'},
+])
+def test_login_rejects_malformed_bodies(client, body):
+    response = client.post('/api/v1/session', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_login(client):
+    assert client.post('/api/v1/session', json={'username': 'patron1', 'password': 'wrong'}).status_code == 401
+    response = client.post('/api/v1/session', json={'username': 'patron1', 'password': 'patron'})
+    assert response.status_code == 200
+    assert response.get_json()['username'] == 'patron1'
+
+def _cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip('=')
+
+@pytest.mark.parametrize('cursor', [
+    {'sort': 'title', 'after_id': 5, 'after': ['a']},
+    {'sort': 'rating', 'after_id': 5, 'after': {'x': 1}},
+    {'sort': 'title', 'after_id': '5', 'after': 'a'},
+    {'sort': 'title', 'after_id': True},
+    {'sort': ['title'], 'after_id': 5},
+    {'q': 'x', 'offset': [1]},
+    {'evil': 1},
+    [1, 2],
+])
+def test_hand_made_cursors_are_rejected(client_for, cursor):
+    response = client_for('patron1').get('/api/v1/books', query_string={'cursor': _cursor(cursor)})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Bad request')
+
+def test_cursors_round_trip_for_every_sort(client_for):
+    client = client_for('patron1')
+    for sort in ('title', 'author', 'newest', 'rating'):
+        first = client.get('/api/v1/books', query_string={'sort': sort, 'limit': 5}).get_json()
+        second = client.get('/api/v1/books', query_string={'cursor': first['next_cursor'], 'limit': 5})
+        assert second.status_code == 200
+        assert not {book['id'] for book in first['books']} & {book['id'] for book in second.get_json()['books']}
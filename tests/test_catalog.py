@@ -0,0 +1,50 @@
+# /library_project/tests/test_catalog.py
+
+import html
+import re
+import pytest
+from app.catalog import CATALOG_SORTS
+
+PAGES = 4
+NEXT_LINK = re.compile(r'<a href="([^"]+)" class="btn btn-outline-primary">Next</a>')
+
+def _queries(response):
+    """Statements the request ran, from the Server-Timing header sql_metrics adds."""
+    return int(re.search(r'desc="(\d+) queries"', response.headers['Server-Timing']).group(1))
+
+def _walk(client, url):
+    """Query counts for up to PAGES pages of a catalog view, following its Next links."""
+    counts = []
+    for _ in range(PAGES):
+        response = client.get(url)
+        assert response.status_code == 200
+        counts.append(_queries(response))
+        link = NEXT_LINK.search(response.get_data(as_text=True))
+        if link is None:
+            break
+        url = html.unescape(link.group(1))
+    assert len(counts) > 1
+    return counts
+
+@pytest.mark.parametrize('username, path', [
+    ('patron1', '/user/dashboard'),
+    ('bench-librarian', '/librarian/view_available_books'),
+    ('bench-librarian', '/librarian/view_available_books?view=table'),
+])
+def test_queries_per_catalog_page_do_not_grow(client_for, username, path):
+    client = client_for(username)
+    client.get(path)  # warm per-process caches (user, recommendations) first
+    counts = {sort: _walk(client, f'{path}{"&" if "?" in path else "?"}sort={sort}') for sort in CATALOG_SORTS}
+    assert len({count for walk in counts.values() for count in walk}) == 1, counts
+
+def test_queries_per_api_page_do_not_grow(client_for):
+    client = client_for('patron1')
+    client.get('/api/v1/books')
+    counts = []
+    for sort in CATALOG_SORTS:
+        query = {'sort': sort}
+        for _ in range(PAGES):
+            response = client.get('/api/v1/books', query_string=query)
+            counts.append(_queries(response))
+            query = {'cursor': response.get_json()['next_cursor']}
+    assert len(set(counts)) == 1, counts
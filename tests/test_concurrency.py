@@ -0,0 +1,130 @@
+# /library_project/tests/test_concurrency.py
+"""Stress test: a crowd of patrons borrowing, returning and buying one contended title while a librarian removes copies."""
+
+import random
+import threading
+from collections import Counter
+import pytest
+from sqlalchemy import func, insert
+from sqlalchemy.exc import OperationalError
+from app import credits, db, inventory, loans
+from app.importer import import_books
+from app.loans import LoanError
+from app.models import Book, BorrowHistory, Purchase, UniqueBook, User
+
+ROUNDS = 3
+COPIES = 5
+REMOVED = 2
+CREDITS = 60
+PRICE = 30
+
+def _retrying(fn):
+    """Runs ``fn`` again after a rollback when SQLite reports the database busy."""
+    for _ in range(50):
+        try:
+            return fn()
+        except OperationalError:
+            db.session.rollback()
+    raise AssertionError('database stayed locked')
+
+def _crowd(size):
+    """Creates ``size`` patrons and tops each up with CREDITS through the ledger. Returns their ids."""
+    password = db.session.query(User.password).filter(User.username == 'patron1').scalar()
+    db.session.execute(insert(User), [
+        {'username': f'crowd{i}', 'email': f'crowd{i}@bench.local', 'password': password, 'role': 'user', 'credits': 0}
+        for i in range(size)])
+    db.session.commit()
+    ids = [user_id for user_id, in db.session.query(User.id).filter(User.username.like('crowd%')).order_by(User.id)]
+    credits.top_up([{'user_id': user_id, 'amount': CREDITS} for user_id in ids], reference='crowd')
+    return ids
+
+@pytest.mark.parametrize('threads', [100])
+def test_contended_title_is_never_double_issued_and_credits_are_conserved(app, threads):
+    with app.app_context():
+        import_books([
+            {'title': 'Contended', 'author': 'A', 'isbn': 'stress-lend', 'publisher': 'P', 'book_type_id': 1,
+             'copies': COPIES, 'price': PRICE},
+            {'title': 'Bestseller', 'author': 'A', 'isbn': 'stress-buy', 'publisher': 'P', 'book_type_id': 1,
+             'copies': threads, 'price': PRICE},
+        ])
+        lend_id, buy_id = (db.session.query(Book.id).filter(Book.isbn == isbn).scalar()
+                           for isbn in ('stress-lend', 'stress-buy'))
+        patrons = _crowd(threads)
+
+    holders = {}  # copy id -> patron, for copies on loan right now
+    claims = Counter()  # copy id -> successful claims
+    removed = []
+    failures = []
+    lock = threading.Lock()
+    start = threading.Barrier(threads + 1)
+
+    def patron(user_id, seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            start.wait()
+            for _ in range(ROUNDS):
+                try:
+                    copy_id, _ = _retrying(lambda: loans.issue_book(db.session.get(Book, lend_id), user_id))
+                except LoanError:
+                    copy_id = None
+                if copy_id is not None:
+                    with lock:
+                        claims[copy_id] += 1
+                        if copy_id in holders:
+                            failures.append(f'copy {copy_id} issued to {user_id} while held by {holders[copy_id]}')
+                        holders[copy_id] = user_id
+                if rng.random() < 0.5:
+                    try:
+                        _retrying(lambda: loans.buy_book(db.session.get(Book, buy_id), user_id))
+                    except LoanError:
+                        pass
+                if copy_id is not None:
+                    with lock:
+                        del holders[copy_id]
+                    def give_back():
+                        copy = db.session.get(UniqueBook, copy_id)
+                        if copy is None:
+                            failures.append(f'copy {copy_id} was removed while on loan to {user_id}')
+                        else:
+                            loans.return_copy(copy, user_id)
+                    _retrying(give_back)
+            db.session.remove()
+
+    def librarian():
+        with app.app_context():
+            start.wait()
+            while len(removed) < REMOVED:
+                # Every copy may be out on loan for a moment, in which case nothing is removed.
+                def remove():
+                    ids = inventory.remove_available_copies(lend_id, REMOVED - len(removed))
+                    db.session.commit()
+                    return ids
+                removed.extend(_retrying(remove))
+            db.session.remove()
+
+    workers = [threading.Thread(target=patron, args=(user_id, i)) for i, user_id in enumerate(patrons)]
+    workers.append(threading.Thread(target=librarian))
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert failures == []
+    assert sum(claims.values()) > COPIES  # the title really was contended and copies went round
+    with app.app_context():
+        assert inventory.find_drift() == []
+        lend = db.session.get(Book, lend_id)
+        assert lend.total_copies == lend.available_copies == COPIES - REMOVED
+
+        # Every successful claim left exactly one history row; removed copies took theirs with them.
+        history = Counter(dict(db.session.query(BorrowHistory.copy_id, func.count())
+                               .filter(BorrowHistory.copy_id.in_(list(claims))).group_by(BorrowHistory.copy_id)))
+        assert history == Counter({copy_id: n for copy_id, n in claims.items() if copy_id not in removed})
+
+        # Credits are conserved: what the crowd holds plus what it spent is what it was given.
+        crowd = User.id.in_(patrons)
+        balance = db.session.query(func.sum(User.credits)).filter(crowd).scalar()
+        spent = db.session.query(func.coalesce(func.sum(Purchase.price_paid), 0)).filter(Purchase.user_id.in_(patrons)).scalar()
+        assert db.session.query(func.min(User.credits)).filter(crowd).scalar() >= 0
+        assert balance + spent == pytest.approx(CREDITS * threads)
+        assert credits.verify_balances() == []
@@ -0,0 +1,53 @@
+# /library_project/tests/test_credits.py
+
+import io
+import pytest
+from app import credits, db
+from app.models import User
+
+LIBRARIAN = 'bench-librarian'
+
+def _balances(app, usernames):
+    with app.app_context():
+        return dict(db.session.query(User.username, User.credits).filter(User.username.in_(usernames)).all())
+
+def _upload(client, name, data, reference='batch-1'):
+    return client.post('/librarian/credits', data={'file': (io.BytesIO(data), name), 'reference': reference},
+                       content_type='multipart/form-data')
+
+def test_batch_top_up_is_applied_once(app, client_for):
+    before = _balances(app, ['patron1', 'patron2'])
+    client = client_for(LIBRARIAN)
+    data = b'username,amount\npatron1,25\npatron2,10.5\n'
+    assert _upload(client, 'topup.csv', data).status_code == 302
+    assert b'already applied' in _upload(client, 'topup.csv', data).data
+    after = _balances(app, ['patron1', 'patron2'])
+    assert after['patron1'] == pytest.approx(before['patron1'] + 25)
+    assert after['patron2'] == pytest.approx(before['patron2'] + 10.5)
+    with app.app_context():
+        assert credits.verify_balances() == []
+
+@pytest.mark.parametrize('name, data, message', [
+    ('topup.json', b'[{"username": ', b'Could not read the file'),
+    ('topup.jsonl', b'{"username": "patron1", "amount": 5}\n[1]\n', b'row is not an object'),
+    ('topup.csv', b'username,amount\npatron1,5\nnobody,5\n', b'no account with username nobody'),
+    ('topup.csv', 'username,amount\npatr\xf3n1,5\n'.encode('latin-1'), b'not UTF-8'),
+])
+def test_bad_batches_add_nothing(app, client_for, name, data, message):
+    before = _balances(app, ['patron1'])
+    response = _upload(client_for(LIBRARIAN), name, data)
+    assert response.status_code == 200
+    assert message in response.data
+    assert _balances(app, ['patron1']) == before
+
+def test_cli_reports_unreadable_files(app, tmp_path):
+    path = tmp_path / 'topup.json'
+    path.write_text('[{"username": ')
+    result = app.test_cli_runner().invoke(args=['topup-credits', str(path)])
+    assert result.exit_code == 1
+    assert 'Could not read the file' in result.output
+
+def test_api_rejects_rows_that_are_not_objects(client_for):
+    response = client_for(LIBRARIAN).post('/api/v1/credits/topups', json={'topups': [{'username': 'patron1', 'amount': 5}, 7]})
+    assert response.status_code == 400
+    assert response.get_json()['rejected'] == [{'row': 2, 'reason': 'row is not an object'}]
@@ -0,0 +1,29 @@
+# /library_project/tests/test_exports.py
+
+import pytest
+from datetime import datetime
+from app.exports import parse_date_range
+
+LIBRARIAN = 'bench-librarian'
+
+def test_date_range_is_half_open():
+    assert parse_date_range({'start': '2024-01-31', 'end': '2024-02-29'}) == \
+        (datetime(2024, 1, 31), datetime(2024, 3, 1))
+
+def test_bad_or_last_possible_dates_leave_the_range_open():
+    assert parse_date_range({'start': 'nope', 'end': '9999-12-31'}) == (None, None)
+
+@pytest.mark.parametrize('path', ['/librarian/export/purchases', '/librarian/export/borrows'])
+def test_export_up_to_the_last_possible_day(client_for, path):
+    response = client_for(LIBRARIAN).get(path, query_string={'start': '0001-01-01', 'end': '9999-12-31'})
+    assert response.status_code == 200
+    assert response.data.count(b'\n') > 1
+
+@pytest.mark.parametrize('flag, gzipped', [('1', True), ('true', True), ('yes', True), ('0', False),
+                                           ('false', False), ('', False), (None, False)])
+def test_gzip_flag(client_for, flag, gzipped):
+    query = {} if flag is None else {'gzip': flag}
+    response = client_for(LIBRARIAN).get('/librarian/export/purchases', query_string=query)
+    assert response.status_code == 200
+    assert (response.mimetype == 'application/gzip') is gzipped
+    assert response.data.startswith(b'\x1f\x8b') is gzipped
@@ -0,0 +1,27 @@
+# /library_project/tests/test_fragments.py
+
+import sqlite3
+from datetime import datetime
+from app import db
+from app.models import Book, User
+
+def _another_worker_comments(book_id, user_id, content):
+    """Writes a comment the way a second worker process would: nothing in this process hears about it."""
+    path = db.engine.url.database
+    with sqlite3.connect(path) as conn:
+        now = datetime.utcnow().isoformat(' ')
+        conn.execute("INSERT INTO comment (content, user_id, book_id, created_at) VALUES (?, ?, ?, ?)",
+                     (content, user_id, book_id, now))
+        conn.execute("INSERT INTO catalog_version (id, version, updated_at) VALUES (1, 1, ?) "
+                     "ON CONFLICT (id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at", (now,))
+
+def test_fragments_follow_writes_made_by_other_workers(app, client_for):
+    app.config['CATALOG_VERSION_TTL'] = 0
+    client = client_for('bench-librarian')
+    with app.app_context():
+        book_id = db.session.query(Book.id).order_by(Book.id).limit(1).scalar()
+        user_id = db.session.query(User.id).filter(User.username == 'patron1').scalar()
+        url = f'/librarian/view_book/{book_id}'
+        assert client.get(url).status_code == 200
+        _another_worker_comments(book_id, user_id, 'written by another worker')
+    assert 'written by another worker' in client.get(url).get_data(as_text=True)
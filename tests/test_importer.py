@@ -0,0 +1,54 @@
+# /library_project/tests/test_importer.py
+
+import io
+import os
+import pytest
+from app import db, images
+from app.models import Book
+
+LIBRARIAN = 'bench-librarian'
+BOOK = b'{"title": "T", "author": "A", "isbn": "test-1", "publisher": "P", "book_type_id": 1}'
+
+def _upload(client, name, data):
+    return client.post('/librarian/import_books', data={'file': (io.BytesIO(data), name), 'copies': '1'},
+                       content_type='multipart/form-data')
+
+@pytest.mark.parametrize('name, data, message', [
+    ('books.json', b'[{"title": ', b'invalid JSON'),
+    ('books.json', b'{"title": "T"}', b'must hold an array'),
+    ('books.csv', 'title,author,isbn,publisher,book_type_id\nCaf\xe9,A,c1,P,1\n'.encode('latin-1'), b'not UTF-8'),
+])
+def test_unreadable_uploads_are_reported(client_for, name, data, message):
+    response = _upload(client_for(LIBRARIAN), name, data)
+    assert response.status_code == 200
+    assert message in response.data
+
+def test_rows_that_are_not_objects_are_rejected(app, client_for):
+    response = _upload(client_for(LIBRARIAN), 'books.jsonl', b'[1, 2]\n"x"\n' + BOOK + b'\n')
+    assert response.status_code == 200
+    assert b'row is not an object' in response.data
+    with app.app_context():
+        assert db.session.query(Book.id).filter(Book.isbn == 'test-1').scalar() is not None
+
+@pytest.mark.parametrize('image', ['../victim.txt', 'sub/cover.jpg', 'missing.jpg'])
+def test_images_outside_the_upload_folder_are_rejected(app, client_for, image):
+    row = BOOK[:-1] + f', "image": "{image}"}}'.encode()
+    response = _upload(client_for(LIBRARIAN), 'books.jsonl', row + b'\n')
+    assert b'not a file in the upload folder' in response.data
+    with app.app_context():
+        assert db.session.query(Book.id).filter(Book.isbn == 'test-1').scalar() is None
+
+def test_deleting_a_book_never_removes_files_outside_the_upload_folder(app, tmp_path, client_for):
+    victim = tmp_path / 'victim.txt'
+    victim.write_text('keep me')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    os.makedirs(app.config['UPLOAD_FOLDER'])
+    with app.app_context():
+        book = Book.query.first()
+        book.image = '../victim.txt'
+        db.session.commit()
+        book_id = book.id
+    client_for(LIBRARIAN).post(f'/librarian/delete_book/{book_id}')
+    assert victim.exists()
+    with pytest.raises(ValueError):
+        images.build_variants(app.config['UPLOAD_FOLDER'], '../victim.txt')
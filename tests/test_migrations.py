@@ -0,0 +1,38 @@
+# /library_project/tests/test_migrations.py
+
+import os
+import sqlite3
+import pytest
+from benchmarks import synthetic
+from app import db, migrations, query_plans
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline_schema.sql')
+
+@pytest.fixture
+def migrated_app(tmp_path):
+    """An app on a database created from the pre-migration schema and upgraded to the latest version."""
+    path = str(tmp_path / 'migrated.db')
+    with open(BASELINE) as f, sqlite3.connect(path) as conn:
+        conn.executescript(f.read())
+    app = synthetic.make_app(path)
+    with app.app_context():
+        migrations.upgrade(echo=lambda message: None)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def _scans(app):
+    with app.app_context():
+        return {name: scans for name, plan, scans in query_plans.check_plans() if scans}
+
+def test_upgrade_reaches_the_latest_version(migrated_app):
+    with migrated_app.app_context():
+        assert migrations.pending() == []
+        assert migrations.current_version() == migrations.MIGRATIONS[-1][0]
+
+def test_migrated_schema_has_no_full_scans(migrated_app):
+    assert _scans(migrated_app) == {}
+
+def test_created_schema_has_no_full_scans(app):
+    assert _scans(app) == {}
@@ -0,0 +1,17 @@
+# /library_project/tests/test_overdue.py
+
+from datetime import date, timedelta
+from app import db
+from app.models import OverdueRun
+
+def test_runs_older_than_the_picker_can_still_be_opened(app, client_for):
+    first = date(2024, 1, 1)
+    with app.app_context():
+        db.session.add_all(OverdueRun(run_date=first + timedelta(days=i), total_amount=i + 0.25) for i in range(40))
+        db.session.commit()
+    client = client_for('bench-librarian')
+    page = client.get('/librarian/overdue', query_string={'date': first.isoformat()}).get_data(as_text=True)
+    assert '$0.25' in page
+    assert f'value="{first.isoformat()}" selected' in page
+    assert '$39.25' in client.get('/librarian/overdue').get_data(as_text=True)
+    assert client.get('/librarian/overdue', query_string={'date': 'not-a-date'}).status_code == 200
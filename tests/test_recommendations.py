@@ -0,0 +1,39 @@
+# /library_project/tests/test_recommendations.py
+
+from datetime import datetime
+from sqlalchemy import func
+from app import db, deletion, recommendations
+from app.models import Book, BookRecommendation, BorrowHistory, UniqueBook, User
+
+def _quiet(message):
+    pass
+
+def test_incremental_refresh_after_deleting_the_highest_id_book(app):
+    with app.app_context():
+        top = db.session.query(func.max(Book.id)).scalar()
+        deletion.delete_book(top)
+        db.session.commit()
+
+        copy_id = db.session.query(func.min(UniqueBook.id)).scalar()
+        patron_id = db.session.query(User.id).filter(User.username == 'patron1').scalar()
+        now = datetime.utcnow()
+        db.session.add(BorrowHistory(user_id=patron_id, copy_id=copy_id, borrowed_on=now, returned_on=now))
+        db.session.commit()
+
+        assert recommendations.refresh(echo=_quiet) > 0
+        assert not BookRecommendation.query.filter(BookRecommendation.book_id == top).count()
+
+def test_incremental_refresh_matches_full_rebuild(app):
+    with app.app_context():
+        copy_id = db.session.query(func.max(UniqueBook.id)).scalar()
+        patron_id = db.session.query(User.id).filter(User.username == 'patron2').scalar()
+        now = datetime.utcnow()
+        db.session.add(BorrowHistory(user_id=patron_id, copy_id=copy_id, borrowed_on=now, returned_on=now))
+        db.session.commit()
+
+        def stored():
+            return sorted((r.book_id, r.rank, r.recommended_id, round(r.score, 9)) for r in BookRecommendation.query)
+        recommendations.refresh(echo=_quiet)
+        incremental = stored()
+        recommendations.refresh(full=True, echo=_quiet)
+        assert stored() == incremental
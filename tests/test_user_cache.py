@@ -0,0 +1,35 @@
+# /library_project/tests/test_user_cache.py
+
+import pytest
+from sqlalchemy import func
+from app import db, deletion, user_cache
+from app.models import Book, BorrowHistory, CreditLedger, UniqueBook, User
+
+@pytest.fixture
+def deleted_elsewhere(app, client_for):
+    """A signed-in patron whose account another worker deleted; this process still has it cached."""
+    client = client_for('patron1')
+    assert client.get('/').status_code == 200
+    with app.app_context():
+        user_id = db.session.query(User.id).filter(User.username == 'patron1').scalar()
+        snapshot = user_cache.cache.get(user_id)
+        assert snapshot is not None
+        deletion.delete_user(user_id)
+        db.session.commit()
+        # The deleting worker's invalidation never reaches this one.
+        user_cache.cache.put(user_id, snapshot, user_cache.cache.version(user_id))
+        book_id = db.session.query(Book.id).filter(Book.available_copies > 0, Book.price > 0).order_by(Book.id).limit(1).scalar()
+        ledger = db.session.query(func.count()).filter(CreditLedger.user_id == user_id).scalar()
+    return client, user_id, book_id, ledger
+
+@pytest.mark.parametrize('action', ['issue', 'buy'])
+def test_a_deleted_account_cannot_borrow_or_buy_from_a_stale_cache(app, deleted_elsewhere, action):
+    client, user_id, book_id, ledger = deleted_elsewhere
+    response = client.post(f'/api/v1/books/{book_id}/{action}')
+    assert response.status_code == 403
+    assert response.get_json()['error'] == 'This account no longer exists.'
+    with app.app_context():
+        for condition in (UniqueBook.borrower_id == user_id, BorrowHistory.user_id == user_id):
+            assert db.session.query(func.count()).filter(condition).scalar() == 0
+        # The ledger keeps a deleted account's past entries, but gains none.
+        assert db.session.query(func.count()).filter(CreditLedger.user_id == user_id).scalar() == ledger